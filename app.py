@@ -13,8 +13,10 @@ BACKEND_DIR = os.path.join(BASE_DIR, 'backend')
 os.chdir(BACKEND_DIR)
 sys.path.insert(0, BACKEND_DIR)
 
-print("Starting CoolCare PWA server...")
-import uvicorn
-from main import app
+if __name__ == "__main__":
+    # Воркеры uvicorn заново импортируют этот файл — сервер запускает только главный процесс
+    print("Starting CoolCare PWA server...")
+    import uvicorn
+    from cluster import WEB_CONCURRENCY
 
-uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, log_level="info", workers=WEB_CONCURRENCY)
@@ -1,7 +1,8 @@
+import logging
 import os
 import random
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import List, Optional
 
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException
@@ -9,9 +10,12 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from database import supabase
 from schemas import TokenData
+import cache
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # === Настройки ===
 SECRET_KEY = os.getenv("JWT_SECRET", "super_secret_key_change_in_production")
 ALGORITHM = "HS256"
@@ -34,6 +38,28 @@ def normalize_phone(phone: str) -> str:
     return cleaned
 
 
+def normalize_phone_prefixes(phone: str) -> List[str]:
+    """
+    Начала нормализованного номера для автодополнения по customer_phone_norm.
+
+    Сохранённые номера получены normalize_phone, поэтому префикс строится по
+    тем же правилам для всех вариантов, которыми может закончиться ввод:
+    "8 999" -> "+7999" (11 цифр) или "+8999" (другая длина), "999" -> "+999".
+    Номер без кода страны дополнительно ищется как российский: "999" -> "+7999".
+    """
+    cleaned = ''.join(c for c in phone if c.isdigit() or c == '+')
+    digits = cleaned.replace('+', '')
+    if not digits:
+        return []
+    prefixes = []
+    if not cleaned.startswith('+') and cleaned.startswith('8') and len(cleaned) <= 11:
+        prefixes.append('+7' + cleaned[1:])
+    prefixes.append(cleaned if cleaned.startswith('+') else '+' + cleaned)
+    if not cleaned.startswith('+') and digits[0] not in '78' and len(digits) <= 10:
+        prefixes.append('+7' + digits)
+    return prefixes
+
+
 def generate_sms_code() -> str:
     return str(random.randint(100000, 999999))
 
@@ -45,8 +71,6 @@ def create_sms_code(phone: str) -> str:
     expires = (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat()
     phone_norm = normalize_phone(phone)
     
-    print(f"🔐 Создание кода: phone={phone_norm}, code={code}")
-    
     # Удаляем ВСЕ старые коды для этого номера
     supabase.table("sms_codes").delete().eq("phone", phone_norm).execute()
     
@@ -57,7 +81,8 @@ def create_sms_code(phone: str) -> str:
         "expires_at": expires
     }).execute()
     
-    print(f"📱 SMS код для {phone_norm}: {code}")
+    # Сам код в лог не пишем
+    logger.info("SMS code created for %s", phone_norm)
     return code
 
 
@@ -66,8 +91,6 @@ def verify_sms_code(phone: str, code: str) -> bool:
     phone_norm = normalize_phone(phone)
     code_str = str(code).strip()
     
-    print(f"🔍 Проверка: phone={phone_norm}, code={code_str}")
-    
     try:
         # Ищем запись
         result = supabase.table("sms_codes") \
@@ -76,18 +99,8 @@ def verify_sms_code(phone: str, code: str) -> bool:
             .eq("code", code_str) \
             .execute()
         
-        print(f"📦 Результат запроса: {result.data}")
-        
         if not result.data or len(result.data) == 0:
-            # Попробуем найти любые коды для этого телефона (для отладки)
-            debug = supabase.table("sms_codes") \
-                .select("phone, code, expires_at") \
-                .eq("phone", phone_norm) \
-                .execute()
-            if debug.data:
-                print(f"⚠️  Найдены другие коды для {phone_norm}: {debug.data}")
-            else:
-                print(f"❌ Нет записей для {phone_norm} в БД")
+            logger.info("SMS code rejected for %s: no matching code", phone_norm)
             return False
         
         record = result.data[0]
@@ -102,20 +115,18 @@ def verify_sms_code(phone: str, code: str) -> bool:
         now = datetime.now(timezone.utc)
         
         if now > expires_at:
-            print(f"⏰ Код истёк: {expires_at} < {now}")
+            logger.info("SMS code rejected for %s: expired at %s", phone_norm, expires_at)
             supabase.table("sms_codes").delete().eq("id", record["id"]).execute()
             return False
         
         # Удаляем использованный код (простая стратегия)
         supabase.table("sms_codes").delete().eq("id", record["id"]).execute()
         
-        print(f"✅ Код подтверждён!")
+        logger.info("SMS code verified for %s", phone_norm)
         return True
         
-    except Exception as e:
-        print(f"❌ Ошибка проверки: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("SMS code verification failed for %s", phone_norm)
         return False
 
 
@@ -156,10 +167,27 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user_id = int(user_id)
-        result = supabase.table("users").select("*").eq("id", user_id).execute()
-        if not result.data:
-            raise HTTPException(status_code=401, detail="User not found")
-        return result.data[0]
+        # Копия: обработчики не должны менять запись в кэше
+        return dict(get_user(int(user_id)))
     except (JWTError, ValueError):
         raise HTTPException(status_code=401, detail="Invalid token")
+
+
+def get_user(user_id: int) -> dict:
+    """Пользователь из кэша, при промахе — из БД; нет пользователя — HTTPException 401."""
+    return cache.user_cache.get_or_load(cache.user_key(user_id), lambda: _load_user(user_id))
+
+
+def _load_user(user_id: int) -> dict:
+    result = supabase.table("users").select("*").eq("id", user_id).execute()
+    if not result.data:
+        # Исключение не кэшируется — созданный позже пользователь найдётся сразу
+        raise HTTPException(status_code=401, detail="User not found")
+    return result.data[0]
+
+
+def warm_user_cache() -> None:
+    """Загружает активных пользователей в кэш одним запросом (прогрев при старте)."""
+    result = supabase.table("users").select("*").eq("is_active", True).execute()
+    for user in result.data or []:
+        cache.user_cache.prime(cache.user_key(user["id"]), user)
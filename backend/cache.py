@@ -0,0 +1,127 @@
+"""
+Кэш с коалесцированием запросов (single-flight) для тяжёлых выборок CoolCare.
+
+Одновременные одинаковые запросы ждут одно вычисление, результат хранится
+несколько секунд (ADMIN_CACHE_TTL). Запись в заявки сбрасывает кэш во всех
+воркерах через шину cluster.bus; если шина не согласована между процессами,
+результаты не хранятся и остаётся только коалесцирование.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import cluster
+
+load_dotenv()
+
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "5"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+
+class _InFlight:
+    """Вычисление, которое сейчас выполняется и которого ждут остальные."""
+    __slots__ = ("event", "result", "error", "generation")
+
+    def __init__(self, generation: int):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.generation = generation
+
+
+class SingleFlightCache:
+    """Потокобезопасный TTL-кэш: один загрузчик на ключ, остальные ждут его результат."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl if cluster.bus.coherent else 0
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[float, Any]] = {}
+        self._inflight: Dict[str, _InFlight] = {}
+        self._generation = 0
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlight(self._generation)
+                self._inflight[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = loader()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is call:
+                    del self._inflight[key]
+                # Результат, посчитанный до инвалидации, в кэш не кладём
+                if call.error is None and self.ttl > 0 and call.generation == self._generation:
+                    self._data[key] = (time.monotonic() + self.ttl, call.result)
+            call.event.set()
+        return call.result
+
+    def prime(self, key: str, value: Any) -> None:
+        """Кладёт готовое значение (прогрев при старте)."""
+        if self.ttl > 0:
+            with self._lock:
+                self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, prefix: str = "") -> None:
+        """Сбрасывает ключи с указанным префиксом (по умолчанию — все)."""
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+            # Новые запросы не должны присоединяться к устаревшему вычислению
+            for key in [k for k in self._inflight if k.startswith(prefix)]:
+                del self._inflight[key]
+
+
+admin_cache = SingleFlightCache(ADMIN_CACHE_TTL)
+# Пользователь по id для get_current_user: запрос в users на каждый вызов API не нужен
+user_cache = SingleFlightCache(USER_CACHE_TTL)
+
+_caches = [admin_cache, user_cache]
+
+
+def _on_invalidate(payload: dict) -> None:
+    prefix = payload.get("prefix", "")
+    for c in _caches:
+        c.invalidate(prefix)
+
+
+cluster.bus.subscribe("cache", _on_invalidate)
+
+
+def invalidate(prefix: str = "") -> None:
+    """Сбрасывает ключи с префиксом во всех воркерах."""
+    cluster.bus.publish("cache", {"prefix": prefix})
+
+
+def user_key(user_id: int) -> str:
+    # Двоеточие в конце, чтобы сброс "user:1:" не задевал "user:12:"
+    return f"user:{user_id}:"
+
+
+def invalidate_user(user_id: int) -> None:
+    """Вызывается после изменения записи пользователя."""
+    invalidate(user_key(user_id))
+
+
+def invalidate_jobs() -> None:
+    """Вызывается после любой записи в таблицу jobs."""
+    invalidate("admin:")
@@ -0,0 +1,74 @@
+"""
+Каталог готовых услуг (predefined_services) в памяти процесса.
+
+Загружается при старте, сбрасывается при изменении услуг (во всех воркерах
+через cluster.bus). Версия — хэш содержимого, поэтому совпадает во всех
+воркерах и годится как ETag для долгого кэширования на клиенте.
+Без общей шины между воркерами каталог перечитывается раз в CATALOG_TTL секунд.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import cluster
+from database import supabase
+
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "60"))
+
+
+class ServicesCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: Optional[List[dict]] = None
+        self._by_id: Dict[int, dict] = {}
+        self._version = ""
+        self._loaded_at = 0.0
+
+    def _load(self) -> None:
+        result = supabase.table("predefined_services").select("*").order("name").execute()
+        items = result.data or []
+        payload = json.dumps(items, sort_keys=True, ensure_ascii=False, default=str)
+        self._items = items
+        self._by_id = {s["id"]: s for s in items}
+        self._version = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+        self._loaded_at = time.monotonic()
+
+    def _current(self) -> tuple:
+        with self._lock:
+            stale = not cluster.bus.coherent and time.monotonic() - self._loaded_at > CATALOG_TTL
+            if self._items is None or stale:
+                self._load()
+            return self._version, self._items, self._by_id
+
+    def snapshot(self) -> tuple:
+        """(версия, список услуг) — согласованная пара."""
+        version, items, _ = self._current()
+        return version, items
+
+    def items(self) -> List[dict]:
+        return self._current()[1]
+
+    def get(self, service_id: int) -> Optional[dict]:
+        return self._current()[2].get(service_id)
+
+    def warm(self) -> None:
+        with self._lock:
+            self._load()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._items = None
+            self._by_id = {}
+
+
+services_catalog = ServicesCatalog()
+
+cluster.bus.subscribe("services", lambda payload: services_catalog.invalidate())
+
+
+def invalidate_services() -> None:
+    """Вызывается после создания, изменения или удаления услуги."""
+    cluster.bus.publish("services")
@@ -0,0 +1,185 @@
+"""
+Многопроцессный режим CoolCare: шина инвалидации кэшей и выбор лидера.
+
+WEB_CONCURRENCY задаёт число воркеров uvicorn. Если указан REDIS_URL
+(Redis или совместимый сервер: Valkey, KeyDB), инвалидации рассылаются через
+pub/sub, а лидер выбирается Redis-блокировкой. Без Redis лидер выбирается
+файловой блокировкой (все воркеры на одной машине), а межпроцессной шины нет —
+в этом случае кэши с TTL работают только как коалесцирование запросов.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+REDIS_URL = os.getenv("REDIS_URL")
+BUS_CHANNEL = os.getenv("CLUSTER_BUS_CHANNEL", "coolcare:invalidate")
+# Файлы блокировки лидера без Redis — вне каталога с исходниками
+LOCK_DIR = os.getenv("CLUSTER_LOCK_DIR", os.path.join(tempfile.gettempdir(), "coolcare"))
+
+# Уникальный идентификатор процесса: свои сообщения из Redis игнорируем
+NODE_ID = uuid.uuid4().hex
+
+Handler = Callable[[dict], None]
+
+
+# ==================== Шина инвалидации ====================
+
+class LocalBus:
+    """Доставка только внутри процесса (один воркер или нет Redis)."""
+
+    coherent = WEB_CONCURRENCY == 1
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def publish(self, topic: str, payload: Optional[dict] = None) -> None:
+        self._deliver(topic, payload or {})
+
+    def _deliver(self, topic: str, payload: dict) -> None:
+        for handler in self._handlers.get(topic, []):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Bus handler failed for topic %s", topic)
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class RedisBus(LocalBus):
+    """Локальная доставка + рассылка остальным воркерам через Redis pub/sub."""
+
+    coherent = True
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = None
+        self._thread = None
+
+    def publish(self, topic: str, payload: Optional[dict] = None) -> None:
+        payload = payload or {}
+        self._deliver(topic, payload)
+        message = json.dumps({"origin": NODE_ID, "topic": topic, "payload": payload})
+        try:
+            self._redis.publish(BUS_CHANNEL, message)
+        except Exception as e:
+            logger.warning(f"Bus publish failed: {e}")
+
+    def _on_message(self, message) -> None:
+        try:
+            data = json.loads(message["data"])
+        except (TypeError, ValueError):
+            return
+        if data.get("origin") != NODE_ID:
+            self._deliver(data.get("topic", ""), data.get("payload") or {})
+
+    def start(self) -> None:
+        if self._thread:
+            return
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{BUS_CHANNEL: self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def stop(self) -> None:
+        if self._thread:
+            self._thread.stop()
+            self._thread = None
+        if self._pubsub:
+            self._pubsub.close()
+            self._pubsub = None
+
+
+def _create_bus() -> LocalBus:
+    if REDIS_URL:
+        try:
+            return RedisBus(REDIS_URL)
+        except ImportError:
+            logger.warning("REDIS_URL is set but the redis package is not installed")
+    if WEB_CONCURRENCY > 1:
+        logger.warning("WEB_CONCURRENCY > 1 without REDIS_URL: in-process caches only coalesce requests")
+    return LocalBus()
+
+
+bus = _create_bus()
+
+
+# ==================== Выбор лидера ====================
+
+_LEADER_TTL_MS = 15 * 60 * 1000
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_held_locks: Dict[str, object] = {}
+_leader_lock = threading.Lock()
+
+
+def _try_file_lock(name: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        # Windows: многопроцессный режим не поддерживается, процесс всегда лидер
+        return True
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    path = os.path.join(LOCK_DIR, f"{name}.lock")
+    fh = open(path, "a+")
+    try:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        fh.close()
+        return False
+    # Держим файл открытым: блокировка живёт, пока жив процесс
+    _held_locks[name] = fh
+    return True
+
+
+def _try_redis_lock(name: str) -> bool:
+    client = bus._redis
+    key = f"coolcare:leader:{name}"
+    try:
+        if name in _held_locks:
+            if client.eval(_RENEW_SCRIPT, 1, key, NODE_ID, _LEADER_TTL_MS):
+                return True
+            del _held_locks[name]
+        if client.set(key, NODE_ID, nx=True, px=_LEADER_TTL_MS):
+            _held_locks[name] = key
+            return True
+    except Exception as e:
+        logger.warning(f"Leader lock check failed: {e}")
+    return False
+
+
+def is_leader(name: str) -> bool:
+    """
+    Пытается стать (или остаться) лидером для задачи name.
+    Вызывать перед каждым запуском фоновой задачи: при падении лидера
+    его роль подхватит другой воркер.
+    """
+    with _leader_lock:
+        if isinstance(bus, RedisBus):
+            return _try_redis_lock(name)
+        if name in _held_locks:
+            return True
+        return _try_file_lock(name)
@@ -1,23 +1,60 @@
 """
-Подключение к Supabase для CoolCare PWA
+Подключение к базе для CoolCare PWA
+
+DATABASE_BACKEND выбирает хранилище:
+  supabase — HTTP-клиент supabase (PostgREST), по умолчанию;
+  postgres — прямое подключение к Postgres по DATABASE_URL с пулом соединений
+             и подготовленными операторами (см. postgres_backend.py).
+Оба клиента дают один и тот же интерфейс table()/rpc(), поэтому остальной код
+импортирует supabase и supabase_admin, не зная, какое хранилище выбрано.
 """
 import os
-from supabase import create_client, Client
 from dotenv import load_dotenv
 
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # anon key для основных операций
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # service key для админских операций
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "supabase").lower()
+
+if DATABASE_BACKEND == "postgres":
+    from postgres_backend import PostgresClient
+
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if not DATABASE_URL:
+        raise ValueError("DATABASE_URL должен быть указан в .env при DATABASE_BACKEND=postgres")
+
+    supabase = PostgresClient(DATABASE_URL)
+    # Роль из DATABASE_URL не ограничена RLS — отдельный admin-клиент не нужен
+    supabase_admin = supabase
+
+elif DATABASE_BACKEND == "supabase":
+    from supabase import create_client, Client
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL и SUPABASE_KEY должны быть указаны в .env")
+    SUPABASE_URL = os.getenv("SUPABASE_URL")
+    SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # anon key для основных операций
+    SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # service key для админских операций
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("SUPABASE_URL и SUPABASE_KEY должны быть указаны в .env")
+
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    # Admin client для операций с пользователями (обход RLS)
+    if SUPABASE_SERVICE_KEY:
+        supabase_admin: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    else:
+        supabase_admin = supabase  # fallback к обычному client
 
-# Admin client для операций с пользователями (обход RLS)
-if SUPABASE_SERVICE_KEY:
-    supabase_admin: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 else:
-    supabase_admin = supabase  # fallback к обычному client
+    raise ValueError(f"Неизвестный DATABASE_BACKEND: {DATABASE_BACKEND} (supabase или postgres)")
+
+
+def instrument(client, wrap) -> None:
+    """
+    Оборачивает отправку каждого запроса к базе: wrap(send) -> send.
+    send получает httpx.Request (PostgREST) или postgres_backend.Statement.
+    """
+    if hasattr(client, "postgrest"):
+        session = client.postgrest.session
+        session.send = wrap(session.send)
+    else:
+        client.send = wrap(client.send)
@@ -0,0 +1,339 @@
+"""
+Геокодирование адресов на сервере с постоянным кэшем.
+
+Адрес нормализуется (регистр, ё, сокращения, квартира/офис отбрасываются) и
+ищется сначала в памяти процесса, затем в таблице geocode_cache одним запросом
+на пачку; внешний провайдер вызывается только для новых адресов. Провайдер
+выбирается GEOCODER: yandex (GEOCODER_API_KEY) или static — локальная замена
+из JSON-файла GEOCODER_STATIC_FILE для разработки и тестов.
+
+Фоновый поток лидера (cluster.is_leader) дозаполняет координаты заявок,
+созданных без них; запись заявки с адресом будит его через cluster.bus.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+import cache
+import cluster
+from database import supabase
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GEOCODER = os.getenv("GEOCODER", "yandex" if os.getenv("GEOCODER_API_KEY") else "")
+GEOCODER_API_KEY = os.getenv("GEOCODER_API_KEY", "")
+GEOCODER_STATIC_FILE = os.getenv("GEOCODER_STATIC_FILE", "")
+GEOCODE_BACKFILL_INTERVAL = float(os.getenv("GEOCODE_BACKFILL_INTERVAL", "300"))
+GEOCODE_BATCH_SIZE = int(os.getenv("GEOCODE_BATCH_SIZE", "100"))
+# Не больше стольких внешних запросов за один проход дозаполнения (квота провайдера)
+GEOCODE_BACKFILL_MAX_CALLS = int(os.getenv("GEOCODE_BACKFILL_MAX_CALLS", "500"))
+# Запрос пользователя ждёт провайдера не больше чем на столько адресов, остальное — фоном
+GEOCODE_REQUEST_MAX_CALLS = int(os.getenv("GEOCODE_REQUEST_MAX_CALLS", "3"))
+GEOCODE_MIN_INTERVAL = float(os.getenv("GEOCODE_MIN_INTERVAL", "0.2"))
+GEOCODE_RETRY_DAYS = int(os.getenv("GEOCODE_RETRY_DAYS", "7"))
+_MEMORY_SIZE = 5000
+_LOOKUP_CHUNK = 100
+
+Point = Tuple[float, float]
+
+# ==================== Нормализация ====================
+
+_ABBREVIATIONS = {
+    "г": "город", "гор": "город", "обл": "область", "р-н": "район", "мкр": "микрорайон",
+    "ул": "улица", "пр": "проспект", "пр-т": "проспект", "просп": "проспект",
+    "пер": "переулок", "ш": "шоссе", "наб": "набережная", "пл": "площадь",
+    "б-р": "бульвар", "бул": "бульвар", "корп": "корпус", "к": "корпус",
+    "стр": "строение",
+}
+# "д. 5" и "5" — один и тот же дом
+_DROP = {"д", "дом"}
+# Слова, которые вместе со следующим номером не влияют на координаты дома
+_DROP_WITH_NEXT = {"кв", "квартира", "оф", "офис", "под", "подъезд", "эт", "этаж"}
+
+
+def normalize_address(address: str) -> str:
+    """'Москва, ул. Ленина, д.5, кв. 12' -> 'москва улица ленина 5'"""
+    tokens = re.findall(r"[\w-]+", address.lower().replace("ё", "е"))
+    result = []
+    skip = False
+    for token in tokens:
+        if skip:
+            skip = False
+            continue
+        if token in _DROP_WITH_NEXT:
+            skip = True
+            continue
+        if token in _DROP:
+            continue
+        result.append(_ABBREVIATIONS.get(token, token))
+    return " ".join(result)
+
+
+# ==================== Провайдеры ====================
+
+class Geocoder:
+    """Провайдер: адрес -> (широта, долгота), None — адрес не найден, исключение — сбой."""
+
+    name = "none"
+
+    def geocode(self, address: str) -> Optional[Point]:
+        raise NotImplementedError
+
+
+class YandexGeocoder(Geocoder):
+    name = "yandex"
+    URL = "https://geocode-maps.yandex.ru/1.x/"
+
+    def __init__(self):
+        if not GEOCODER_API_KEY:
+            raise ValueError("GEOCODER_API_KEY is required for the yandex geocoder")
+        self._client = httpx.Client(timeout=10)
+
+    def geocode(self, address: str) -> Optional[Point]:
+        response = self._client.get(self.URL, params={
+            "apikey": GEOCODER_API_KEY,
+            "geocode": address,
+            "format": "json",
+            "results": 1,
+            "lang": "ru_RU",
+        })
+        response.raise_for_status()
+        members = response.json()["response"]["GeoObjectCollection"]["featureMember"]
+        if not members:
+            return None
+        lon, lat = members[0]["GeoObject"]["Point"]["pos"].split()
+        return float(lat), float(lon)
+
+
+class StaticGeocoder(Geocoder):
+    """Локальная замена провайдера: JSON {"адрес": [широта, долгота], ...}."""
+
+    name = "static"
+
+    def __init__(self):
+        points = {}
+        if GEOCODER_STATIC_FILE:
+            with open(GEOCODER_STATIC_FILE, encoding="utf-8") as f:
+                points = json.load(f)
+        self._points = {normalize_address(k): (float(v[0]), float(v[1])) for k, v in points.items()}
+
+    def geocode(self, address: str) -> Optional[Point]:
+        return self._points.get(normalize_address(address))
+
+
+PROVIDERS = {"yandex": YandexGeocoder, "static": StaticGeocoder}
+
+
+def create_provider() -> Optional[Geocoder]:
+    if not GEOCODER:
+        return None
+    factory = PROVIDERS.get(GEOCODER)
+    if factory is None:
+        logger.error(f"Unknown GEOCODER: {GEOCODER}")
+        return None
+    try:
+        return factory()
+    except Exception as e:
+        logger.error(f"Geocoder '{GEOCODER}' is not available: {e}")
+        return None
+
+
+# ==================== Сервис с кэшем ====================
+
+class GeocodingService:
+    def __init__(self, provider: Optional[Geocoder]):
+        self.provider = provider
+        self.provider_calls = 0
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Point]" = OrderedDict()
+        self._provider_lock = threading.Lock()
+        self._last_call = 0.0
+
+    def _remember(self, norm: str, point: Point) -> None:
+        with self._lock:
+            self._memory[norm] = point
+            self._memory.move_to_end(norm)
+            if len(self._memory) > _MEMORY_SIZE:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, norms: Iterable[str]) -> Dict[str, Optional[Point]]:
+        """Известные результаты: точка или None (не найден). Неизвестных адресов в ответе нет."""
+        known: Dict[str, Optional[Point]] = {}
+        missing = []
+        with self._lock:
+            for norm in norms:
+                if norm in self._memory:
+                    known[norm] = self._memory[norm]
+                else:
+                    missing.append(norm)
+        retry_before = datetime.now(timezone.utc) - timedelta(days=GEOCODE_RETRY_DAYS)
+        for i in range(0, len(missing), _LOOKUP_CHUNK):
+            rows = supabase.table("geocode_cache") \
+                .select("address_norm, latitude, longitude, status, updated_at") \
+                .in_("address_norm", missing[i:i + _LOOKUP_CHUNK]) \
+                .execute().data or []
+            for row in rows:
+                if row["status"] == "ok":
+                    point = (row["latitude"], row["longitude"])
+                    known[row["address_norm"]] = point
+                    self._remember(row["address_norm"], point)
+                elif datetime.fromisoformat(row["updated_at"].replace("Z", "+00:00")) > retry_before:
+                    known[row["address_norm"]] = None
+        return known
+
+    def _call_provider(self, address: str) -> Optional[Point]:
+        with self._provider_lock:
+            wait = self._last_call + GEOCODE_MIN_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                return self.provider.geocode(address)
+            finally:
+                self._last_call = time.monotonic()
+                self.provider_calls += 1
+
+    def geocode_many(self, addresses: Iterable[str], max_calls: Optional[int] = None) -> Dict[str, Optional[Point]]:
+        """
+        Координаты для списка адресов: {адрес: (широта, долгота) или None}.
+        Внешний провайдер вызывается по одному разу на новый нормализованный адрес.
+        """
+        norms = {}
+        for address in addresses:
+            norm = normalize_address(address or "")
+            if norm:
+                norms[address] = norm
+        known = self._lookup(set(norms.values()))
+
+        if self.provider is not None:
+            rows = []
+            calls = 0
+            for address, norm in norms.items():
+                if norm in known or (max_calls is not None and calls >= max_calls):
+                    continue
+                calls += 1
+                try:
+                    point = self._call_provider(address)
+                except Exception as e:
+                    # Сбой провайдера не кэшируем: адрес попробуем снова
+                    logger.warning(f"Geocoding failed for {address!r}: {e}")
+                    continue
+                known[norm] = point
+                rows.append({
+                    "address_norm": norm,
+                    "latitude": point[0] if point else None,
+                    "longitude": point[1] if point else None,
+                    "status": "ok" if point else "not_found",
+                    "provider": self.provider.name,
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                })
+                if point:
+                    self._remember(norm, point)
+            if rows:
+                supabase.table("geocode_cache").upsert(rows).execute()
+
+        return {address: known.get(norm) for address, norm in norms.items()}
+
+    def geocode(self, address: str) -> Optional[Point]:
+        return self.geocode_many([address]).get(address)
+
+
+service = GeocodingService(create_provider())
+
+
+# ==================== Дозаполнение координат заявок ====================
+
+def backfill_jobs(max_calls: Optional[int] = GEOCODE_BACKFILL_MAX_CALLS) -> int:
+    """Проставляет координаты заявкам с адресом и без координат; возвращает число заявок."""
+    filled = 0
+    calls_before = service.provider_calls
+    last_id = 0
+    while True:
+        rows = supabase.table("jobs") \
+            .select("id, address") \
+            .is_("latitude", "null") \
+            .neq("address", "") \
+            .gt("id", last_id) \
+            .order("id") \
+            .limit(GEOCODE_BATCH_SIZE) \
+            .execute().data or []
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        budget = None if max_calls is None else max(0, max_calls - (service.provider_calls - calls_before))
+        points = service.geocode_many([r["address"] for r in rows], max_calls=budget)
+
+        by_point = defaultdict(list)
+        for row in rows:
+            point = points.get(row["address"])
+            if point:
+                by_point[point].append(row["id"])
+        for (lat, lon), ids in by_point.items():
+            supabase.table("jobs").update({"latitude": lat, "longitude": lon}) \
+                .in_("id", ids).is_("latitude", "null").execute()
+            filled += len(ids)
+        if len(rows) < GEOCODE_BATCH_SIZE:
+            break
+
+    if filled:
+        cache.invalidate_jobs()
+        logger.info(f"Geocoding backfill: {filled} jobs, {service.provider_calls - calls_before} provider calls")
+    return filled
+
+
+class Backfill:
+    """Фоновый поток: раз в GEOCODE_BACKFILL_INTERVAL секунд или по сигналу через шину."""
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._wake.set()  # первый проход сразу после старта
+        self._thread = threading.Thread(target=self._run, name="geocode-backfill", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(GEOCODE_BACKFILL_INTERVAL)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if not cluster.is_leader("geocode"):
+                continue
+            try:
+                backfill_jobs()
+            except Exception:
+                logger.exception("Geocoding backfill failed")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._thread = None
+
+
+backfill = Backfill()
+
+cluster.bus.subscribe("geocode", lambda payload: backfill.wake())
+
+
+def request_backfill() -> None:
+    """Вызывается после записи заявки с адресом, но без координат."""
+    cluster.bus.publish("geocode")
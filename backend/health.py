@@ -0,0 +1,130 @@
+"""
+Состояние сервиса для балансировщика: liveness, readiness и прогрев при старте.
+
+Пробы балансировщика не ходят в базу: фоновый поток раз в HEALTH_PROBE_INTERVAL
+секунд проверяет Supabase и запоминает результат, а /health/ready отдаёт
+последнее известное состояние. Сервис готов, когда прогрев завершён и последняя
+проверка базы успешна и не старше HEALTH_STALE_AFTER секунд.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from database import supabase, supabase_admin
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "10"))
+HEALTH_STALE_AFTER = float(os.getenv("HEALTH_STALE_AFTER", str(HEALTH_PROBE_INTERVAL * 3)))
+
+
+class HealthState:
+    """Кэшированное состояние зависимостей; обновляется только фоновым потоком и прогревом."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.warmed = False
+        self.shutting_down = False
+        self.warmup: Dict[str, dict] = {}
+        self.database = {"status": "unknown", "latency_ms": None, "error": None, "checked_at": None}
+        self._last_ok = 0.0
+
+    def probe(self) -> bool:
+        """Один запрос к базе с замером задержки."""
+        start = time.perf_counter()
+        try:
+            supabase.table("users").select("id").limit(1).execute()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)[:200]
+        latency = round((time.perf_counter() - start) * 1000, 1)
+        with self._lock:
+            self.database = {
+                "status": "connected" if ok else "error",
+                "latency_ms": latency,
+                "error": error,
+                "checked_at": datetime.now(timezone.utc).isoformat(),
+            }
+            if ok:
+                self._last_ok = time.monotonic()
+        if not ok:
+            logger.warning(f"Health probe failed: {error}")
+        return ok
+
+    def database_ok(self) -> bool:
+        with self._lock:
+            return self._last_ok > 0 and time.monotonic() - self._last_ok <= HEALTH_STALE_AFTER
+
+    def is_ready(self) -> bool:
+        return self.warmed and not self.shutting_down and self.database_ok()
+
+    def snapshot(self) -> dict:
+        import push_service
+        import upcoming
+        with self._lock:
+            database = dict(self.database)
+            warmup = dict(self.warmup)
+        return {
+            "status": "ready" if self.is_ready() else "not_ready",
+            "warmed": self.warmed,
+            "database": database,
+            "push": push_service.status(),
+            "upcoming": upcoming.model.status(),
+            "warmup": warmup,
+        }
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-probe", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(HEALTH_PROBE_INTERVAL):
+            self.probe()
+
+    def stop(self) -> None:
+        self.shutting_down = True
+        self._stop.set()
+        self._thread = None
+
+
+state = HealthState()
+
+
+def open_connections() -> None:
+    """Первая проверка базы заодно открывает соединения (TLS) обоих клиентов."""
+    if not state.probe():
+        raise RuntimeError(state.database["error"])
+    if supabase_admin is not supabase:
+        supabase_admin.table("users").select("id").limit(1).execute()
+
+
+def warm_up(steps: Dict[str, Callable[[], None]]) -> None:
+    """
+    Выполняет шаги прогрева по порядку. Ошибка шага не останавливает запуск:
+    она попадает в /health/ready, а готовность определит следующая проверка базы.
+    """
+    for name, step in steps.items():
+        start = time.perf_counter()
+        try:
+            step()
+            result = {"status": "ok"}
+        except Exception as e:
+            logger.warning(f"Warm-up step '{name}' failed: {e}")
+            result = {"status": "error", "error": str(e)[:200]}
+        result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        with state._lock:
+            state.warmup[name] = result
+    state.warmed = True
+    logger.info(f"Warm-up finished: {state.warmup}")
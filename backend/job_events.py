@@ -0,0 +1,189 @@
+"""
+История заявок (job_events) с отложенной пакетной записью.
+
+Обработчики запросов только кладут событие в очередь процесса; фоновый поток
+пишет их в базу пачками — раз в JOB_EVENTS_FLUSH_INTERVAL секунд или сразу,
+как накопится JOB_EVENTS_BATCH_SIZE событий. При остановке приложения
+(lifespan) очередь дописывается до конца.
+
+Временные сбои (сеть, 5xx, таймаут) повторяются с нарастающей паузой, но не
+больше JOB_EVENTS_MAX_ATTEMPTS раз. Ошибку, которая не пройдёт при повторе
+(ограничение, схема, некорректные данные), пачка не ждёт: строки пишутся по
+одной, а отвергнутые базой уходят в лог с полным содержимым и отбрасываются,
+чтобы не задерживать следующие события.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+from postgrest.exceptions import APIError
+
+from database import supabase
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JOB_EVENTS_FLUSH_INTERVAL = float(os.getenv("JOB_EVENTS_FLUSH_INTERVAL", "0.3"))
+JOB_EVENTS_BATCH_SIZE = int(os.getenv("JOB_EVENTS_BATCH_SIZE", "200"))
+# Если база недоступна долго, старые события вытесняются, а не копятся без предела
+JOB_EVENTS_MAX_QUEUE = 50000
+JOB_EVENTS_MAX_ATTEMPTS = int(os.getenv("JOB_EVENTS_MAX_ATTEMPTS", "5"))
+_RETRY_DELAY_MAX = 10.0
+# Классы SQLSTATE, которые не исправятся повтором: данные, ограничения, схема
+_PERMANENT_SQLSTATES = ("22", "23", "42")
+
+
+def is_permanent(error: Exception) -> bool:
+    if not isinstance(error, APIError):
+        return False
+    code = error.code or ""
+    # PGRST1xx/2xx — ошибка запроса (например, нет такой колонки), 5xx/PGRST0xx — сбой сервера
+    return code.startswith(_PERMANENT_SQLSTATES) or code.startswith(("PGRST1", "PGRST2"))
+
+
+
+class WriteBehindQueue:
+    """Очередь строк для одной таблицы: многострочные вставки из фонового потока."""
+
+    def __init__(self, table: str, batch_size: int, interval: float, max_size: int):
+        self.table = table
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.max_size = max_size
+        self.dropped = 0
+        self.dead_lettered = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._closed = False
+
+    def put(self, row: dict) -> None:
+        with self._cond:
+            if self._closed:
+                # Приложение уже остановлено — пишем сразу, чтобы не потерять
+                direct = True
+            else:
+                direct = False
+                if len(self._items) >= self.max_size:
+                    self._items.popleft()
+                    self.dropped += 1
+                self._items.append(row)
+                if self._thread is None:
+                    self._start_locked()
+                elif len(self._items) >= self.batch_size:
+                    self._cond.notify()
+        if direct:
+            self._write([row])
+
+    def start(self) -> None:
+        with self._cond:
+            self._closed = False
+            if self._thread is None:
+                self._start_locked()
+
+    def _start_locked(self) -> None:
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.table}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        delay = self.interval
+        attempts = 0
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._items) < self.batch_size:
+                    self._cond.wait(self.interval)
+                if not self._items:
+                    if self._stopping:
+                        return
+                    continue
+                batch = [self._items.popleft() for _ in range(min(len(self._items), self.batch_size))]
+
+            if self._write(batch):
+                delay = self.interval
+                attempts = 0
+                continue
+            attempts += 1
+            if attempts >= JOB_EVENTS_MAX_ATTEMPTS:
+                self._dead_letter(batch, f"gave up after {attempts} attempts")
+                delay = self.interval
+                attempts = 0
+                continue
+            with self._cond:
+                if self._stopping:
+                    logger.error(f"{self.table}: {len(batch) + len(self._items)} events lost on shutdown")
+                    self._items.clear()
+                    return
+                # Возвращаем пачку в начало очереди и ждём с нарастающей паузой
+                self._items.extendleft(reversed(batch))
+            time.sleep(delay)
+            delay = min(delay * 2, _RETRY_DELAY_MAX)
+
+    def _write(self, batch: list) -> bool:
+        """True — пачка записана или окончательно отброшена; False — повторить позже."""
+        try:
+            supabase.table(self.table).insert(batch).execute()
+            return True
+        except Exception as e:
+            error = e
+        if not is_permanent(error):
+            logger.warning(f"{self.table}: failed to write {len(batch)} events: {error}")
+            return False
+        if len(batch) == 1:
+            self._dead_letter(batch, str(error))
+            return True
+        # Одна плохая строка не должна стоить остальных: пишем по одной
+        for i, row in enumerate(batch):
+            if not self._write([row]):
+                # Временный сбой посреди разбора — остаток вернётся в очередь
+                with self._cond:
+                    self._items.extendleft(reversed(batch[i:]))
+                return True
+        return True
+
+    def _dead_letter(self, batch: list, reason: str) -> None:
+        self.dead_lettered += len(batch)
+        logger.error(f"{self.table}: dropped {len(batch)} events ({reason}): "
+                     f"{json.dumps(batch, ensure_ascii=False, default=str)}")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Дописывает очередь и останавливает поток (вызывается из lifespan)."""
+        with self._cond:
+            self._closed = True
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread:
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.error(f"{self.table}: flush did not finish in {timeout}s")
+        with self._cond:
+            self._thread = None
+        if self.dropped:
+            logger.warning(f"{self.table}: {self.dropped} events dropped due to queue overflow")
+
+
+queue = WriteBehindQueue("job_events", JOB_EVENTS_BATCH_SIZE, JOB_EVENTS_FLUSH_INTERVAL, JOB_EVENTS_MAX_QUEUE)
+
+
+def record(event: str, job: dict, actor_id: Optional[int], status: Optional[str] = None) -> None:
+    """
+    Ставит событие заявки в очередь: created | status | deleted.
+    Время фиксируется сейчас, а не в момент записи в базу.
+    """
+    queue.put({
+        "job_id": job["id"],
+        "user_id": job.get("user_id"),
+        "actor_id": actor_id,
+        "event": event,
+        "status": status if status is not None else job.get("status"),
+        "occurred_at": datetime.now(timezone.utc).isoformat(),
+    })
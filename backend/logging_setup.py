@@ -0,0 +1,194 @@
+"""
+Неблокирующее логирование CoolCare.
+
+Обработчики запросов только кладут запись в ограниченную очередь (QueueHandler),
+а на диск и в консоль её пишет отдельный поток (QueueListener) — задержка
+сброса файла больше не попадает во время ответа. При переполнении очереди
+записи отбрасываются, а не блокируют запрос.
+
+LOG_FORMAT=json (по умолчанию) — одна JSON-строка на запись, text — прежний формат.
+LOG_SAMPLE_RATES="uvicorn.access=0.1,httpx=0.2" — доля INFO-записей, которые
+сохраняются для указанных логгеров; предупреждения, ошибки и ответы 4xx/5xx
+в access-логе сохраняются всегда.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+# Идентификатор текущего запроса; задаётся middleware в main.py
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "color_message"}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись в одну JSON-строку; поля из extra=... попадают в неё как есть."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Проставляет request_id в потоке, где запись создана (до передачи в очередь)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Сохраняет долю rate INFO/DEBUG-записей логгера."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        status = _access_status(record)
+        if status is not None and status >= 400:
+            return True
+        return random.random() < self.rate
+
+
+def _access_status(record: logging.LogRecord) -> Optional[int]:
+    # uvicorn.access: args = (client, method, path, http_version, status)
+    if record.name == "uvicorn.access" and isinstance(record.args, tuple) and len(record.args) == 5:
+        return record.args[4]
+    return None
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler, который не ждёт место в очереди и не форматирует запись целиком."""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Аргументы и исключение превращаем в строки здесь: объекты запроса
+        # не должны жить в очереди. JSON собирает уже поток записи.
+        record = copy.copy(record)
+        status = _access_status(record)
+        if status is not None:
+            record.client, record.method, record.path, _, record.status = record.args
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def _parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for part in value.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            try:
+                rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+            except ValueError:
+                pass
+    return rates
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging() -> None:
+    """Настраивает корневой логгер и логгеры uvicorn (повторный вызов ничего не делает)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=10*1024*1024, backupCount=5, encoding="utf-8")
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    # uvicorn настраивает свои логгеры с собственными обработчиками — переводим их на общую очередь
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access", "fastapi"):
+        log = logging.getLogger(name)
+        log.handlers = []
+        log.propagate = True
+        log.setLevel(LOG_LEVEL)
+
+    for name, rate in _parse_sample_rates(LOG_SAMPLE_RATES).items():
+        logging.getLogger(name).addFilter(SamplingFilter(rate))
+
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Дописывает очередь и останавливает поток записи."""
+    global _listener
+    if _listener is None:
+        return
+    try:
+        _listener.stop()
+    except queue.Full:
+        pass  # поток записи — демон и завершится вместе с процессом
+    _listener = None
+    if NonBlockingQueueHandler.dropped:
+        # Поток записи уже остановлен — сообщаем напрямую в stderr
+        sys.stderr.write(f"logging: {NonBlockingQueueHandler.dropped} records dropped due to queue overflow\n")
@@ -1,39 +1,40 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from contextlib import asynccontextmanager
+from pydantic import ValidationError
+from postgrest.exceptions import APIError
 from typing import List, Optional
-from datetime import datetime, date, timezone
+from datetime import datetime, date, timedelta, timezone
 import os
+import io
+import asyncio
+import csv
+import json
+import tempfile
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from dotenv import load_dotenv
 
 from database import supabase
 import schemas
 import auth
+import cache
+import catalog
+import cluster
+import geocoding
+import health
+import job_events
 import logging
-from logging.handlers import RotatingFileHandler
-
-# === НАСТРОЙКА ЛОГГИРОВАНИЯ ===
-log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-log_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.log')
-file_handler = RotatingFileHandler(log_file, maxBytes=10*1024*1024, backupCount=5, encoding='utf-8')
-file_handler.setFormatter(log_formatter)
-file_handler.setLevel(logging.INFO)
-
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(log_formatter)
-console_handler.setLevel(logging.INFO)
-
-# Настройка корневого логгера
-logging.basicConfig(level=logging.INFO, handlers=[file_handler, console_handler])
-
-# Логгеры FastAPI/Uvicorn
-for log_name in ["uvicorn", "uvicorn.error", "uvicorn.access", "fastapi"]:
-    logger = logging.getLogger(log_name)
-    logger.addHandler(file_handler)
-    logger.setLevel(logging.INFO)
+import logging_setup
+import profiling
+import ratelimit
+import upcoming
 
+# === НАСТРОЙКА ЛОГГИРОВАНИЯ (очередь + отдельный поток записи, см. logging_setup.py) ===
+logging_setup.setup_logging()
 logger = logging.getLogger(__name__)
 
 # Загружаем переменные окружения
@@ -43,18 +44,42 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle manager: запускаем фоновые задачи при старте"""
+    cluster.bus.start()
+    job_events.queue.start()
+    # Прогрев до начала приёма запросов: uvicorn не слушает порт, пока lifespan не вернул управление
+    await run_in_threadpool(health.warm_up, {
+        "supabase": health.open_connections,
+        "users": auth.warm_user_cache,
+        "services": catalog.services_catalog.warm,
+        "spa": warm_spa_index,
+        "upcoming": upcoming.model.load,
+    })
+    health.state.start()
+    geocoding.backfill.start()
+    upcoming.model.start()
     try:
         from push_service import start_reminder_loop
         start_reminder_loop()
     except ImportError:
-        print("⚠️  push_service not found, skipping reminder loop")
+        logger.warning("push_service not found, skipping reminder loop")
     except Exception as e:
-        print(f"⚠️  Error starting reminder loop: {e}")
+        logger.warning(f"Error starting reminder loop: {e}")
     yield
+    # Балансировщик перестаёт слать запросы, пока дописываются очереди
+    health.state.stop()
+    geocoding.backfill.stop()
+    upcoming.model.stop()
+    # Дописываем накопленную историю заявок до остановки процесса
+    await run_in_threadpool(job_events.queue.stop)
+    cluster.bus.stop()
 
 
 app = FastAPI(title="CoolCare PWA API", version="3.0.0", lifespan=lifespan)
 
+# === Ограничение частоты и сброс нагрузки (см. ratelimit.py) ===
+# Добавляется первым, чтобы оказаться внутри CORS: ответы 429/503 читаются браузером
+ratelimit.install(app)
+
 # === CORS Middleware ===
 app.add_middleware(
     CORSMiddleware,
@@ -62,8 +87,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
+# === Сжатие ответов (списки заявок, /bootstrap) ===
+# Потоковые выгрузки не сжимаем: GZip буферизует тело, и первые строки
+# файла перестают уходить клиенту сразу
+GZIP_EXCLUDED_PREFIXES = ("/admin/export/",)
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(GZIP_EXCLUDED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1000)
+
+# === Идентификатор запроса для логов (X-Request-ID) ===
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    # Каждый запрос обрабатывается в своей задаче asyncio, поэтому значение
+    # не утекает в другие запросы и доступно access-логу uvicorn после ответа
+    rid = request.headers.get("x-request-id", "")[:64] or logging_setup.new_request_id()
+    logging_setup.request_id.set(rid)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = rid
+    return response
+
+# === Профилирование запросов по требованию (PROFILE_ENABLED, см. profiling.py) ===
+# До объявления маршрутов: эндпоинты оборачиваются при регистрации
+profiling.install(app)
+
 # === Пути к фронтенду ===
 FRONTEND_DIST = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend', 'dist')
 DISPATCHER_DIST = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dispatcher', 'dist')
@@ -71,14 +126,28 @@ DISPATCHER_DIST = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(_
 
 # ==================== Health ====================
 
+# Пробы отвечают из памяти (async, без пула потоков): не ждут медленные запросы и не нагружают базу
+
 @app.get("/health")
-def health_check():
-    """Проверка доступности сервера и Supabase"""
-    try:
-        result = supabase.table("users").select("id").limit(1).execute()
+async def health_check():
+    """Проверка доступности сервера и Supabase (по последней фоновой проверке)"""
+    database = health.state.database
+    if health.state.database_ok():
         return {"status": "ok", "database": "connected"}
-    except Exception as e:
-        return {"status": "degraded", "database": str(e)}
+    return {"status": "degraded", "database": database["error"] or database["status"]}
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness: процесс жив и цикл событий отвечает"""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def health_ready(response: Response):
+    """Readiness: прогрев завершён и база доступна; иначе 503"""
+    snapshot = health.state.snapshot()
+    if snapshot["status"] != "ready":
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return snapshot
 
 
 # ==================== Admin ====================
@@ -103,15 +172,65 @@ def calculate_job_total(job: dict) -> float:
             total += p * q
     return total
 
+def set_customer_phone_norm(job_data: dict) -> None:
+    """Заполняет customer_phone_norm для поиска истории клиента по телефону"""
+    if "customer_phone" in job_data:
+        phone = job_data["customer_phone"]
+        job_data["customer_phone_norm"] = auth.normalize_phone(phone) if phone else None
+
 @app.get("/admin/jobs", response_model=List[schemas.JobResponse])
-def get_all_jobs_admin(current_user: dict = Depends(check_admin)):
-    """Получение ВСЕХ заявок всех мастеров для диспетчера"""
+def get_all_jobs_admin(
+    day: Optional[str] = None,
+    tz: str = "UTC",
+    user_id: Optional[int] = None,
+    current_user: dict = Depends(check_admin)
+):
+    """Получение ВСЕХ заявок всех мастеров для диспетчера (или только за день day=YYYY-MM-DD)"""
+    if day:
+        return get_jobs_for_day(day, tz, user_id)
+    return cache.admin_cache.get_or_load("admin:jobs", _load_all_jobs)
+
+def _load_all_jobs() -> list:
     result = supabase.table("jobs").select("*").order("scheduled_at", desc=True).execute()
     return result.data or []
 
+SEARCH_MAX_LIMIT = 100
+
+def search_jobs_query(q: str, user_id: Optional[int], limit: int, offset: int) -> dict:
+    """Ранжированный поиск через функцию search_jobs (tsvector + pg_trgm индексы)"""
+    query = q.strip()
+    # Номер заявки ищется и из одной цифры
+    if len(query) < 2 and not query.isdigit():
+        raise HTTPException(status_code=400, detail="Search query must be at least 2 characters")
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+
+    # Фрагмент телефона ищем по цифрам: "+7 (999) 12" -> "99912"
+    if all(c.isdigit() or c in "+-() " for c in query) and any(c.isdigit() for c in query):
+        query = "".join(c for c in query if c.isdigit())
+        if len(query) == 11 and query[0] in "78":
+            query = query[1:]
+
+    result = supabase.rpc("search_jobs", {
+        "p_query": query,
+        "p_user_id": user_id,
+        "p_limit": limit + 1,
+        "p_offset": offset,
+    }).execute()
+    rows = result.data or []
+    return {"items": rows[:limit], "limit": limit, "offset": offset, "has_more": len(rows) > limit}
+
+@app.get("/admin/jobs/search", response_model=schemas.JobSearchResponse)
+def search_jobs_admin(q: str, limit: int = 20, offset: int = 0, current_user: dict = Depends(check_admin)):
+    """Поиск по заявкам всех мастеров: клиент, телефон, адрес, заголовок, описание"""
+    return search_jobs_query(q, None, limit, offset)
+
 @app.get("/admin/stats", response_model=dict)
 def get_admin_stats(current_user: dict = Depends(check_admin)):
     """Общая статистика по всей системе для диспетчера"""
+    return cache.admin_cache.get_or_load("admin:stats", _compute_admin_stats)
+
+def _compute_admin_stats() -> dict:
     jobs_res = supabase.table("jobs").select("status, price, job_type, completed_at, created_at").execute()
     users_res = supabase.table("users").select("id, is_active").execute()
     
@@ -166,15 +285,38 @@ def update_user_admin(user_id: int, update_data: schemas.UserUpdate, current_use
     result = supabase.table("users").update(data).eq("id", user_id).execute()
     if not result.data:
         raise HTTPException(status_code=404, detail="User not found")
+    cache.invalidate_user(user_id)
+    # Роль и статус влияют и на статистику, и на список мастеров в обзоре
+    cache.invalidate("admin:")
     return result.data[0]
 
-@app.put("/admin/jobs/{job_id}", response_model=schemas.JobResponse)
+@app.get("/admin/workers/overview", response_model=List[schemas.WorkerOverview])
+def get_workers_overview(tz: str = "UTC", current_user: dict = Depends(check_admin)):
+    """Загрузка активных мастеров: заявки на сегодня, открытые, выполненные и выручка за месяц, ближайшая заявка"""
+    zone = resolve_timezone(tz)
+    return cache.admin_cache.get_or_load(f"admin:workers:{tz}", lambda: _load_workers_overview(zone))
+
+def _load_workers_overview(zone: ZoneInfo) -> list:
+    now = datetime.now(timezone.utc)
+    today = now.astimezone(zone).date()
+    today_start, today_end = local_range_utc(today, today + timedelta(days=1), zone)
+    result = supabase.rpc("workers_overview", {
+        "p_today_start": today_start,
+        "p_today_end": today_end,
+        "p_month_start": today.replace(day=1).isoformat(),
+        "p_now": now.isoformat(),
+    }).execute()
+    return result.data or []
+
+@app.put("/admin/jobs/{job_id}", response_model=schemas.JobWriteResponse)
 def update_job_admin(job_id: int, job_update: schemas.JobUpdate, current_user: dict = Depends(check_admin)):
     """Админское обновление ЛЮБОЙ заявки"""
     update_data = job_update.model_dump(exclude_unset=True)
     if not update_data:
         res = supabase.table("jobs").select("*").eq("id", job_id).execute()
         return res.data[0] if res.data else None
+    validate_services(update_data.get("services"))
+    validate_duration(update_data.get("duration_minutes"))
 
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
@@ -187,15 +329,25 @@ def update_job_admin(job_id: int, job_update: schemas.JobUpdate, current_user: d
                     update_data[field] = dt.isoformat()
                 except: pass
 
+    set_customer_phone_norm(update_data)
     result = supabase.table("jobs").update(update_data).eq("id", job_id).execute()
     if not result.data:
         raise HTTPException(status_code=404, detail="Job not found")
-    return result.data[0]
-
-@app.post("/admin/jobs", response_model=schemas.JobResponse)
+    cache.invalidate_jobs()
+    # Форма диспетчера присылает status и без смены: повтор того же статуса
+    # отбрасывает представление job_status_transitions, лишнего чтения не делаем
+    if "status" in update_data:
+        job_events.record("status", result.data[0], current_user["id"])
+    upcoming.job_saved(result.data[0])
+    request_geocoding(result.data[0])
+    return with_conflicts(result.data[0])
+
+@app.post("/admin/jobs", response_model=schemas.JobWriteResponse)
 def create_job_admin(job: schemas.JobCreate, current_user: dict = Depends(check_admin)):
     """Админское создание заявки для любого мастера"""
     job_data = job.model_dump(exclude_unset=True)
+    validate_services(job_data.get("services"))
+    validate_duration(job_data.get("duration_minutes"))
     
     # Обработка дат
     for field in ["scheduled_at", "completed_at"]:
@@ -214,23 +366,372 @@ def create_job_admin(job: schemas.JobCreate, current_user: dict = Depends(check_
     if not job_data.get("user_id"):
         raise HTTPException(status_code=400, detail="Worker (user_id) must be assigned")
 
+    set_customer_phone_norm(job_data)
     result = supabase.table("jobs").insert(job_data).execute()
     if not result.data:
         raise HTTPException(status_code=500, detail="Failed to create job")
-    return result.data[0]
+    cache.invalidate_jobs()
+    job_events.record("created", result.data[0], current_user["id"])
+    upcoming.job_saved(result.data[0])
+    request_geocoding(result.data[0])
+    return with_conflicts(result.data[0])
 
 @app.delete("/admin/jobs/{job_id}")
 def delete_job_admin(job_id: int, current_user: dict = Depends(check_admin)):
     """Админское удаление ЛЮБОЙ заявки"""
-    supabase.table("jobs").delete().eq("id", job_id).execute()
+    result = supabase.table("jobs").delete().eq("id", job_id).execute()
+    cache.invalidate_jobs()
+    upcoming.jobs_deleted([job["id"] for job in (result.data or [])])
+    for job in (result.data or []):
+        job_events.record("deleted", job, current_user["id"])
     return {"message": "Job deleted by admin"}
 
+# --- ЭКСПОРТ ДЛЯ БУХГАЛТЕРИИ ---
+
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+EXPORT_COLUMNS = [
+    "id", "scheduled_at", "completed_at", "status", "job_type", "priority",
+    "user_id", "master_name", "customer_name", "customer_phone", "address",
+    "title", "description", "price", "total",
+]
+
+def parse_date_param(value: Optional[str], name: str) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} format, use YYYY-MM-DD")
+
+def resolve_timezone(tz: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+
+def local_range_utc(start: date, end: date, tz: ZoneInfo) -> tuple:
+    """Границы [start, end) локальных дат в UTC ISO — для фильтра по индексу scheduled_at"""
+    to_utc = lambda d: datetime(d.year, d.month, d.day, tzinfo=tz).astimezone(timezone.utc).isoformat()
+    return to_utc(start), to_utc(end)
+
+def get_calendar_month(month: str, tz: str, user_id: Optional[int]) -> dict:
+    """Сводка месяца одним сгруппированным запросом (jobs_calendar) по диапазону scheduled_at"""
+    try:
+        first = datetime.strptime(month, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid month format, use YYYY-MM")
+    next_first = (first + timedelta(days=32)).replace(day=1)
+    zone = resolve_timezone(tz)
+    start_utc, end_utc = local_range_utc(first, next_first, zone)
+
+    rows = supabase.rpc("jobs_calendar", {
+        "p_from": start_utc,
+        "p_to": end_utc,
+        "p_tz": tz,
+        "p_user_id": user_id,
+    }).execute().data or []
+
+    days = {}
+    for row in rows:
+        day = days.setdefault(row["day"], {"date": row["day"], "jobs_count": 0, "by_status": {}, "revenue": 0.0})
+        day["jobs_count"] += row["jobs_count"]
+        day["by_status"][row["status"]] = row["jobs_count"]
+        day["revenue"] += row["revenue"] or 0
+    return {"month": month, "timezone": tz, "days": list(days.values())}
+
+@app.get("/admin/calendar", response_model=schemas.CalendarMonth)
+def get_admin_calendar(month: str, tz: str = "UTC", user_id: Optional[int] = None,
+                       current_user: dict = Depends(check_admin)):
+    """Календарь диспетчера: по всем мастерам или по одному (user_id)"""
+    return get_calendar_month(month, tz, user_id)
+
+def iter_export_rows(date_from: Optional[date], date_to: Optional[date], user_id: Optional[int],
+                     status_filter: Optional[str], job_type: Optional[str]):
+    """Постранично (keyset по id) читает заявки и отдаёт строки с посчитанным total"""
+    masters = {u["id"]: u.get("name") for u in (supabase.table("users").select("id, name").execute().data or [])}
+    last_id = 0
+    while True:
+        query = supabase.table("jobs").select("*").gt("id", last_id)
+        if date_from:
+            query = query.gte("scheduled_at", date_from.isoformat())
+        if date_to:
+            query = query.lt("scheduled_at", (date_to + timedelta(days=1)).isoformat())
+        if user_id:
+            query = query.eq("user_id", user_id)
+        if status_filter:
+            query = query.eq("status", status_filter)
+        if job_type:
+            query = query.eq("job_type", job_type)
+        page = query.order("id").limit(EXPORT_PAGE_SIZE).execute().data or []
+
+        for job in page:
+            row = {col: job.get(col) for col in EXPORT_COLUMNS}
+            row["master_name"] = masters.get(job.get("user_id"))
+            row["total"] = calculate_job_total(job)
+            yield row
+
+        # Короткая страница — не всегда конец: PostgREST режет ответ по max-rows,
+        # даже если EXPORT_PAGE_SIZE больше. Конец — только пустая страница
+        if not page:
+            return
+        last_id = page[-1]["id"]
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel корректно открыл кириллицу
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([row[col] if row[col] is not None else "" for col in EXPORT_COLUMNS])
+        yield buffer.getvalue()
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+def export_jobs_response(fmt: str, date_from: Optional[str], date_to: Optional[str], user_id: Optional[int],
+                         status_filter: Optional[str], job_type: Optional[str]) -> StreamingResponse:
+    # Параметры проверяем до начала потока: после первых байт вернуть 400 уже нельзя
+    rows = iter_export_rows(parse_date_param(date_from, "date_from"), parse_date_param(date_to, "date_to"),
+                            user_id, status_filter, job_type)
+    if fmt == "csv":
+        body, media_type = stream_csv(rows), "text/csv; charset=utf-8"
+    else:
+        body, media_type = stream_ndjson(rows), "application/x-ndjson"
+    filename = f"jobs_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/admin/export/jobs.csv")
+def export_jobs_csv(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    user_id: Optional[int] = None,
+    status_filter: Optional[str] = None,
+    job_type: Optional[str] = None,
+    current_user: dict = Depends(check_admin)
+):
+    """Потоковый экспорт заявок в CSV (фильтры: даты по scheduled_at, мастер, статус, тип)"""
+    return export_jobs_response("csv", date_from, date_to, user_id, status_filter, job_type)
+
+@app.get("/admin/export/jobs.ndjson")
+def export_jobs_ndjson(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    user_id: Optional[int] = None,
+    status_filter: Optional[str] = None,
+    job_type: Optional[str] = None,
+    current_user: dict = Depends(check_admin)
+):
+    """Потоковый экспорт заявок в NDJSON (по одной заявке на строку)"""
+    return export_jobs_response("ndjson", date_from, date_to, user_id, status_filter, job_type)
+
+# --- ИМПОРТ ЗАЯВОК (CSV / NDJSON) ---
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_ERRORS = 1000
+# Тело запроса до этого размера держим в памяти, больше — во временном файле
+IMPORT_SPOOL_SIZE = 8 * 1024 * 1024
+IMPORT_JSON_FIELDS = ("services", "checklist")
+
+def iter_import_records(stream, fmt: str):
+    """(номер записи CSV / строки NDJSON, dict | ошибка разбора) — по одной, без чтения файла целиком"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for i, row in enumerate(csv.DictReader(text), start=1):
+            record = {k.strip(): v for k, v in row.items() if k and v not in (None, "")}
+            for field in IMPORT_JSON_FIELDS:
+                if isinstance(record.get(field), str):
+                    try:
+                        record[field] = json.loads(record[field])
+                    except ValueError:
+                        pass  # ошибку покажет валидация схемы
+            yield i, record
+        return
+    for i, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield i, f"Invalid JSON: {e}"
+            continue
+        yield i, record if isinstance(record, dict) else "Row must be a JSON object"
+
+def prepare_import_row(record: dict, masters: dict, master_ids: set) -> dict:
+    """Валидация одной строки по schemas.JobCreate и определение мастера (user_id или master_phone)"""
+    master_phone = record.pop("master_phone", None)
+    if not record.get("user_id") and master_phone:
+        record["user_id"] = masters.get(auth.normalize_phone(str(master_phone)))
+        if not record["user_id"]:
+            raise ValueError(f"Unknown master_phone: {master_phone}")
+    try:
+        job = schemas.JobCreate.model_validate(record)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+    if not job.user_id:
+        raise ValueError("Worker (user_id or master_phone) must be assigned")
+    if job.user_id not in master_ids:
+        raise ValueError(f"Unknown user_id: {job.user_id}")
+    try:
+        validate_services(job.services)
+        validate_duration(job.duration_minutes)
+    except HTTPException as e:
+        raise ValueError(e.detail)
+
+    # mode="json" сразу даёт ISO-строки для дат
+    job_data = job.model_dump(mode="json", exclude_unset=True)
+    job_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    set_customer_phone_norm(job_data)
+    return job_data
+
+def insert_import_batch(batch: list, report: dict, actor_id: int) -> None:
+    """Многострочная вставка; при ошибке базы строки вставляются по одной, чтобы найти виноватую"""
+    try:
+        # Строки с разным набором колонок: пропущенные получают DEFAULT, а не NULL
+        result = supabase.table("jobs").insert([job for _, job in batch], default_to_null=False).execute()
+        report["imported"] += len(batch)
+        for job in (result.data or []):
+            job_events.record("created", job, actor_id)
+        return
+    except Exception as e:
+        if len(batch) == 1:
+            add_import_error(report, batch[0][0], f"Database error: {e}")
+            return
+    for row_num, job in batch:
+        insert_import_batch([(row_num, job)], report, actor_id)
+
+def add_import_error(report: dict, row_num: int, message: str) -> None:
+    report["failed"] += 1
+    if len(report["errors"]) < IMPORT_MAX_ERRORS:
+        report["errors"].append({"row": row_num, "error": message})
+    else:
+        report["errors_truncated"] = True
+
+def import_jobs(stream, fmt: str, dry_run: bool, actor_id: int) -> dict:
+    users = supabase.table("users").select("id, phone").execute().data or []
+    masters = {auth.normalize_phone(u["phone"]): u["id"] for u in users if u.get("phone")}
+    master_ids = {u["id"] for u in users}
+
+    report = {"total": 0, "imported": 0, "failed": 0, "dry_run": dry_run, "errors": [], "errors_truncated": False}
+    batch = []
+    try:
+        for row_num, record in iter_import_records(stream, fmt):
+            report["total"] += 1
+            if isinstance(record, str):
+                add_import_error(report, row_num, record)
+                continue
+            try:
+                batch.append((row_num, prepare_import_row(record, masters, master_ids)))
+            except ValueError as e:
+                add_import_error(report, row_num, str(e))
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                if not dry_run:
+                    insert_import_batch(batch, report, actor_id)
+                batch = []
+        if batch and not dry_run:
+            insert_import_batch(batch, report, actor_id)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Cannot parse {fmt.upper()} after row {report['total']}: {e}")
+    finally:
+        if report["imported"]:
+            cache.invalidate_jobs()
+            geocoding.request_backfill()
+    return report
+
+async def import_jobs_request(request: Request, fmt: str, dry_run: bool, actor_id: int) -> dict:
+    # Тело читаем потоком: память ограничена IMPORT_SPOOL_SIZE, остальное уходит на диск
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        return await run_in_threadpool(import_jobs, spool, fmt, dry_run, actor_id)
+
+@app.post("/admin/import/jobs.csv", response_model=schemas.ImportReport)
+async def import_jobs_csv(request: Request, dry_run: bool = False, current_user: dict = Depends(check_admin)):
+    """Массовый импорт заявок из CSV (заголовок — поля JobCreate, мастер через user_id или master_phone)"""
+    return await import_jobs_request(request, "csv", dry_run, current_user["id"])
+
+@app.post("/admin/import/jobs.ndjson", response_model=schemas.ImportReport)
+async def import_jobs_ndjson(request: Request, dry_run: bool = False, current_user: dict = Depends(check_admin)):
+    """Массовый импорт заявок из NDJSON (по одной заявке на строку)"""
+    return await import_jobs_request(request, "ndjson", dry_run, current_user["id"])
+
+# --- АНАЛИТИКА (из дневных агрегатов job_daily_rollups) ---
+
+ANALYTICS_GRANULARITIES = ("day", "week", "month")
+ANALYTICS_SPLITS = ("user_id", "job_type")
+
+def analytics_period(day: date, granularity: str) -> str:
+    if granularity == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if granularity == "month":
+        return day.replace(day=1).isoformat()
+    return day.isoformat()
+
+@app.get("/admin/analytics/timeseries", response_model=schemas.AnalyticsTimeseries)
+def get_analytics_timeseries(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    granularity: str = "day",
+    user_id: Optional[int] = None,
+    job_type: Optional[str] = None,
+    split_by: Optional[str] = None,
+    current_user: dict = Depends(check_admin)
+):
+    """Выручка и количество заявок по дням/неделям/месяцам. Читает только агрегаты (строка на день)."""
+    if granularity not in ANALYTICS_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(ANALYTICS_GRANULARITIES)}")
+    if split_by and split_by not in ANALYTICS_SPLITS:
+        raise HTTPException(status_code=400, detail=f"split_by must be one of {', '.join(ANALYTICS_SPLITS)}")
+
+    end = parse_date_param(date_to, "date_to") or datetime.now(timezone.utc).date()
+    start = parse_date_param(date_from, "date_from") or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+
+    rows = supabase.rpc("analytics_timeseries", {
+        "p_from": start.isoformat(),
+        "p_to": end.isoformat(),
+        "p_user_id": user_id,
+        "p_job_type": job_type,
+        "p_split": split_by,
+    }).execute().data or []
+
+    points = {}
+    for row in rows:
+        period = analytics_period(date.fromisoformat(row["day"]), granularity)
+        key = (period, row.get("dimension"))
+        point = points.setdefault(key, {
+            "period": period, "dimension": row.get("dimension"),
+            "jobs_count": 0, "completed_count": 0, "cancelled_count": 0, "revenue": 0.0,
+        })
+        point["jobs_count"] += row["jobs_count"]
+        point["completed_count"] += row["completed_count"]
+        point["cancelled_count"] += row["cancelled_count"]
+        point["revenue"] += row["revenue"] or 0
+
+    return {
+        "date_from": start.isoformat(),
+        "date_to": end.isoformat(),
+        "granularity": granularity,
+        "split_by": split_by,
+        "points": list(points.values()),
+    }
+
 # --- УПРАВЛЕНИЕ СПИСКОМ УСЛУГ ---
 
+def load_services_catalog() -> list:
+    return catalog.services_catalog.items()
+
 @app.get("/admin/services", response_model=List[schemas.ServiceResponse])
 def get_admin_services(current_user: dict = Depends(check_admin)):
-    result = supabase.table("predefined_services").select("*").order("name").execute()
-    return result.data or []
+    return load_services_catalog()
 
 @app.post("/admin/services", response_model=schemas.ServiceResponse)
 def create_admin_service(service: schemas.ServiceCreate, current_user: dict = Depends(check_admin)):
@@ -238,6 +739,7 @@ def create_admin_service(service: schemas.ServiceCreate, current_user: dict = De
     result = supabase.table("predefined_services").insert(data).execute()
     if not result.data:
         raise HTTPException(status_code=500, detail="Failed to create service")
+    catalog.invalidate_services()
     return result.data[0]
 
 @app.put("/admin/services/{service_id}", response_model=schemas.ServiceResponse)
@@ -246,14 +748,57 @@ def update_admin_service(service_id: int, service: schemas.ServiceCreate, curren
     result = supabase.table("predefined_services").update(data).eq("id", service_id).execute()
     if not result.data:
         raise HTTPException(status_code=404, detail="Service not found")
+    catalog.invalidate_services()
     return result.data[0]
 
 @app.delete("/admin/services/{service_id}")
 def delete_admin_service(service_id: int, current_user: dict = Depends(check_admin)):
     supabase.table("predefined_services").delete().eq("id", service_id).execute()
+    catalog.invalidate_services()
     return {"message": "Service deleted"}
 
 
+@app.get("/services", response_model=schemas.ServicesCatalogResponse)
+def get_services_catalog(request: Request, response: Response, current_user: dict = Depends(auth.get_current_user)):
+    """Каталог услуг для мастеров. Клиент хранит его по версии и перепроверяет через If-None-Match."""
+    version, items = catalog.services_catalog.snapshot()
+    etag = f'"{version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return {"version": version, "services": items}
+
+
+def validate_services(services, strict: bool = False) -> None:
+    """
+    Проверка услуг заявки по каталогу в памяти, без запроса в БД.
+    Услуга, удалённая из каталога, остаётся в заявке как разовая: service_id
+    убирается, иначе заявку с ней нельзя было бы сохранить. strict — новый
+    service_id задан явно, неизвестный отклоняется.
+    """
+    for i, item in enumerate(services or []):
+        if not isinstance(item, dict):
+            raise HTTPException(status_code=400, detail=f"services[{i}] must be an object")
+        for field in ("price", "quantity"):
+            value = item.get(field)
+            if value not in (None, ""):
+                try:
+                    float(value)
+                except (TypeError, ValueError):
+                    raise HTTPException(status_code=400, detail=f"services[{i}].{field} must be a number")
+        service_id = item.get("service_id")
+        if service_id is not None:
+            try:
+                known = catalog.services_catalog.get(int(service_id))
+            except (TypeError, ValueError):
+                known = None
+            if known is None:
+                if strict:
+                    raise HTTPException(status_code=400, detail=f"Unknown service_id: {service_id}")
+                del item["service_id"]
+
+
 # ==================== Auth ====================
 
 @app.post("/auth/send-code", response_model=dict)
@@ -265,6 +810,7 @@ def send_sms_code(request: schemas.PhoneLoginRequest):
 
     if not result.data:
         supabase.table("users").insert({"phone": phone}).execute()
+        cache.invalidate("admin:")
 
     code = auth.create_sms_code(phone)
     return {"message": "SMS code sent", "phone": phone, "debug_code": code}
@@ -285,6 +831,7 @@ def verify_sms_code(request: schemas.PhoneVerifyRequest):
 
     # Обновляем статус верификации
     supabase.table("users").update({"is_verified": True}).eq("id", user["id"]).execute()
+    cache.invalidate_user(user["id"])
 
     access_token = auth.create_access_token(data={"sub": str(user["id"]), "phone": user["phone"]})
     refresh_token = auth.create_refresh_token(data={"sub": str(user["id"]), "phone": user["phone"]})
@@ -334,9 +881,42 @@ def update_current_user(
         return current_user
 
     result = supabase.table("users").update(data).eq("id", current_user["id"]).execute()
+    cache.invalidate_user(current_user["id"])
     return result.data[0]
 
 
+# ==================== Bootstrap ====================
+
+def get_push_config() -> dict:
+    try:
+        from push_service import VAPID_PUBLIC
+    except ImportError:
+        VAPID_PUBLIC = None
+    return {"enabled": bool(VAPID_PUBLIC), "vapid_public": VAPID_PUBLIC or None}
+
+
+@app.get("/bootstrap", response_model=schemas.BootstrapResponse)
+async def bootstrap(tz: str = "UTC", current_user: dict = Depends(auth.get_current_user)):
+    """
+    Всё для холодного старта PWA одним запросом: профиль, заявки на сегодня,
+    статистика, каталог услуг и настройки push. Чтения из БД идут параллельно.
+    """
+    today = datetime.now(resolve_timezone(tz)).date().isoformat()
+    today_jobs, stats, (services_version, services) = await asyncio.gather(
+        run_in_threadpool(get_jobs_for_day, today, tz, current_user["id"]),
+        run_in_threadpool(get_dashboard_stats, current_user),
+        run_in_threadpool(catalog.services_catalog.snapshot),
+    )
+    return {
+        "user": current_user,
+        "today_jobs": today_jobs,
+        "stats": stats,
+        "services": services,
+        "services_version": services_version,
+        "push": get_push_config(),
+    }
+
+
 # ==================== Dashboard ====================
 
 @app.get("/dashboard/stats", response_model=schemas.DashboardStats)
@@ -376,9 +956,14 @@ def reset_dashboard_stats(current_user: dict = Depends(auth.get_current_user)):
         .select("id,status") \
         .eq("user_id", current_user["id"]) \
         .execute()
+    deleted = []
     for row in (rows.data or []):
         if row.get("status") in ("completed", "cancelled"):
             supabase.table("jobs").delete().eq("id", row["id"]).eq("user_id", current_user["id"]).execute()
+            job_events.record("deleted", {**row, "user_id": current_user["id"]}, current_user["id"])
+            deleted.append(row["id"])
+    cache.invalidate_jobs()
+    upcoming.jobs_deleted(deleted)
     return get_dashboard_stats(current_user)
 
 
@@ -386,17 +971,105 @@ def reset_dashboard_stats(current_user: dict = Depends(auth.get_current_user)):
 
 @app.get("/jobs/today", response_model=List[schemas.JobResponse])
 def get_today_jobs(current_user: dict = Depends(auth.get_current_user)):
-    today = date.today().isoformat()
+    start, end = utc_day_range(date.today())
+    return get_jobs_between(start, end, current_user["id"])
 
-    result = supabase.table("jobs") \
-        .select("*") \
-        .eq("user_id", current_user["id"]) \
-        .execute()
 
-    today_jobs = [j for j in (result.data or []) if j.get("scheduled_at") and j["scheduled_at"][:10] == today]
-    return sorted(today_jobs, key=lambda x: x.get("scheduled_at", ""))
+@app.get("/jobs/calendar", response_model=schemas.CalendarMonth)
+def get_jobs_calendar(month: str, tz: str = "UTC", current_user: dict = Depends(auth.get_current_user)):
+    """Сводка месяца для календаря: количество заявок по статусам и выручка по дням"""
+    return get_calendar_month(month, tz, current_user["id"])
 
 
+@app.get("/jobs/search", response_model=schemas.JobSearchResponse)
+def search_jobs(q: str, limit: int = 20, offset: int = 0, current_user: dict = Depends(auth.get_current_user)):
+    """Поиск по своим заявкам"""
+    return search_jobs_query(q, current_user["id"], limit, offset)
+
+
+# --- КОНФЛИКТЫ РАСПИСАНИЯ ---
+
+DEFAULT_JOB_DURATION_MINUTES = 60  # то же значение, что и в job_slot() в схеме
+MAX_JOB_DURATION_MINUTES = 24 * 60
+OPEN_JOB_STATUSES = ("scheduled", "active")
+
+def validate_duration(duration: Optional[int]) -> None:
+    if duration is not None and not 0 < duration <= MAX_JOB_DURATION_MINUTES:
+        raise HTTPException(status_code=400, detail=f"duration_minutes must be between 1 and {MAX_JOB_DURATION_MINUTES}")
+
+def find_schedule_conflicts(user_id: int, start: datetime, end: datetime, exclude_job_id: Optional[int] = None) -> list:
+    """Открытые заявки мастера, пересекающиеся с [start, end) — по GiST-индексу idx_jobs_schedule_slot"""
+    result = supabase.rpc("find_schedule_conflicts", {
+        "p_user_id": user_id,
+        "p_start": start.isoformat(),
+        "p_end": end.isoformat(),
+        "p_exclude_job_id": exclude_job_id,
+    }).execute()
+    return result.data or []
+
+def with_conflicts(job: dict) -> dict:
+    """Сохранённая заявка + пересечения с другими заявками мастера (запись не блокируется)"""
+    conflicts = []
+    if job.get("scheduled_at") and job.get("status") in OPEN_JOB_STATUSES:
+        start = datetime.fromisoformat(job["scheduled_at"].replace("Z", "+00:00"))
+        end = start + timedelta(minutes=job.get("duration_minutes") or DEFAULT_JOB_DURATION_MINUTES)
+        # Заявка уже сохранена: сбой проверки не должен превращаться в 500 и повторную отправку
+        try:
+            conflicts = find_schedule_conflicts(job["user_id"], start, end, job["id"])
+        except Exception:
+            logger.exception(f"Schedule conflict check failed for job {job['id']}")
+    return {**job, "conflicts": conflicts}
+
+@app.get("/jobs/conflicts", response_model=schemas.ScheduleCheck)
+def check_schedule_conflicts(
+    start: datetime,
+    end: Optional[datetime] = None,
+    duration_minutes: Optional[int] = None,
+    user_id: Optional[int] = None,
+    exclude_job_id: Optional[int] = None,
+    current_user: dict = Depends(auth.get_current_user)
+):
+    """Свободен ли мастер в [start, end) — для формы заявки и перетаскивания заявок диспетчером"""
+    if user_id is None:
+        user_id = current_user["id"]
+    elif user_id != current_user["id"] and current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    validate_duration(duration_minutes)
+
+    # Время без пояса считаем UTC — так же его сохраняет база
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end is None:
+        end = start + timedelta(minutes=duration_minutes or DEFAULT_JOB_DURATION_MINUTES)
+    elif end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    conflicts = find_schedule_conflicts(user_id, start, end, exclude_job_id)
+    return {"user_id": user_id, "start": start, "end": end, "free": not conflicts, "conflicts": conflicts}
+
+
+# --- ГЕОКОДИРОВАНИЕ (кэш адресов, см. geocoding.py) ---
+
+def request_geocoding(job: dict) -> None:
+    """Заявка с адресом, но без координат — будим фоновое дозаполнение"""
+    if job.get("address") and job.get("latitude") is None:
+        geocoding.request_backfill()
+
+@app.get("/geocode", response_model=schemas.GeocodeResult)
+def geocode_address(address: str, current_user: dict = Depends(auth.get_current_user)):
+    """Координаты адреса: повторный адрес отдаётся из кэша без внешнего запроса"""
+    if not address.strip():
+        raise HTTPException(status_code=400, detail="Address is required")
+    point = geocoding.service.geocode(address)
+    return {
+        "address": address,
+        "found": point is not None,
+        "latitude": point[0] if point else None,
+        "longitude": point[1] if point else None,
+    }
+
 @app.get("/jobs/route/optimize")
 def get_route_optimize(
     date_str: str,
@@ -408,17 +1081,23 @@ def get_route_optimize(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format, use YYYY-MM-DD")
 
-    result = supabase.table("jobs") \
-        .select("*") \
-        .eq("user_id", current_user["id"]) \
-        .execute()
+    day_jobs = get_jobs_between(*utc_day_range(target_date), current_user["id"])
+
+    # Заявки без координат: адреса из кэша геокодирования; у провайдера — лишь
+    # несколько новых, остальные проставит фоновое дозаполнение
+    missing = [j for j in day_jobs if j.get("address") and (j.get("latitude") is None or j.get("longitude") is None)]
+    if missing:
+        points = geocoding.service.geocode_many(
+            [j["address"] for j in missing], max_calls=geocoding.GEOCODE_REQUEST_MAX_CALLS)
+        for j in missing:
+            point = points.get(j["address"])
+            if point:
+                j["latitude"], j["longitude"] = point
+        geocoding.request_backfill()
 
-    jobs_data = result.data or []
-    
     jobs_with_coords = [
-        j for j in jobs_data
-        if j.get("scheduled_at") and j["scheduled_at"][:10] == target_date.isoformat()
-        and j.get("latitude") is not None and j.get("longitude") is not None
+        j for j in day_jobs
+        if j.get("latitude") is not None and j.get("longitude") is not None
     ]
 
     if len(jobs_with_coords) < 2:
@@ -451,11 +1130,39 @@ def get_route_optimize(
     return {"order": order, "jobs": jobs_ordered, "total_distance_km": round(total_km, 2)}
 
 
+def utc_day_range(day: date) -> tuple:
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+def get_jobs_between(start: datetime, end: datetime, user_id: Optional[int]) -> list:
+    """Заявки со scheduled_at в [start, end): ближайшие — из памяти (upcoming.py), остальные — по индексу"""
+    jobs = upcoming.model.query(start, end, user_id)
+    if jobs is not None:
+        return jobs
+    query = supabase.table("jobs").select("*") \
+        .gte("scheduled_at", start.isoformat()) \
+        .lt("scheduled_at", end.isoformat())
+    if user_id:
+        query = query.eq("user_id", user_id)
+    return query.order("scheduled_at").execute().data or []
+
+def get_jobs_for_day(day: str, tz: str, user_id: Optional[int]) -> list:
+    """Заявки за локальный день"""
+    target = parse_date_param(day, "day")
+    start_utc, end_utc = local_range_utc(target, target + timedelta(days=1), resolve_timezone(tz))
+    return get_jobs_between(datetime.fromisoformat(start_utc), datetime.fromisoformat(end_utc), user_id)
+
+
 @app.get("/jobs", response_model=List[schemas.JobResponse])
 def get_jobs(
     status_filter: Optional[str] = None,
+    day: Optional[str] = None,
+    tz: str = "UTC",
     current_user: dict = Depends(auth.get_current_user)
 ):
+    if day:
+        return get_jobs_for_day(day, tz, current_user["id"])
+
     query = supabase.table("jobs").select("*").eq("user_id", current_user["id"])
 
     if status_filter:
@@ -478,12 +1185,14 @@ def get_job(job_id: int, current_user: dict = Depends(auth.get_current_user)):
     return result.data[0]
 
 
-@app.post("/jobs", response_model=schemas.JobResponse)
+@app.post("/jobs", response_model=schemas.JobWriteResponse)
 def create_job(
     job: schemas.JobCreate,
     current_user: dict = Depends(auth.get_current_user)
 ):
     job_data = job.model_dump(exclude_unset=True)
+    validate_services(job_data.get("services"))
+    validate_duration(job_data.get("duration_minutes"))
 
     # Преобразуем datetime в ISO-строки для Supabase
     for field in ["scheduled_at", "completed_at"]:
@@ -499,18 +1208,24 @@ def create_job(
 
     job_data["user_id"] = current_user["id"]
     job_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    set_customer_phone_norm(job_data)
 
     try:
         result = supabase.table("jobs").insert(job_data).execute()
         if not result.data:
             raise HTTPException(status_code=500, detail="Failed to insert job to database")
-        return result.data[0]
+        cache.invalidate_jobs()
+        job = result.data[0]
     except Exception as e:
-        print(f"❌ Error creating job: {str(e)}")
+        logger.exception("Error creating job")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    job_events.record("created", job, current_user["id"])
+    upcoming.job_saved(job)
+    request_geocoding(job)
+    return with_conflicts(job)
 
 
-@app.put("/jobs/{job_id}", response_model=schemas.JobResponse)
+@app.put("/jobs/{job_id}", response_model=schemas.JobWriteResponse)
 def update_job(
     job_id: int,
     job_update: schemas.JobUpdate,
@@ -518,7 +1233,7 @@ def update_job(
 ):
     # Проверяем что заявка принадлежит пользователю
     existing = supabase.table("jobs") \
-        .select("id") \
+        .select("id, status") \
         .eq("id", job_id) \
         .eq("user_id", current_user["id"]) \
         .execute()
@@ -527,6 +1242,8 @@ def update_job(
         raise HTTPException(status_code=404, detail="Job not found")
 
     update_data = job_update.model_dump(exclude_unset=True)
+    validate_services(update_data.get("services"))
+    validate_duration(update_data.get("duration_minutes"))
 
     # Преобразуем datetime в ISO-строки
     for field in ["scheduled_at", "completed_at"]:
@@ -545,21 +1262,103 @@ def update_job(
         return result.data[0] if result.data else None
 
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    set_customer_phone_norm(update_data)
 
     try:
         result = supabase.table("jobs").update(update_data).eq("id", job_id).execute()
         if not result.data:
             raise HTTPException(status_code=500, detail="Failed to update job in database")
-        return result.data[0]
+        cache.invalidate_jobs()
+        job = result.data[0]
     except Exception as e:
-        print(f"❌ Error updating job: {str(e)}")
+        logger.exception(f"Error updating job {job_id}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if job.get("status") != existing.data[0].get("status"):
+        job_events.record("status", job, current_user["id"])
+    upcoming.job_saved(job)
+    request_geocoding(job)
+    return with_conflicts(job)
+
+
+# --- ЧАСТИЧНОЕ ИЗМЕНЕНИЕ СПИСКОВ (JSON Patch) ---
+
+JOB_PATCH_FIELDS = ("checklist", "services")
+JOB_PATCH_MAX_OPS = 100
+
+def validate_patch_op(i: int, op: schemas.JobPatchOperation) -> None:
+    """Проверка пути и значения до обращения к БД; наличие элементов проверяет patch_job_lists"""
+    parts = op.path.split("/")
+    if parts[0] != "" or len(parts) < 2 or parts[1] not in JOB_PATCH_FIELDS or len(parts) > 4:
+        raise HTTPException(status_code=422, detail=f"ops[{i}]: unsupported path {op.path!r}")
+    field, sub = parts[1], parts[2:]
+    if sub:
+        index = sub[0]
+        if not (index.isdigit() or (index == "-" and op.op == "add" and len(sub) == 1)):
+            raise HTTPException(status_code=422, detail=f"ops[{i}]: invalid index in {op.path!r}")
+        if len(sub) == 2 and not sub[1]:
+            raise HTTPException(status_code=422, detail=f"ops[{i}]: empty key in {op.path!r}")
+    if op.op not in ("add", "replace"):
+        return
+    if not sub:
+        if not isinstance(op.value, list):
+            raise HTTPException(status_code=422, detail=f"ops[{i}]: {field} must be a list")
+        items = op.value
+    elif len(sub) == 1:
+        if not isinstance(op.value, dict):
+            raise HTTPException(status_code=422, detail=f"ops[{i}]: {field} item must be an object")
+        items = [op.value]
+    else:
+        items = [{sub[1]: op.value}]
+    if field == "services":
+        validate_services(items, strict=len(sub) == 2)
+
+def patch_error(e: APIError) -> HTTPException:
+    code = e.code or ""
+    # patch_job_lists сообщает статус через SQLSTATE PTxxx
+    if code.startswith("PT") and code[2:].isdigit():
+        return HTTPException(status_code=int(code[2:]), detail=e.message)
+    if code.startswith("22"):  # некорректные данные (например, индекс не число)
+        return HTTPException(status_code=422, detail=e.message)
+    logger.error(f"patch_job_lists failed: {e}")
+    return HTTPException(status_code=500, detail="Database error")
+
+@app.patch("/jobs/{job_id}", response_model=schemas.JobPatchResponse)
+def patch_job(
+    job_id: int,
+    ops: List[schemas.JobPatchOperation],
+    current_user: dict = Depends(auth.get_current_user)
+):
+    """
+    Частичное изменение checklist и services: операции применяются в БД атомарно
+    под блокировкой строки, поэтому параллельные правки одного списка не теряются.
+    Например: [{"op": "replace", "path": "/checklist/3/done", "value": true}].
+    """
+    if not ops:
+        raise HTTPException(status_code=400, detail="No operations provided")
+    if len(ops) > JOB_PATCH_MAX_OPS:
+        raise HTTPException(status_code=400, detail=f"Too many operations (max {JOB_PATCH_MAX_OPS})")
+    for i, op in enumerate(ops):
+        validate_patch_op(i, op)
+
+    try:
+        result = supabase.rpc("patch_job_lists", {
+            "p_job_id": job_id,
+            "p_user_id": current_user["id"],
+            "p_ops": [op.model_dump() for op in ops],
+        }).execute()
+    except APIError as e:
+        raise patch_error(e)
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Job not found")
+    cache.invalidate_jobs()
+    upcoming.job_saved(result.data[0])
+    return result.data[0]
 
 
 @app.delete("/jobs/{job_id}")
 def delete_job(job_id: int, current_user: dict = Depends(auth.get_current_user)):
     existing = supabase.table("jobs") \
-        .select("id") \
+        .select("id, user_id, status") \
         .eq("id", job_id) \
         .eq("user_id", current_user["id"]) \
         .execute()
@@ -568,9 +1367,75 @@ def delete_job(job_id: int, current_user: dict = Depends(auth.get_current_user))
         raise HTTPException(status_code=404, detail="Job not found")
 
     supabase.table("jobs").delete().eq("id", job_id).execute()
+    cache.invalidate_jobs()
+    upcoming.jobs_deleted([job_id])
+    job_events.record("deleted", existing.data[0], current_user["id"])
     return {"message": "Job deleted"}
 
 
+# ==================== Customers ====================
+
+CUSTOMER_SUGGEST_LIMIT = 10
+
+@app.get("/customers/suggest", response_model=List[schemas.CustomerSuggestion])
+def suggest_customers(phone: str, current_user: dict = Depends(auth.get_current_user)):
+    """Автодополнение клиента по началу телефона (индекс customer_phone_norm)"""
+    prefixes = [p for p in auth.normalize_phone_prefixes(phone) if len(p) >= 5]
+    if not prefixes:
+        return []
+
+    rows = []
+    for prefix in prefixes:
+        query = supabase.table("jobs") \
+            .select("customer_phone_norm, customer_phone, customer_name, address, scheduled_at") \
+            .like("customer_phone_norm", f"{prefix}%")
+        if current_user.get("role") != "admin":
+            query = query.eq("user_id", current_user["id"])
+        rows.extend(query.order("scheduled_at", desc=True).limit(200).execute().data or [])
+    if len(prefixes) > 1:
+        rows.sort(key=lambda r: r.get("scheduled_at") or "", reverse=True)
+
+    # Группируем по номеру: берём данные из последней заявки клиента
+    customers = {}
+    for row in rows:
+        key = row["customer_phone_norm"]
+        if key not in customers:
+            customers[key] = {
+                "customer_phone": row.get("customer_phone") or key,
+                "customer_name": row.get("customer_name"),
+                "address": row.get("address"),
+                "jobs_count": 0,
+            }
+        customers[key]["jobs_count"] += 1
+    return list(customers.values())[:CUSTOMER_SUGGEST_LIMIT]
+
+
+@app.get("/customers/history", response_model=schemas.CustomerHistory)
+def get_customer_history(phone: str, current_user: dict = Depends(auth.get_current_user)):
+    """Все заявки клиента, сумма оплат и последний визит. Мастер видит только свои заявки."""
+    if not phone.strip():
+        raise HTTPException(status_code=400, detail="Phone is required")
+    phone_norm = auth.normalize_phone(phone)
+
+    query = supabase.table("jobs").select("*").eq("customer_phone_norm", phone_norm)
+    if current_user.get("role") != "admin":
+        query = query.eq("user_id", current_user["id"])
+    jobs = query.order("scheduled_at", desc=True).execute().data or []
+
+    completed = [j for j in jobs if j.get("status") == "completed"]
+    visits = [j.get("completed_at") or j.get("scheduled_at") for j in completed]
+    visits = [v for v in visits if v]
+
+    return {
+        "customer_phone": phone_norm,
+        "customer_name": next((j["customer_name"] for j in jobs if j.get("customer_name")), None),
+        "jobs": jobs,
+        "jobs_count": len(jobs),
+        "total_spent": sum(calculate_job_total(j) for j in completed),
+        "last_visit": max(visits, key=lambda v: datetime.fromisoformat(v.replace("Z", "+00:00"))) if visits else None,
+    }
+
+
 # ==================== Push ====================
 
 @app.get("/push/vapid-public")
@@ -607,6 +1472,28 @@ def push_subscribe(
 
 # ==================== Static Files (Frontend & Dispatcher) ====================
 
+# dist_dir -> (mtime, содержимое index.html); перечитывается после новой сборки
+_spa_index_cache: dict = {}
+
+def read_spa_index(dist_dir: str) -> Optional[bytes]:
+    index_path = os.path.join(dist_dir, "index.html")
+    try:
+        mtime = os.stat(index_path).st_mtime
+    except OSError:
+        return None
+    cached = _spa_index_cache.get(dist_dir)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(index_path, "rb") as f:
+        content = f.read()
+    _spa_index_cache[dist_dir] = (mtime, content)
+    return content
+
+def warm_spa_index() -> None:
+    for dist_dir in (FRONTEND_DIST, DISPATCHER_DIST):
+        if read_spa_index(dist_dir) is None:
+            logger.warning(f"index.html NOT FOUND in {dist_dir}")
+
 def serve_spa(dist_dir: str, full_path: str):
     if not os.path.exists(dist_dir):
         logger.error(f"Build directory NOT FOUND: {dist_dir}")
@@ -634,9 +1521,9 @@ def serve_spa(dist_dir: str, full_path: str):
             
         raise HTTPException(status_code=404, detail=f"Asset {clean_path} not found")
 
-    index_path = os.path.join(dist_dir, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path, media_type="text/html")
+    index = read_spa_index(dist_dir)
+    if index is not None:
+        return Response(index, media_type="text/html")
     
     logger.error(f"index.html NOT FOUND in {dist_dir}")
     raise HTTPException(status_code=500, detail="index.html not found")
@@ -652,7 +1539,7 @@ async def serve_admin(full_path: str = ""):
 async def serve_main_app(full_path: str = ""):
     """Обслуживание основного PWA приложения"""
     # Исключаем API и админку
-    api_prefixes = ["auth", "jobs", "push", "dashboard", "admin", "health"]
+    api_prefixes = ["auth", "bootstrap", "jobs", "services", "customers", "push", "dashboard", "admin", "health", "geocode"]
     if any(full_path.startswith(p) for p in api_prefixes):
         raise HTTPException(status_code=404)
         
@@ -663,4 +1550,4 @@ async def serve_main_app(full_path: str = ""):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False, workers=cluster.WEB_CONCURRENCY)
@@ -0,0 +1,339 @@
+"""
+Прямое подключение к Postgres вместо PostgREST (DATABASE_BACKEND=postgres).
+
+PostgresClient повторяет ту часть интерфейса клиента supabase, которой
+пользуется backend:
+
+    table(name).select("a, b") / insert(rows, default_to_null) / upsert(rows) / update(data) / delete()
+        .eq .neq .gt .gte .lt .lte .like .in_ .is_  .order(col, desc, nullsfirst)  .limit(n)
+        .execute().data
+    rpc(name, params).execute().data        — функции, возвращающие набор строк
+
+поэтому обработчики не знают, какое хранилище выбрано. Цепочка превращается в
+один SQL-оператор с параметрами; одинаковые по форме запросы дают одинаковый
+текст, и psycopg выполняет их как подготовленные операторы (PG_PREPARE_THRESHOLD)
+на соединениях из пула. Значения возвращаются в том же виде, что и из PostgREST
+(время — ISO-строки в UTC, numeric — float), ошибки — postgrest APIError с SQLSTATE
+в code.
+
+Подключение — роль владельца таблиц, политики RLS не применяются (как с service key).
+Prepared statements не работают через pgbouncer в режиме transaction до версии 1.21
+(PG_PREPARE_THRESHOLD=-1).
+"""
+import logging
+import os
+import re
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+from uuid import UUID
+
+import psycopg
+from dotenv import load_dotenv
+from postgrest import APIResponse
+from postgrest.exceptions import APIError
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from psycopg_pool import ConnectionPool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DATABASE_POOL_MIN = int(os.getenv("DATABASE_POOL_MIN", "1"))
+DATABASE_POOL_MAX = int(os.getenv("DATABASE_POOL_MAX", "10"))
+# 0 — готовить каждый оператор сразу, -1 — не готовить; psycopg держит до prepared_max операторов на соединение
+PG_PREPARE_THRESHOLD = int(os.getenv("PG_PREPARE_THRESHOLD", "0"))
+
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_IS_VALUES = {"null": "NULL", "true": "TRUE", "false": "FALSE"}
+
+
+def _ident(name: str) -> str:
+    name = name.strip()
+    if not _IDENT.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return f'"{name}"'
+
+
+def _columns(columns: str) -> str:
+    if columns.strip() == "*":
+        return "*"
+    return ", ".join(_ident(c) for c in columns.split(","))
+
+
+def _json_value(value):
+    """Значение колонки в том виде, в каком его вернул бы PostgREST."""
+    if isinstance(value, datetime) and value.microsecond:
+        # Postgres отбрасывает незначащие нули дробной части: 10:00:00.1234+00:00
+        text = value.isoformat()
+        return text[:26].rstrip("0") + text[26:]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _api_error(e) -> APIError:
+    diag = e.diag
+    return APIError({
+        "message": diag.message_primary or str(e),
+        "code": e.sqlstate,
+        "details": diag.message_detail,
+        "hint": diag.message_hint,
+    })
+
+
+class Statement:
+    """SQL-оператор для отправки; method и path — для профилирования и логов."""
+    __slots__ = ("method", "path", "sql", "params")
+
+    def __init__(self, method: str, path: str, sql: str, params: list):
+        self.method = method
+        self.path = path
+        self.sql = sql
+        self.params = params
+
+
+class Query:
+    def __init__(self, client: "PostgresClient", table: str):
+        self._client = client
+        self._table = table
+        self._action = "select"
+        self._columns = "*"
+        self._payload = None
+        self._on_conflict = ""
+        self._default_to_null = True
+        self._where: List[str] = []
+        self._params: list = []
+        self._order: List[str] = []
+        self._limit: Optional[int] = None
+
+    # --- Действие ---
+
+    def select(self, columns: str = "*") -> "Query":
+        self._columns = columns
+        return self
+
+    def insert(self, payload, default_to_null: bool = True) -> "Query":
+        self._action, self._payload, self._default_to_null = "insert", payload, default_to_null
+        return self
+
+    def upsert(self, payload, on_conflict: str = "", default_to_null: bool = True) -> "Query":
+        self._action, self._payload, self._on_conflict = "upsert", payload, on_conflict
+        self._default_to_null = default_to_null
+        return self
+
+    def update(self, payload: dict) -> "Query":
+        self._action, self._payload = "update", payload
+        return self
+
+    def delete(self) -> "Query":
+        self._action = "delete"
+        return self
+
+    # --- Фильтры ---
+
+    def _filter(self, column: str, operator: str, value) -> "Query":
+        self._where.append(f"{_ident(column)} {operator} %s")
+        self._params.append(value)
+        return self
+
+    def eq(self, column: str, value) -> "Query":
+        return self._filter(column, "=", value)
+
+    def neq(self, column: str, value) -> "Query":
+        return self._filter(column, "<>", value)
+
+    def gt(self, column: str, value) -> "Query":
+        return self._filter(column, ">", value)
+
+    def gte(self, column: str, value) -> "Query":
+        return self._filter(column, ">=", value)
+
+    def lt(self, column: str, value) -> "Query":
+        return self._filter(column, "<", value)
+
+    def lte(self, column: str, value) -> "Query":
+        return self._filter(column, "<=", value)
+
+    def like(self, column: str, pattern: str) -> "Query":
+        return self._filter(column, "LIKE", pattern)
+
+    def in_(self, column: str, values) -> "Query":
+        # Один параметр-массив: текст оператора не зависит от длины списка
+        self._where.append(f"{_ident(column)} = ANY(%s)")
+        self._params.append(list(values))
+        return self
+
+    def is_(self, column: str, value) -> "Query":
+        keyword = _IS_VALUES.get(str(value).lower() if value is not None else "null")
+        if keyword is None:
+            raise ValueError(f"Unsupported is_ value: {value!r}")
+        self._where.append(f"{_ident(column)} IS {keyword}")
+        return self
+
+    def order(self, column: str, desc: bool = False, nullsfirst: Optional[bool] = None) -> "Query":
+        clause = f"{_ident(column)} {'DESC' if desc else 'ASC'}"
+        if nullsfirst is not None:
+            clause += " NULLS FIRST" if nullsfirst else " NULLS LAST"
+        self._order.append(clause)
+        return self
+
+    def limit(self, count: int) -> "Query":
+        self._limit = count
+        return self
+
+    # --- Сборка SQL ---
+
+    def _where_sql(self) -> str:
+        return f" WHERE {' AND '.join(self._where)}" if self._where else ""
+
+    def _write_columns(self, rows: List[dict]) -> List[str]:
+        columns: Dict[str, None] = {}
+        for row in rows:
+            columns.update(dict.fromkeys(row))
+        return list(columns)
+
+    def _insert_sql(self, rows: List[dict]) -> str:
+        table = _ident(self._table)
+        names = self._write_columns(rows)
+        columns = ", ".join(_ident(c) for c in names)
+        # Типы колонок приводит сама база: строки JSON разбираются по типу таблицы
+        sql = (f"INSERT INTO {table} ({columns}) SELECT {columns} "
+               f"FROM jsonb_populate_recordset(NULL::{table}, %s)")
+        if self._action == "upsert":
+            keys = [c.strip() for c in self._on_conflict.split(",") if c.strip()] \
+                or self._client.primary_key(self._table)
+            if not keys:
+                raise ValueError(f"Table {self._table} has no primary key for upsert")
+            updates = [c for c in names if c not in keys]
+            target = ", ".join(_ident(c) for c in keys)
+            if updates:
+                sql += f" ON CONFLICT ({target}) DO UPDATE SET " + \
+                    ", ".join(f"{_ident(c)} = EXCLUDED.{_ident(c)}" for c in updates)
+            else:
+                sql += f" ON CONFLICT ({target}) DO NOTHING"
+        return sql
+
+    def build(self) -> Statement:
+        table = _ident(self._table)
+        if self._action == "select":
+            sql = f"SELECT {_columns(self._columns)} FROM {table}{self._where_sql()}"
+            params = list(self._params)
+            if self._order:
+                sql += " ORDER BY " + ", ".join(self._order)
+            if self._limit is not None:
+                sql += " LIMIT %s"
+                params.append(self._limit)
+            return Statement("SELECT", self._table, sql, params)
+
+        if self._action in ("insert", "upsert"):
+            rows = self._payload if isinstance(self._payload, list) else [self._payload]
+            if self._default_to_null:
+                groups = [rows]
+            else:
+                # Пропущенная колонка получает DEFAULT: строки с разным набором
+                # ключей вставляются отдельными INSERT в одном операторе
+                by_keys: Dict[tuple, list] = {}
+                for row in rows:
+                    by_keys.setdefault(tuple(sorted(row)), []).append(row)
+                groups = list(by_keys.values())
+            if len(groups) == 1:
+                return Statement("INSERT", self._table, self._insert_sql(groups[0]) + " RETURNING *", [Jsonb(rows)])
+            parts = [f"g{i} AS ({self._insert_sql(group)} RETURNING *)" for i, group in enumerate(groups)]
+            sql = "WITH " + ", ".join(parts) + " " + \
+                " UNION ALL ".join(f"SELECT * FROM g{i}" for i in range(len(groups)))
+            return Statement("INSERT", self._table, sql, [Jsonb(group) for group in groups])
+
+        if self._action == "update":
+            columns = ", ".join(_ident(c) for c in self._payload)
+            sql = (f"UPDATE {table} SET ({columns}) = "
+                   f"(SELECT {columns} FROM jsonb_populate_record(NULL::{table}, %s))"
+                   f"{self._where_sql()} RETURNING *")
+            return Statement("UPDATE", self._table, sql, [Jsonb(self._payload)] + self._params)
+
+        sql = f"DELETE FROM {table}{self._where_sql()} RETURNING *"
+        return Statement("DELETE", self._table, sql, list(self._params))
+
+    def execute(self) -> APIResponse:
+        return APIResponse(data=self._client.send(self.build()), count=None)
+
+
+class RpcCall:
+    def __init__(self, client: "PostgresClient", name: str, params: dict):
+        self._client = client
+        self._name = name
+        self._params = params or {}
+
+    def build(self) -> Statement:
+        args = ", ".join(f"{_ident(k)} => %s" for k in self._params)
+        values = [Jsonb(v) if isinstance(v, (dict, list)) else v for v in self._params.values()]
+        return Statement("RPC", f"rpc/{self._name}", f"SELECT * FROM {_ident(self._name)}({args})", values)
+
+    def execute(self) -> APIResponse:
+        return APIResponse(data=self._client.send(self.build()), count=None)
+
+
+class PostgresClient:
+    def __init__(self, url: str):
+        self.pool = ConnectionPool(
+            url,
+            min_size=DATABASE_POOL_MIN,
+            max_size=DATABASE_POOL_MAX,
+            kwargs={
+                "autocommit": True,
+                "prepare_threshold": PG_PREPARE_THRESHOLD if PG_PREPARE_THRESHOLD >= 0 else None,
+                "row_factory": dict_row,
+            },
+            configure=self._configure,
+            name="coolcare",
+            open=True,
+        )
+        self._primary_keys: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _configure(conn) -> None:
+        # Время в ответах — в UTC, как у PostgREST в Supabase
+        conn.execute("SET TIME ZONE 'UTC'")
+
+    def table(self, name: str) -> Query:
+        return Query(self, name)
+
+    def rpc(self, name: str, params: Optional[dict] = None) -> RpcCall:
+        return RpcCall(self, name, params)
+
+    def send(self, statement: Statement) -> list:
+        """Выполняет оператор; единственная точка обращения к базе (см. database.instrument)."""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.execute(statement.sql, statement.params)
+                if cursor.description is None:
+                    return []
+                return [{k: _json_value(v) for k, v in row.items()} for row in cursor.fetchall()]
+        except psycopg.DatabaseError as e:
+            if e.sqlstate is None:
+                raise
+            raise _api_error(e) from e
+
+    def primary_key(self, table: str) -> List[str]:
+        with self._lock:
+            keys = self._primary_keys.get(table)
+        if keys is None:
+            rows = self.send(Statement("SELECT", "pg_index", (
+                "SELECT a.attname FROM pg_index i "
+                "JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) "
+                "WHERE i.indrelid = %s::regclass AND i.indisprimary"
+            ), [table]))
+            keys = [r["attname"] for r in rows]
+            with self._lock:
+                self._primary_keys[table] = keys
+        return keys
+
+    def close(self) -> None:
+        self.pool.close()
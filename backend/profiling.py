@@ -0,0 +1,326 @@
+"""
+Профилирование отдельных запросов в продакшене (включается PROFILE_ENABLED=1).
+
+Запрос профилируется, если админ прислал заголовок X-Profile: 1 (или ?__profile=1),
+либо каждый PROFILE_SAMPLE_EVERY-й запрос. Во время такого запроса фоновый поток
+раз в PROFILE_INTERVAL секунд снимает стеки потоков, выполняющих этот запрос,
+а каждый вызов Supabase через общий httpx-клиент замеряется отдельно.
+
+Результат — файлы в PROFILE_DIR (по умолчанию profiles/ рядом с app.log):
+  <id>.folded — стеки в формате flamegraph.pl / speedscope ("a;b;c 12"),
+  <id>.json   — время запроса, время в Supabase по вызовам и остальное (Python).
+Хранятся последние PROFILE_KEEP профилей. Без PROFILE_ENABLED модуль ничего
+не подключает и на запросы не влияет.
+"""
+import functools
+import inspect
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+
+import logging_setup
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_EVERY = int(os.getenv("PROFILE_SAMPLE_EVERY", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(logging_setup.LOG_FILE), "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("profile", default=None)
+
+
+class RequestProfile:
+    """Профиль одного запроса: потоки, которые его выполняют, стеки и вызовы Supabase."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.status = None
+        self.threads = Counter()
+        self.samples = Counter()
+        self.supabase_calls = []
+        self.lock = threading.Lock()
+
+    def enter_thread(self) -> None:
+        with self.lock:
+            self.threads[threading.get_ident()] += 1
+
+    def exit_thread(self) -> None:
+        tid = threading.get_ident()
+        with self.lock:
+            self.threads[tid] -= 1
+            if self.threads[tid] <= 0:
+                del self.threads[tid]
+
+
+# ==================== Сэмплер стеков ====================
+
+class _Sampler:
+    """Один поток на процесс; работает, только пока есть профилируемые запросы."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = set()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._active.discard(profile)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+            frames = sys._current_frames()
+            for profile in active:
+                with profile.lock:
+                    tids = list(profile.threads)
+                for tid in tids:
+                    frame = frames.get(tid)
+                    stack = _collapse(frame) if frame is not None else None
+                    if stack:
+                        profile.samples[stack] += 1
+            time.sleep(PROFILE_INTERVAL)
+
+
+_sampler = _Sampler()
+
+
+def _collapse(frame) -> Optional[str]:
+    # Поток цикла событий, ждущий в select(), — простой, а не работа запроса
+    if frame.f_code.co_name in ("select", "poll") and "selectors" in frame.f_code.co_filename:
+        return None
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+# ==================== Точки подключения ====================
+
+def track(func):
+    """Обёртка эндпоинта: отмечает поток, в котором он выполняется, для сэмплера."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return await func(*args, **kwargs)
+            profile.enter_thread()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profile.exit_thread()
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        profile.enter_thread()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.exit_thread()
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, track(endpoint), **kwargs)
+
+
+def _describe(request) -> tuple:
+    """(метод, путь, запрос) для HTTP-запроса к PostgREST или SQL-оператора postgres_backend."""
+    if hasattr(request, "sql"):
+        return request.method, request.path, request.sql
+    return request.method, request.url.path.replace("/rest/v1", "", 1), request.url.query.decode()
+
+
+def instrument_supabase(client) -> None:
+    """Замеряет каждый запрос к базе (PostgREST или прямое подключение, см. database.py)."""
+    import database
+
+    def wrap(send):
+        def timed_send(request, *args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return send(request, *args, **kwargs)
+            start = time.perf_counter()
+            status = None
+            try:
+                response = send(request, *args, **kwargs)
+                status = getattr(response, "status_code", "ok")
+                return response
+            finally:
+                method, path, query = _describe(request)
+                with profile.lock:
+                    profile.supabase_calls.append({
+                        "method": method,
+                        "path": path,
+                        "query": query[:200],
+                        "status": status,
+                        "offset_ms": round((start - profile.start) * 1000, 2),
+                        "ms": round((time.perf_counter() - start) * 1000, 2),
+                    })
+        return timed_send
+
+    database.instrument(client, wrap)
+
+
+# ==================== Middleware ====================
+
+def _is_admin(token: str) -> bool:
+    import auth
+    data = auth.decode_token(token)
+    if not data or data.user_id is None:
+        return False
+    # Тот же кэш пользователей, что и у get_current_user: заголовок не стоит запроса к базе
+    try:
+        return auth.get_user(data.user_id).get("role") == "admin"
+    except HTTPException:
+        return False
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: решает, профилировать ли запрос, и сохраняет результат после ответа."""
+
+    def __init__(self, app):
+        self.app = app
+        self._counter = itertools.count(1)
+
+    async def _should_profile(self, scope) -> bool:
+        if PROFILE_SAMPLE_EVERY > 0 and next(self._counter) % PROFILE_SAMPLE_EVERY == 0:
+            return True
+        headers = dict(scope.get("headers") or [])
+        requested = headers.get(b"x-profile") == b"1" or b"__profile=1" in scope.get("query_string", b"")
+        if not requested:
+            return False
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        if not authorization.lower().startswith("bearer "):
+            return False
+        try:
+            return await run_in_threadpool(_is_admin, authorization[7:])
+        except Exception as e:
+            logger.warning(f"Profile permission check failed: {e}")
+            return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not await self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        profile_id = f"{profile.started_at.strftime('%Y%m%d_%H%M%S_%f')}_{scope['method']}"
+        token = _current.set(profile)
+        # Поток цикла событий: async-эндпоинты и зависимости (get_current_user)
+        profile.enter_thread()
+        _sampler.add(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message.setdefault("headers", []).append((b"x-profile-id", profile_id.encode()))
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                profile.duration = time.perf_counter() - profile.start
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _sampler.remove(profile)
+            profile.exit_thread()
+            _current.reset(token)
+            if not profile.duration:
+                profile.duration = time.perf_counter() - profile.start
+            try:
+                await run_in_threadpool(write_profile, profile_id, profile)
+            except Exception as e:
+                logger.warning(f"Failed to write profile {profile_id}: {e}")
+
+
+# ==================== Запись результата ====================
+
+def write_profile(profile_id: str, profile: RequestProfile) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    supabase_ms = sum(c["ms"] for c in profile.supabase_calls)
+    total_ms = profile.duration * 1000
+    summary = {
+        "id": profile_id,
+        "request_id": logging_setup.request_id.get(),
+        "method": profile.method,
+        "path": profile.path,
+        "status": profile.status,
+        "started_at": profile.started_at.isoformat(),
+        "total_ms": round(total_ms, 2),
+        "supabase_ms": round(supabase_ms, 2),
+        "python_ms": round(max(total_ms - supabase_ms, 0), 2),
+        "supabase_calls": profile.supabase_calls,
+        "samples": sum(profile.samples.values()),
+        "interval_ms": PROFILE_INTERVAL * 1000,
+    }
+    base = os.path.join(PROFILE_DIR, profile_id)
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        for stack, count in profile.samples.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    logger.info(f"Profile {profile_id}: {profile.method} {profile.path} "
+                f"{summary['total_ms']} ms, supabase {summary['supabase_ms']} ms in {len(profile.supabase_calls)} calls")
+    _rotate()
+
+
+def _rotate() -> None:
+    profiles = sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith(".json"))
+    for stale in profiles[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for ext in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, stale + ext))
+            except FileNotFoundError:
+                pass
+
+
+def install(app) -> None:
+    """Подключает профилирование к приложению; вызывать до объявления маршрутов."""
+    if not PROFILE_ENABLED:
+        return
+    from database import supabase, supabase_admin
+    app.router.route_class = ProfiledRoute
+    app.add_middleware(ProfilingMiddleware)
+    instrument_supabase(supabase)
+    if supabase_admin is not supabase:
+        instrument_supabase(supabase_admin)
+    logger.info(f"Request profiling enabled, output: {PROFILE_DIR}")
@@ -1,12 +1,16 @@
 """Web Push notifications service."""
+import importlib.util
 import os
 import json
+import logging
 import threading
 import time
 from datetime import datetime, timedelta, timezone
 
 from dotenv import load_dotenv
 from database import supabase
+import cluster
+import upcoming
 
 load_dotenv()
 
@@ -14,6 +18,10 @@ VAPID_PRIVATE = os.getenv("VAPID_PRIVATE_KEY")
 VAPID_PUBLIC = os.getenv("VAPID_PUBLIC_KEY")
 REMINDER_MINUTES = int(os.getenv("PUSH_REMINDER_MINUTES", "30"))
 
+logger = logging.getLogger(__name__)
+
+_reminder_thread = None
+
 
 def send_push_to_subscription(subscription, title: str, body: str):
     """Send a Web Push notification to a subscription."""
@@ -37,7 +45,7 @@ def send_push_to_subscription(subscription, title: str, body: str):
         )
         return True
     except Exception as e:
-        print(f"Push send error: {e}")
+        logger.warning(f"Push send error: {e}")
         return False
 
 
@@ -49,8 +57,14 @@ def check_and_send_reminders():
         now = datetime.now(timezone.utc)
         window_start = now
         window_end = now + timedelta(minutes=REMINDER_MINUTES)
-        result = supabase.table("jobs").select("*").execute()
-        jobs = result.data or []
+        # Served from the in-memory upcoming jobs model; outside it, a range query
+        jobs = upcoming.model.query(window_start, window_end)
+        if jobs is None:
+            result = supabase.table("jobs").select("*") \
+                .gte("scheduled_at", window_start.isoformat()) \
+                .lte("scheduled_at", window_end.isoformat()) \
+                .execute()
+            jobs = result.data or []
         subs_result = supabase.table("push_subscriptions").select("*").execute()
         subs = {s["user_id"]: s for s in (subs_result.data or [])}
         sent = set()
@@ -76,16 +90,31 @@ def check_and_send_reminders():
                     body = f"Через {REMINDER_MINUTES} мин: {addr}"[:100]
                     if send_push_to_subscription(sub, title, body):
                         sent.add((user_id, job["id"]))
-    except Exception as e:
-        print(f"Push reminder check error: {e}")
+    except Exception:
+        logger.exception("Push reminder check error")
 
 
 def start_reminder_loop():
-    """Start background thread that checks for reminders every 5 minutes."""
+    """Start background thread that checks for reminders every 5 minutes.
+
+    Every worker starts the thread, but only the current leader runs the scan.
+    """
+    global _reminder_thread
+
     def loop():
         while True:
             time.sleep(300)
-            check_and_send_reminders()
+            if cluster.is_leader("reminders"):
+                check_and_send_reminders()
+
+    _reminder_thread = threading.Thread(target=loop, name="push-reminders", daemon=True)
+    _reminder_thread.start()
+
 
-    t = threading.Thread(target=loop, daemon=True)
-    t.start()
+def status() -> dict:
+    """Push configuration for the readiness endpoint (no network calls)."""
+    return {
+        "configured": bool(VAPID_PRIVATE and VAPID_PUBLIC),
+        "library": importlib.util.find_spec("pywebpush") is not None,
+        "reminder_loop": bool(_reminder_thread and _reminder_thread.is_alive()),
+    }
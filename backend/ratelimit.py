@@ -0,0 +1,271 @@
+"""
+Ограничение частоты запросов и сброс нагрузки, чтобы один клиент не выбирал квоту Supabase.
+
+1. Token bucket на ключ: id пользователя из JWT, для /auth/* и запросов без
+   токена — IP клиента (X-Real-IP / X-Forwarded-For — только от прокси из
+   TRUSTED_PROXIES, иначе адрес соединения). Бюджет выбирается по самому
+   длинному совпавшему префиксу пути (RATE_LIMIT_RULES). При исчерпании — 429.
+2. Не больше RATE_LIMIT_CONCURRENT одновременных запросов на ключ — 429.
+3. Если одновременных запросов к Supabase больше SHED_DB_INFLIGHT, новые
+   запросы клиентов, у которых уже есть запросы в работе, сразу получают 503,
+   а не встают в очередь за зависшими; при двукратном превышении — все.
+Все отказы — с Retry-After. Счётчики живут в памяти процесса; бюджет правила
+делится между воркерами (WEB_CONCURRENCY).
+"""
+import ipaddress
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import auth
+import cluster
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+RATE_LIMIT_CONCURRENT = int(os.getenv("RATE_LIMIT_CONCURRENT", "8"))
+SHED_DB_INFLIGHT = int(os.getenv("SHED_DB_INFLIGHT", "32"))
+RATE_LIMIT_MAX_KEYS = 20000
+# Адреса и сети прокси (nginx), которым доверяем заголовки с IP клиента
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1")
+
+# префикс пути = запросов/период:запас; "*" — все остальные запросы к API
+DEFAULT_RULES = (
+    "/auth/send-code=5/60:5,"
+    "/auth/verify-code=10/60:10,"
+    "/auth/=60/60:30,"
+    "/admin/import/=10/60:3,"
+    "/admin/=20/1:100,"
+    "/geocode=30/60:10,"
+    "*=10/1:50"
+)
+RATE_LIMIT_RULES = os.getenv("RATE_LIMIT_RULES", DEFAULT_RULES)
+
+# Пути, которые не ограничиваются: пробы балансировщика и статика SPA
+_EXEMPT_PREFIXES = ("/health", "/admin/assets/")
+_API_PREFIXES = ("/auth", "/bootstrap", "/jobs", "/services", "/customers", "/push", "/dashboard", "/admin", "/geocode")
+
+
+class Rule:
+    __slots__ = ("prefix", "rate", "burst")
+
+    def __init__(self, prefix: str, rate: float, burst: float):
+        self.prefix = prefix
+        self.rate = rate
+        self.burst = burst
+
+
+def parse_rules(value: str) -> List[Rule]:
+    rules = []
+    workers = max(1, cluster.WEB_CONCURRENCY)
+    for part in value.split(","):
+        prefix, _, spec = part.strip().partition("=")
+        try:
+            amount, _, rest = spec.partition("/")
+            period, _, burst = rest.partition(":")
+            rate = float(amount) / float(period or 1) / workers
+            burst = max(1.0, float(burst or amount) / workers)
+        except ValueError:
+            logger.warning(f"Invalid rate limit rule: {part!r}")
+            continue
+        if prefix:
+            rules.append(Rule(prefix, rate, burst))
+    # Самый длинный префикс проверяется первым; "*" — в конце
+    rules.sort(key=lambda r: (r.prefix == "*", -len(r.prefix)))
+    return rules
+
+
+class TokenBuckets:
+    """Ведра по ключу (правило, клиент); давно не использованные вытесняются."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+
+    def take(self, rule: Rule, client: str) -> float:
+        """Списывает токен; возвращает 0 или сколько секунд ждать до следующего."""
+        now = time.monotonic()
+        key = (rule.prefix, client)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [rule.burst, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(rule.burst, bucket[0] + (now - bucket[1]) * rule.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rule.rate
+
+
+class DbInflight:
+    """Число запросов к Supabase, выполняющихся прямо сейчас (во всех потоках процесса)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def instrument(self, client) -> None:
+        import database
+
+        def wrap(send):
+            def counted_send(request, *args, **kwargs):
+                with self._lock:
+                    self.value += 1
+                try:
+                    return send(request, *args, **kwargs)
+                finally:
+                    with self._lock:
+                        self.value -= 1
+            return counted_send
+
+        database.instrument(client, wrap)
+
+
+db_inflight = DbInflight()
+
+
+def _client_key(scope, path: str) -> str:
+    headers = dict(scope.get("headers") or [])
+    if not path.startswith("/auth/"):
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        if authorization.lower().startswith("bearer "):
+            data = auth.decode_token(authorization[7:])
+            if data and data.user_id is not None:
+                return f"user:{data.user_id}"
+    return f"ip:{_client_ip(scope, headers)}"
+
+
+def _parse_networks(value: str) -> list:
+    networks = []
+    for part in value.split(","):
+        if part.strip():
+            try:
+                networks.append(ipaddress.ip_network(part.strip(), strict=False))
+            except ValueError:
+                logger.warning(f"Invalid trusted proxy: {part!r}")
+    return networks
+
+
+_trusted_networks = _parse_networks(TRUSTED_PROXIES)
+
+
+def _trusted(ip: str) -> bool:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_networks)
+
+
+def _client_ip(scope, headers: dict) -> str:
+    """IP клиента: заголовки прокси учитываются, только если соединение пришло от него."""
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not _trusted(peer):
+        # Иначе клиент менял бы заголовок на каждый запрос и получал новый бюджет
+        return peer
+    ip = headers.get(b"x-real-ip", b"").decode("latin-1").strip()
+    if ip:
+        return ip
+    # Правый адрес дописал ближайший прокси; всё левее доверенных прислал клиент
+    forwarded = headers.get(b"x-forwarded-for", b"").decode("latin-1").split(",")
+    for candidate in reversed([c.strip() for c in forwarded if c.strip()]):
+        if not _trusted(candidate):
+            return candidate
+    return peer
+
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """ASGI middleware; работает в цикле событий, поэтому счётчики ключей без блокировок."""
+
+    def __init__(self, app, rules: Optional[List[Rule]] = None):
+        self.app = app
+        self.rules = rules if rules is not None else parse_rules(RATE_LIMIT_RULES)
+        self.buckets = TokenBuckets(RATE_LIMIT_MAX_KEYS)
+        self.inflight: Dict[str, int] = {}
+        self.rejected = 0
+
+    def _rule(self, path: str) -> Optional[Rule]:
+        for rule in self.rules:
+            if rule.prefix == "*" or path.startswith(rule.prefix):
+                return rule
+        return None
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (scope["type"] != "http" or scope["method"] == "OPTIONS"
+                or path.startswith(_EXEMPT_PREFIXES) or not path.startswith(_API_PREFIXES)):
+            await self.app(scope, receive, send)
+            return
+
+        client = _client_key(scope, path)
+
+        # Сброс нагрузки: база перегружена — сначала отказываем клиентам, у которых
+        # уже есть запросы в работе, остальным — только при двойном превышении
+        if SHED_DB_INFLIGHT > 0 and db_inflight.value >= SHED_DB_INFLIGHT:
+            if self.inflight.get(client) or db_inflight.value >= 2 * SHED_DB_INFLIGHT:
+                self.rejected += 1
+                await _reject(send, 503, "Server is overloaded, retry later", 1)
+                return
+
+        rule = self._rule(path)
+        if rule is not None:
+            wait = self.buckets.take(rule, client)
+            if wait > 0:
+                self.rejected += 1
+                await _reject(send, 429, "Too many requests", wait)
+                return
+
+        if RATE_LIMIT_CONCURRENT > 0 and self.inflight.get(client, 0) >= RATE_LIMIT_CONCURRENT:
+            self.rejected += 1
+            await _reject(send, 429, "Too many concurrent requests", 1)
+            return
+
+        self.inflight[client] = self.inflight.get(client, 0) + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            left = self.inflight[client] - 1
+            if left:
+                self.inflight[client] = left
+            else:
+                del self.inflight[client]
+
+
+def install(app) -> None:
+    """Подключает ограничения к приложению (RATE_LIMIT_ENABLED=0 — выключить)."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    from database import supabase, supabase_admin
+    app.add_middleware(RateLimitMiddleware)
+    db_inflight.instrument(supabase)
+    if supabase_admin is not supabase:
+        db_inflight.instrument(supabase_admin)
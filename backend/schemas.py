@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Any, Optional, List, Dict, Literal
 from datetime import datetime
 
 class PhoneLoginRequest(BaseModel):
@@ -70,6 +70,7 @@ class JobBase(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
     scheduled_at: Optional[datetime] = None
+    duration_minutes: Optional[int] = None
     completed_at: Optional[datetime] = None
     price: Optional[float] = None
     status: Optional[str] = "scheduled"
@@ -92,6 +93,7 @@ class JobUpdate(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
     scheduled_at: Optional[datetime] = None
+    duration_minutes: Optional[int] = None
     completed_at: Optional[datetime] = None
     price: Optional[float] = None
     status: Optional[str] = None
@@ -108,6 +110,41 @@ class JobResponse(JobBase):
     class Config:
         from_attributes = True
 
+class ScheduleConflict(BaseModel):
+    id: int
+    title: Optional[str] = None
+    customer_name: Optional[str] = None
+    address: Optional[str] = None
+    status: str
+    scheduled_at: datetime
+    scheduled_end: datetime
+
+class JobWriteResponse(JobResponse):
+    conflicts: List[ScheduleConflict] = []
+
+class JobPatchOperation(BaseModel):
+    """Операция в стиле JSON Patch над checklist/services: /checklist/3/done, /services/-"""
+    op: Literal["add", "remove", "replace", "test"]
+    path: str
+    value: Any = None
+
+class JobPatchResponse(BaseModel):
+    id: int
+    updated_at: datetime
+
+class GeocodeResult(BaseModel):
+    address: str
+    found: bool
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+class ScheduleCheck(BaseModel):
+    user_id: int
+    start: datetime
+    end: datetime
+    free: bool
+    conflicts: List[ScheduleConflict]
+
 class DashboardStats(BaseModel):
     total_jobs: int
     today_jobs: int
@@ -130,3 +167,89 @@ class ServiceResponse(ServiceBase):
     created_at: datetime
     class Config:
         from_attributes = True
+
+class JobSearchResponse(BaseModel):
+    items: List[JobResponse]
+    limit: int
+    offset: int
+    has_more: bool
+
+class CustomerSuggestion(BaseModel):
+    customer_phone: str
+    customer_name: Optional[str] = None
+    address: Optional[str] = None
+    jobs_count: int
+
+class CustomerHistory(BaseModel):
+    customer_phone: str
+    customer_name: Optional[str] = None
+    jobs: List[JobResponse]
+    jobs_count: int
+    total_spent: float
+    last_visit: Optional[datetime] = None
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReport(BaseModel):
+    total: int
+    imported: int
+    failed: int
+    dry_run: bool
+    errors: List[ImportRowError]
+    errors_truncated: bool
+
+class AnalyticsPoint(BaseModel):
+    period: str
+    dimension: Optional[str] = None
+    jobs_count: int
+    completed_count: int
+    cancelled_count: int
+    revenue: float
+
+class AnalyticsTimeseries(BaseModel):
+    date_from: str
+    date_to: str
+    granularity: str
+    split_by: Optional[str] = None
+    points: List[AnalyticsPoint]
+
+class CalendarDay(BaseModel):
+    date: str
+    jobs_count: int
+    by_status: Dict[str, int]
+    revenue: float
+
+class CalendarMonth(BaseModel):
+    month: str
+    timezone: str
+    days: List[CalendarDay]
+
+class WorkerOverview(BaseModel):
+    user_id: int
+    name: Optional[str] = None
+    phone: str
+    today_jobs: int
+    open_jobs: int
+    completed_month: int
+    revenue_month: float
+    next_job_id: Optional[int] = None
+    next_job_at: Optional[datetime] = None
+    next_job_address: Optional[str] = None
+
+class PushConfig(BaseModel):
+    enabled: bool
+    vapid_public: Optional[str] = None
+
+class BootstrapResponse(BaseModel):
+    user: UserResponse
+    today_jobs: List[JobResponse]
+    stats: DashboardStats
+    services: List[ServiceResponse]
+    services_version: str
+    push: PushConfig
+
+class ServicesCatalogResponse(BaseModel):
+    version: str
+    services: List[ServiceResponse]
@@ -36,6 +36,8 @@ CREATE TABLE IF NOT EXISTS jobs (
     job_type VARCHAR(50) DEFAULT 'repair',
     checklist JSONB DEFAULT '[]'::JSONB,
     services JSONB DEFAULT '[]'::JSONB,
+    customer_phone_norm VARCHAR(20),
+    duration_minutes INTEGER,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
@@ -78,8 +80,510 @@ CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone);
 CREATE INDEX IF NOT EXISTS idx_jobs_user_id ON jobs(user_id);
 CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
 CREATE INDEX IF NOT EXISTS idx_jobs_scheduled_at ON jobs(scheduled_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_user_scheduled ON jobs(user_id, scheduled_at);
 CREATE INDEX IF NOT EXISTS idx_sms_codes_phone ON sms_codes(phone);
 
+-- =============================================
+-- История клиента по нормализованному телефону
+-- =============================================
+-- Колонку заполняет бэкенд (auth.normalize_phone) при создании и обновлении заявки
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS customer_phone_norm VARCHAR(20);
+
+-- text_pattern_ops: и точное совпадение, и префикс (LIKE '+7999%') для автодополнения
+CREATE INDEX IF NOT EXISTS idx_jobs_customer_phone_norm
+    ON jobs(customer_phone_norm text_pattern_ops, scheduled_at DESC);
+
+-- То же правило, что и auth.normalize_phone — для заполнения существующих заявок
+CREATE OR REPLACE FUNCTION normalize_phone(p_phone TEXT) RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN c LIKE '8%' AND length(c) = 11 THEN '+7' || substr(c, 2)
+        WHEN c LIKE '+%' THEN c
+        ELSE '+' || c
+    END
+    FROM (SELECT regexp_replace(p_phone, '[^0-9+]', '', 'g') AS c) t;
+$$ LANGUAGE sql IMMUTABLE;
+
+UPDATE jobs SET customer_phone_norm = normalize_phone(customer_phone)
+WHERE customer_phone_norm IS NULL AND coalesce(customer_phone, '') <> '';
+
+-- =============================================
+-- Полнотекстовый и нечёткий поиск по заявкам
+-- =============================================
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Текст для поиска: имя, адрес, телефон (как есть и только цифры), заголовок, описание
+CREATE OR REPLACE FUNCTION jobs_search_text(
+    p_customer_name TEXT, p_address TEXT, p_customer_phone TEXT, p_title TEXT, p_description TEXT
+) RETURNS TEXT AS $$
+    SELECT lower(
+        coalesce(p_customer_name, '') || ' ' ||
+        coalesce(p_address, '') || ' ' ||
+        coalesce(p_customer_phone, '') || ' ' ||
+        regexp_replace(coalesce(p_customer_phone, ''), '\D', '', 'g') || ' ' ||
+        coalesce(p_title, '') || ' ' ||
+        coalesce(p_description, '')
+    );
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Взвешенный tsvector: клиент и телефон важнее адреса, адрес важнее описания
+CREATE OR REPLACE FUNCTION jobs_search_vector(
+    p_customer_name TEXT, p_address TEXT, p_customer_phone TEXT, p_title TEXT, p_description TEXT
+) RETURNS TSVECTOR AS $$
+    SELECT
+        setweight(to_tsvector('simple', coalesce(p_customer_name, '')), 'A') ||
+        setweight(to_tsvector('simple', regexp_replace(coalesce(p_customer_phone, ''), '\D', '', 'g')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(p_address, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(p_title, '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(p_description, '')), 'D');
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE INDEX IF NOT EXISTS idx_jobs_search_vector ON jobs USING GIN (
+    jobs_search_vector(customer_name, address, customer_phone, title, description)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_search_trgm ON jobs USING GIN (
+    jobs_search_text(customer_name, address, customer_phone, title, description) gin_trgm_ops
+);
+
+-- Ранжированный поиск с пагинацией (p_user_id = NULL — по всем мастерам)
+CREATE OR REPLACE FUNCTION search_jobs(
+    p_query TEXT,
+    p_user_id INTEGER DEFAULT NULL,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0
+) RETURNS SETOF jobs AS $$
+    WITH q AS (
+        SELECT
+            websearch_to_tsquery('simple', p_query) AS ts,
+            lower(p_query) AS term,
+            '%' || replace(replace(replace(lower(p_query), '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pattern,
+            -- Номер заявки: точное совпадение по id идёт первым
+            CASE WHEN p_query ~ '^[0-9]{1,9}$' THEN p_query::INTEGER END AS job_id
+    )
+    SELECT j.*
+    FROM jobs j, q
+    WHERE (p_user_id IS NULL OR j.user_id = p_user_id)
+      AND (
+          j.id = q.job_id
+          OR jobs_search_vector(j.customer_name, j.address, j.customer_phone, j.title, j.description) @@ q.ts
+          OR jobs_search_text(j.customer_name, j.address, j.customer_phone, j.title, j.description) LIKE q.pattern
+          OR q.term <% jobs_search_text(j.customer_name, j.address, j.customer_phone, j.title, j.description)
+      )
+    ORDER BY
+        j.id = q.job_id DESC NULLS LAST,
+        ts_rank(jobs_search_vector(j.customer_name, j.address, j.customer_phone, j.title, j.description), q.ts)
+        + word_similarity(q.term, jobs_search_text(j.customer_name, j.address, j.customer_phone, j.title, j.description)) DESC,
+        j.scheduled_at DESC NULLS LAST,
+        j.id DESC
+    LIMIT p_limit OFFSET p_offset;
+$$ LANGUAGE sql STABLE;
+
+-- =============================================
+-- Дневные агрегаты для аналитики (ведутся триггером)
+-- =============================================
+-- День заявки: дата выполнения для выполненных, иначе дата визита (UTC)
+CREATE TABLE IF NOT EXISTS job_daily_rollups (
+    day DATE NOT NULL,
+    user_id INTEGER NOT NULL,
+    job_type VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    jobs_count INTEGER NOT NULL DEFAULT 0,
+    revenue DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id, job_type, status)
+);
+
+ALTER TABLE job_daily_rollups ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all for anon" ON job_daily_rollups FOR ALL USING (true) WITH CHECK (true);
+
+-- Сумма заявки — то же правило, что и calculate_job_total в main.py
+CREATE OR REPLACE FUNCTION job_total(p_price DOUBLE PRECISION, p_services JSONB) RETURNS DOUBLE PRECISION AS $$
+    SELECT CASE
+        WHEN coalesce(p_price, 0) > 0 THEN p_price
+        ELSE coalesce((
+            SELECT sum(
+                CASE WHEN s->>'price' ~ '^\s*-?[0-9]+(\.[0-9]+)?\s*$' THEN (s->>'price')::DOUBLE PRECISION ELSE 0 END *
+                CASE WHEN s->>'quantity' ~ '^\s*-?[0-9]+(\.[0-9]+)?\s*$' AND (s->>'quantity')::DOUBLE PRECISION <> 0
+                     THEN (s->>'quantity')::DOUBLE PRECISION ELSE 1 END
+            )
+            FROM jsonb_array_elements(CASE WHEN jsonb_typeof(p_services) = 'array' THEN p_services ELSE '[]'::JSONB END) s
+            WHERE jsonb_typeof(s) = 'object'
+        ), 0)
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION job_rollup_apply(j jobs, p_sign INTEGER) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO job_daily_rollups AS r (day, user_id, job_type, status, jobs_count, revenue)
+    VALUES (
+        (CASE WHEN j.status = 'completed' THEN coalesce(j.completed_at, j.scheduled_at, j.created_at)
+              ELSE coalesce(j.scheduled_at, j.created_at) END AT TIME ZONE 'UTC')::DATE,
+        j.user_id,
+        coalesce(j.job_type, 'other'),
+        coalesce(j.status, 'scheduled'),
+        p_sign,
+        p_sign * job_total(j.price, j.services)
+    )
+    ON CONFLICT (day, user_id, job_type, status) DO UPDATE
+        SET jobs_count = r.jobs_count + EXCLUDED.jobs_count,
+            revenue = r.revenue + EXCLUDED.revenue;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION jobs_rollup_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM job_rollup_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM job_rollup_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_jobs_rollup_insert_delete ON jobs;
+CREATE TRIGGER trigger_jobs_rollup_insert_delete
+    AFTER INSERT OR DELETE ON jobs
+    FOR EACH ROW EXECUTE FUNCTION jobs_rollup_trigger();
+
+-- Обновление пересчитывается, только если изменилось что-то, влияющее на агрегаты
+DROP TRIGGER IF EXISTS trigger_jobs_rollup_update ON jobs;
+CREATE TRIGGER trigger_jobs_rollup_update
+    AFTER UPDATE OF status, price, services, job_type, user_id, scheduled_at, completed_at ON jobs
+    FOR EACH ROW
+    WHEN ((OLD.status, OLD.price, OLD.services, OLD.job_type, OLD.user_id, OLD.scheduled_at, OLD.completed_at)
+          IS DISTINCT FROM
+          (NEW.status, NEW.price, NEW.services, NEW.job_type, NEW.user_id, NEW.scheduled_at, NEW.completed_at))
+    EXECUTE FUNCTION jobs_rollup_trigger();
+
+-- Первичное заполнение (только для пустой таблицы агрегатов)
+INSERT INTO job_daily_rollups (day, user_id, job_type, status, jobs_count, revenue)
+SELECT
+    (CASE WHEN j.status = 'completed' THEN coalesce(j.completed_at, j.scheduled_at, j.created_at)
+          ELSE coalesce(j.scheduled_at, j.created_at) END AT TIME ZONE 'UTC')::DATE,
+    j.user_id,
+    coalesce(j.job_type, 'other'),
+    coalesce(j.status, 'scheduled'),
+    count(*),
+    sum(job_total(j.price, j.services))
+FROM jobs j
+WHERE NOT EXISTS (SELECT 1 FROM job_daily_rollups)
+GROUP BY 1, 2, 3, 4;
+
+-- Временной ряд по дням; p_split = 'user_id' | 'job_type' разбивает ряд по мастерам или типам
+CREATE OR REPLACE FUNCTION analytics_timeseries(
+    p_from DATE,
+    p_to DATE,
+    p_user_id INTEGER DEFAULT NULL,
+    p_job_type TEXT DEFAULT NULL,
+    p_split TEXT DEFAULT NULL
+) RETURNS TABLE (
+    day DATE,
+    dimension TEXT,
+    jobs_count BIGINT,
+    completed_count BIGINT,
+    cancelled_count BIGINT,
+    revenue DOUBLE PRECISION
+) AS $$
+    SELECT
+        r.day,
+        CASE p_split WHEN 'user_id' THEN r.user_id::TEXT WHEN 'job_type' THEN r.job_type END,
+        sum(r.jobs_count),
+        coalesce(sum(r.jobs_count) FILTER (WHERE r.status = 'completed'), 0),
+        coalesce(sum(r.jobs_count) FILTER (WHERE r.status = 'cancelled'), 0),
+        coalesce(sum(r.revenue) FILTER (WHERE r.status = 'completed'), 0)
+    FROM job_daily_rollups r
+    WHERE r.day BETWEEN p_from AND p_to
+      AND (p_user_id IS NULL OR r.user_id = p_user_id)
+      AND (p_job_type IS NULL OR r.job_type = p_job_type)
+    GROUP BY 1, 2
+    HAVING sum(r.jobs_count) <> 0
+    ORDER BY 1, 2;
+$$ LANGUAGE sql STABLE;
+
+-- Сводка календаря: заявки и выручка по дням и статусам за диапазон scheduled_at
+CREATE OR REPLACE FUNCTION jobs_calendar(
+    p_from TIMESTAMPTZ,
+    p_to TIMESTAMPTZ,
+    p_tz TEXT DEFAULT 'UTC',
+    p_user_id INTEGER DEFAULT NULL
+) RETURNS TABLE (
+    day DATE,
+    status TEXT,
+    jobs_count BIGINT,
+    revenue DOUBLE PRECISION
+) AS $$
+    SELECT
+        (j.scheduled_at AT TIME ZONE p_tz)::DATE,
+        coalesce(j.status, 'scheduled'),
+        count(*),
+        coalesce(sum(job_total(j.price, j.services)) FILTER (WHERE j.status = 'completed'), 0)
+    FROM jobs j
+    WHERE j.scheduled_at >= p_from
+      AND j.scheduled_at < p_to
+      AND (p_user_id IS NULL OR j.user_id = p_user_id)
+    GROUP BY 1, 2
+    ORDER BY 1, 2;
+$$ LANGUAGE sql STABLE;
+
+-- =============================================
+-- Загрузка мастеров для страницы «Сотрудники»
+-- =============================================
+-- Одна выборка на всех активных мастеров: заявки на сегодня и открытые — из jobs
+-- (BitmapOr по индексам дат и статуса), выполненные за месяц и выручка — из дневных
+-- агрегатов job_daily_rollups (дни в UTC), ближайшая заявка — по idx_jobs_user_scheduled
+CREATE OR REPLACE FUNCTION workers_overview(
+    p_today_start TIMESTAMPTZ,
+    p_today_end TIMESTAMPTZ,
+    p_month_start DATE,
+    p_now TIMESTAMPTZ DEFAULT NOW()
+) RETURNS TABLE (
+    user_id INTEGER,
+    name VARCHAR,
+    phone VARCHAR,
+    today_jobs BIGINT,
+    open_jobs BIGINT,
+    completed_month BIGINT,
+    revenue_month DOUBLE PRECISION,
+    next_job_id INTEGER,
+    next_job_at TIMESTAMPTZ,
+    next_job_address VARCHAR
+) AS $$
+    WITH load AS (
+        SELECT
+            j.user_id,
+            count(*) FILTER (WHERE j.scheduled_at >= p_today_start AND j.scheduled_at < p_today_end) AS today_jobs,
+            count(*) FILTER (WHERE j.status IN ('scheduled', 'active')) AS open_jobs
+        FROM jobs j
+        WHERE (j.scheduled_at >= p_today_start AND j.scheduled_at < p_today_end)
+           OR j.status IN ('scheduled', 'active')
+        GROUP BY j.user_id
+    ), month AS (
+        SELECT r.user_id, sum(r.jobs_count) AS completed_month, sum(r.revenue) AS revenue_month
+        FROM job_daily_rollups r
+        WHERE r.day >= p_month_start AND r.status = 'completed'
+        GROUP BY r.user_id
+    )
+    SELECT
+        u.id, u.name, u.phone,
+        coalesce(l.today_jobs, 0),
+        coalesce(l.open_jobs, 0),
+        coalesce(m.completed_month, 0)::BIGINT,
+        coalesce(m.revenue_month, 0),
+        n.id, n.scheduled_at, n.address
+    FROM users u
+    LEFT JOIN load l ON l.user_id = u.id
+    LEFT JOIN month m ON m.user_id = u.id
+    LEFT JOIN LATERAL (
+        SELECT j.id, j.scheduled_at, j.address
+        FROM jobs j
+        WHERE j.user_id = u.id
+          AND j.scheduled_at >= p_now
+          AND j.status IN ('scheduled', 'active')
+        ORDER BY j.scheduled_at
+        LIMIT 1
+    ) n ON TRUE
+    WHERE u.role = 'master' AND u.is_active
+    ORDER BY u.name NULLS LAST, u.id;
+$$ LANGUAGE sql STABLE;
+
+-- =============================================
+-- Конфликты расписания мастера
+-- =============================================
+-- Длительность визита в минутах; NULL — стандартный час
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS duration_minutes INTEGER;
+
+-- btree_gist: user_id (равенство) и интервал (пересечение) в одном GiST-индексе
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Интервал визита [начало, конец). Прибавление минут не зависит от часового пояса,
+-- поэтому функция IMMUTABLE и годится для индекса
+CREATE OR REPLACE FUNCTION job_slot(p_start TIMESTAMPTZ, p_duration_minutes INTEGER) RETURNS TSTZRANGE AS $$
+    SELECT tstzrange(p_start, p_start + coalesce(p_duration_minutes, 60) * INTERVAL '1 minute', '[)');
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Занимают время мастера только открытые заявки с назначенным временем
+CREATE INDEX IF NOT EXISTS idx_jobs_schedule_slot ON jobs USING GIST (user_id, job_slot(scheduled_at, duration_minutes))
+    WHERE scheduled_at IS NOT NULL AND status IN ('scheduled', 'active');
+
+-- Открытые заявки мастера, пересекающиеся с [p_start, p_end); p_exclude_job_id — сама проверяемая заявка
+CREATE OR REPLACE FUNCTION find_schedule_conflicts(
+    p_user_id INTEGER,
+    p_start TIMESTAMPTZ,
+    p_end TIMESTAMPTZ,
+    p_exclude_job_id INTEGER DEFAULT NULL
+) RETURNS TABLE (
+    id INTEGER,
+    title VARCHAR,
+    customer_name VARCHAR,
+    address VARCHAR,
+    status VARCHAR,
+    scheduled_at TIMESTAMPTZ,
+    scheduled_end TIMESTAMPTZ
+) AS $$
+    SELECT j.id, j.title, j.customer_name, j.address, j.status, j.scheduled_at,
+           upper(job_slot(j.scheduled_at, j.duration_minutes))
+    FROM jobs j
+    WHERE j.user_id = p_user_id
+      AND j.scheduled_at IS NOT NULL
+      AND j.status IN ('scheduled', 'active')
+      AND job_slot(j.scheduled_at, j.duration_minutes) && tstzrange(p_start, p_end, '[)')
+      AND j.id IS DISTINCT FROM p_exclude_job_id
+    ORDER BY j.scheduled_at;
+$$ LANGUAGE sql STABLE;
+
+-- =============================================
+-- История заявок (пишет бэкенд пачками, job_events.py)
+-- =============================================
+-- Без внешнего ключа на jobs: история удалённых заявок сохраняется
+CREATE TABLE IF NOT EXISTS job_events (
+    id BIGSERIAL PRIMARY KEY,
+    job_id INTEGER NOT NULL,
+    user_id INTEGER,                -- мастер заявки
+    actor_id INTEGER,               -- кто совершил действие
+    event VARCHAR(20) NOT NULL,     -- created | status | deleted
+    status VARCHAR(20),             -- статус заявки после события
+    occurred_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events(job_id, occurred_at);
+CREATE INDEX IF NOT EXISTS idx_job_events_occurred_at ON job_events(occurred_at);
+
+ALTER TABLE job_events ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all for anon" ON job_events FOR ALL USING (true) WITH CHECK (true);
+
+-- Переходы статусов с длительностью пребывания в предыдущем статусе (для SLA).
+-- Повторная запись того же статуса переходом не считается
+CREATE OR REPLACE VIEW job_status_transitions AS
+WITH changes AS (
+    SELECT e.id, e.job_id, e.user_id, e.status, e.occurred_at,
+           lag(e.status) OVER (PARTITION BY e.job_id ORDER BY e.occurred_at, e.id) AS prev_status
+    FROM job_events e
+    WHERE e.event IN ('created', 'status')
+)
+SELECT c.job_id, c.user_id,
+       lag(c.status) OVER w AS from_status,
+       c.status AS to_status,
+       c.occurred_at,
+       c.occurred_at - lag(c.occurred_at) OVER w AS time_in_from_status
+FROM changes c
+WHERE c.prev_status IS DISTINCT FROM c.status
+WINDOW w AS (PARTITION BY c.job_id ORDER BY c.occurred_at, c.id);
+
+-- =============================================
+-- Частичное изменение checklist / services (PATCH /jobs/{id})
+-- =============================================
+-- Операции в стиле JSON Patch (RFC 6902): add, remove, replace, test.
+-- Путь: /checklist, /checklist/3, /checklist/3/done, /services/- (добавить в конец).
+-- Строка блокируется на время применения: параллельные правки одного списка
+-- выполняются по очереди, а не перезаписывают друг друга. Любая ошибка
+-- откатывает все операции. Коды ошибок PTxxx PostgREST отдаёт как HTTP xxx.
+-- Возвращает изменённую строку целиком — для модели ближайших заявок без повторного чтения.
+-- Прежняя версия возвращала (id, updated_at): тип результата так не заменить
+DROP FUNCTION IF EXISTS patch_job_lists(INTEGER, INTEGER, JSONB);
+CREATE OR REPLACE FUNCTION patch_job_lists(
+    p_job_id INTEGER,
+    p_user_id INTEGER,
+    p_ops JSONB
+) RETURNS SETOF jobs AS $$
+DECLARE
+    v_checklist JSONB;
+    v_services JSONB;
+    v_list JSONB;
+    v_op JSONB;
+    v_path TEXT[];
+    v_sub TEXT[];
+    v_field TEXT;
+BEGIN
+    SELECT COALESCE(j.checklist, '[]'::JSONB), COALESCE(j.services, '[]'::JSONB)
+    INTO v_checklist, v_services
+    FROM jobs j
+    WHERE j.id = p_job_id AND j.user_id = p_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Job not found' USING ERRCODE = 'PT404';
+    END IF;
+
+    FOR v_op IN SELECT * FROM jsonb_array_elements(p_ops) LOOP
+        v_path := string_to_array(substr(v_op->>'path', 2), '/');
+        v_field := v_path[1];
+        v_sub := v_path[2:];
+        IF v_field = 'checklist' THEN
+            v_list := v_checklist;
+        ELSIF v_field = 'services' THEN
+            v_list := v_services;
+        ELSE
+            RAISE EXCEPTION 'Unsupported path: %', v_op->>'path' USING ERRCODE = 'PT422';
+        END IF;
+
+        IF v_op->>'op' = 'test' THEN
+            IF (v_list #> v_sub) IS DISTINCT FROM (v_op->'value') THEN
+                RAISE EXCEPTION 'Test failed: %', v_op->>'path' USING ERRCODE = 'PT409';
+            END IF;
+        ELSIF cardinality(v_sub) = 0 THEN
+            -- Весь список целиком
+            IF v_op->>'op' = 'remove' THEN
+                v_list := '[]'::JSONB;
+            ELSE
+                v_list := v_op->'value';
+            END IF;
+        ELSIF v_op->>'op' = 'add' AND v_sub = ARRAY['-'] THEN
+            v_list := v_list || jsonb_build_array(v_op->'value');
+        ELSIF v_op->>'op' = 'add' AND cardinality(v_sub) = 1 THEN
+            IF v_sub[1]::INTEGER > jsonb_array_length(v_list) THEN
+                RAISE EXCEPTION 'Index out of range: %', v_op->>'path' USING ERRCODE = 'PT422';
+            END IF;
+            v_list := jsonb_insert(v_list, v_sub, v_op->'value');
+        ELSE
+            -- add на поле элемента допускает новое поле, остальным нужен существующий путь
+            IF (v_list #> CASE WHEN v_op->>'op' = 'add' THEN v_sub[1:cardinality(v_sub) - 1] ELSE v_sub END) IS NULL THEN
+                RAISE EXCEPTION 'Path not found: %', v_op->>'path' USING ERRCODE = 'PT409';
+            END IF;
+            IF v_op->>'op' = 'remove' THEN
+                v_list := v_list #- v_sub;
+            ELSE
+                v_list := jsonb_set(v_list, v_sub, v_op->'value', v_op->>'op' = 'add');
+            END IF;
+        END IF;
+
+        IF v_field = 'checklist' THEN
+            v_checklist := v_list;
+        ELSE
+            v_services := v_list;
+        END IF;
+    END LOOP;
+
+    RETURN QUERY
+    UPDATE jobs j
+    SET checklist = v_checklist, services = v_services
+    WHERE j.id = p_job_id
+    RETURNING j.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =============================================
+-- Кэш геокодирования (geocoding.py)
+-- =============================================
+-- Ключ — нормализованный адрес: повторный адрес не стоит внешнего запроса.
+-- status = not_found тоже кэшируется и перепроверяется через GEOCODE_RETRY_DAYS
+CREATE TABLE IF NOT EXISTS geocode_cache (
+    address_norm TEXT PRIMARY KEY,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    status VARCHAR(20) NOT NULL DEFAULT 'ok',   -- ok | not_found
+    provider VARCHAR(20),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE geocode_cache ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow all for anon" ON geocode_cache FOR ALL USING (true) WITH CHECK (true);
+
+-- Заявки без координат для фонового дозаполнения
+CREATE INDEX IF NOT EXISTS idx_jobs_missing_coords ON jobs(id)
+    WHERE latitude IS NULL AND address IS NOT NULL;
+
+-- Сверка модели ближайших заявок (upcoming.py): строки, изменённые после метки
+CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs(updated_at);
+
 -- Функция автообновления updated_at
 CREATE OR REPLACE FUNCTION update_updated_at()
 RETURNS TRIGGER AS $$
@@ -0,0 +1,55 @@
+"""
+Общая настройка тестов backend: python -m pytest из каталога backend.
+
+Модули читают настройки при импорте, поэтому фиктивный Supabase задаётся до
+первого импорта database. Тесты, которым нужна настоящая база Postgres,
+пропускаются без DATABASE_URL; сравнение с PostgREST (test_backend_parity.py)
+дополнительно требует TEST_SUPABASE_URL и TEST_SUPABASE_KEY (service key) —
+PostgREST над той же базой.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+import pytest
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+TEST_SUPABASE_URL = os.getenv("TEST_SUPABASE_URL")
+TEST_SUPABASE_KEY = os.getenv("TEST_SUPABASE_KEY")
+
+
+@pytest.fixture(scope="session")
+def pg():
+    """Прямой клиент к тестовой базе со схемой supabase_schema.sql."""
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+    from postgres_backend import PostgresClient
+    client = PostgresClient(DATABASE_URL)
+    yield client
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def supabase_client(pg):
+    """Клиент supabase к PostgREST, который обслуживает ту же базу, что и pg."""
+    if not (TEST_SUPABASE_URL and TEST_SUPABASE_KEY):
+        pytest.skip("TEST_SUPABASE_URL / TEST_SUPABASE_KEY are not set")
+    from supabase import create_client
+    return create_client(TEST_SUPABASE_URL, TEST_SUPABASE_KEY)
+
+
+@pytest.fixture
+def master(pg):
+    """Мастер для заявок теста; удаляется вместе с заявками (ON DELETE CASCADE)."""
+    import random
+    phone = f"+7000{random.randint(0, 9999999):07d}"
+    user = pg.table("users").insert({"phone": phone, "name": "Тестовый мастер", "role": "master"}).execute().data[0]
+    yield user
+    pg.table("users").delete().eq("id", user["id"]).execute()
@@ -0,0 +1,219 @@
+"""
+Один и тот же код backend против обоих хранилищ: PostgresClient и PostgREST.
+
+Данные готовятся напрямую в базе DATABASE_URL, цепочки запросов и функции
+выполняются через проверяемый клиент. Сторона PostgREST запускается, если
+TEST_SUPABASE_URL/TEST_SUPABASE_KEY указывают на PostgREST над той же базой.
+"""
+import pytest
+from postgrest.exceptions import APIError
+
+DAY = "2030-01-15"
+
+
+@pytest.fixture(params=["postgres", "supabase"])
+def db(request):
+    return request.getfixturevalue("pg" if request.param == "postgres" else "supabase_client")
+
+
+@pytest.fixture
+def jobs(pg, master):
+    """Две открытые заявки на DAY (вторая пересекается с первой) и выполненная накануне."""
+    rows = pg.table("jobs").insert([
+        {"user_id": master["id"], "title": "Утро", "customer_name": "Иван Паритетов",
+         "address": "ул. Ленина, 1", "status": "scheduled", "price": 1000,
+         "scheduled_at": f"{DAY}T10:00:00+00:00", "duration_minutes": 60},
+        {"user_id": master["id"], "title": "Следом", "customer_phone_norm": "+79990000001",
+         "status": "active", "scheduled_at": f"{DAY}T10:30:00.5+00:00",
+         "checklist": [{"text": "Фильтр", "done": False}]},
+        {"user_id": master["id"], "title": "Вчера", "status": "completed", "price": 0,
+         "services": [{"name": "Чистка", "price": 750, "quantity": 2}],
+         "scheduled_at": "2030-01-14T09:00:00+00:00", "completed_at": "2030-01-14T12:00:00+00:00"},
+    ]).execute().data
+    return {row["title"]: row for row in rows}
+
+
+def ids(rows):
+    return [row["id"] for row in rows]
+
+
+# ==================== Цепочки table() ====================
+
+def test_select_filters_order_limit(db, master, jobs):
+    rows = db.table("jobs").select("id, status, price").eq("user_id", master["id"]) \
+        .in_("status", ["scheduled", "active", "completed"]).neq("title", "Вчера") \
+        .order("scheduled_at", desc=True).limit(1).execute().data
+    assert rows == [{"id": jobs["Следом"]["id"], "status": "active", "price": None}]
+
+    rows = db.table("jobs").select("id").eq("user_id", master["id"]) \
+        .gte("scheduled_at", f"{DAY}T00:00:00+00:00").lt("scheduled_at", f"{DAY}T10:30:00+00:00").execute().data
+    assert ids(rows) == [jobs["Утро"]["id"]]
+
+    rows = db.table("jobs").select("id").eq("user_id", master["id"]) \
+        .order("price", desc=True, nullsfirst=True).order("id").execute().data
+    assert ids(rows) == [jobs["Следом"]["id"], jobs["Утро"]["id"], jobs["Вчера"]["id"]]
+
+
+def test_is_null_and_like(db, master, jobs):
+    rows = db.table("jobs").select("id").eq("user_id", master["id"]).is_("address", "null").order("id").execute().data
+    assert ids(rows) == [jobs["Следом"]["id"], jobs["Вчера"]["id"]]
+
+    rows = db.table("jobs").select("id, customer_phone_norm").eq("user_id", master["id"]) \
+        .like("customer_phone_norm", "+7999%").execute().data
+    assert rows == [{"id": jobs["Следом"]["id"], "customer_phone_norm": "+79990000001"}]
+
+
+def test_values_come_back_as_postgrest_json(db, jobs):
+    row = db.table("jobs").select("scheduled_at, checklist, services, price") \
+        .eq("id", jobs["Следом"]["id"]).execute().data[0]
+    assert row["scheduled_at"] == f"{DAY}T10:30:00.5+00:00"
+    assert row["checklist"] == [{"text": "Фильтр", "done": False}]
+    # Пачка в фикстуре вставлена с default_to_null=True: пропущенный ключ — NULL, а не DEFAULT
+    assert row["services"] is None
+    assert row["price"] is None
+
+
+def test_insert_update_delete(db, master):
+    created = db.table("jobs").insert({"user_id": master["id"], "title": "Новая"}).execute().data
+    assert len(created) == 1
+    job = created[0]
+    assert (job["status"], job["priority"], job["job_type"], job["checklist"]) == ("scheduled", "medium", "repair", [])
+
+    updated = db.table("jobs").update({"status": "completed", "price": 2500}) \
+        .eq("id", job["id"]).eq("user_id", master["id"]).execute().data
+    assert [(r["id"], r["status"], r["price"]) for r in updated] == [(job["id"], "completed", 2500)]
+    assert db.table("jobs").update({"status": "active"}).eq("id", job["id"]).eq("user_id", -1).execute().data == []
+
+    deleted = db.table("jobs").delete().eq("id", job["id"]).execute().data
+    assert ids(deleted) == [job["id"]]
+    assert db.table("jobs").select("id").eq("id", job["id"]).execute().data == []
+
+
+def test_insert_mixed_rows_keeps_defaults(db, master):
+    rows = db.table("jobs").insert([
+        {"user_id": master["id"], "title": "Полная", "status": "active", "priority": "high"},
+        {"user_id": master["id"], "title": "Пустая"},
+    ], default_to_null=False).execute().data
+    by_title = {r["title"]: (r["status"], r["priority"]) for r in rows}
+    assert by_title == {"Полная": ("active", "high"), "Пустая": ("scheduled", "medium")}
+
+
+def test_upsert_on_primary_key(db, master):
+    key = f"паритет {master['id']}"
+    try:
+        db.table("geocode_cache").upsert({"address_norm": key, "latitude": 55.0, "longitude": 37.0}).execute()
+        rows = db.table("geocode_cache").upsert(
+            {"address_norm": key, "latitude": 56.5, "longitude": 38.0, "status": "ok"}).execute().data
+        assert [(r["address_norm"], r["latitude"]) for r in rows] == [(key, 56.5)]
+        stored = db.table("geocode_cache").select("latitude").eq("address_norm", key).execute().data
+        assert stored == [{"latitude": 56.5}]
+    finally:
+        db.table("geocode_cache").delete().eq("address_norm", key).execute()
+
+
+def test_unique_violation_maps_to_sqlstate(db, master):
+    with pytest.raises(APIError) as error:
+        db.table("users").insert({"phone": master["phone"]}).execute()
+    assert error.value.code == "23505"
+
+
+# ==================== Функции rpc() ====================
+
+def test_search_jobs(db, master, jobs):
+    rows = db.rpc("search_jobs", {"p_query": "паритетов", "p_user_id": master["id"],
+                                  "p_limit": 20, "p_offset": 0}).execute().data
+    assert ids(rows) == [jobs["Утро"]["id"]]
+
+    job_id = jobs["Следом"]["id"]
+    rows = db.rpc("search_jobs", {"p_query": str(job_id), "p_user_id": master["id"]}).execute().data
+    assert ids(rows)[:1] == [job_id]
+
+
+def test_find_schedule_conflicts(db, master, jobs):
+    rows = db.rpc("find_schedule_conflicts", {
+        "p_user_id": master["id"],
+        "p_start": f"{DAY}T10:15:00+00:00",
+        "p_end": f"{DAY}T10:45:00+00:00",
+        "p_exclude_job_id": jobs["Утро"]["id"],
+    }).execute().data
+    assert [(r["id"], r["scheduled_end"]) for r in rows] == [(jobs["Следом"]["id"], f"{DAY}T11:30:00.5+00:00")]
+
+
+def test_rollups(db, master, jobs):
+    series = db.rpc("analytics_timeseries", {
+        "p_from": "2030-01-01", "p_to": "2030-01-31", "p_user_id": master["id"],
+        "p_job_type": None, "p_split": None,
+    }).execute().data
+    assert [(r["day"], r["dimension"], r["jobs_count"], r["completed_count"], r["revenue"]) for r in series] == [
+        ("2030-01-14", None, 1, 1, 1500),
+        (DAY, None, 2, 0, 0),
+    ]
+
+    calendar = db.rpc("jobs_calendar", {
+        "p_from": "2030-01-01T00:00:00+00:00", "p_to": "2030-02-01T00:00:00+00:00",
+        "p_tz": "UTC", "p_user_id": master["id"],
+    }).execute().data
+    assert [(r["day"], r["status"], r["jobs_count"], r["revenue"]) for r in calendar] == [
+        ("2030-01-14", "completed", 1, 1500),
+        (DAY, "active", 1, 0),
+        (DAY, "scheduled", 1, 0),
+    ]
+
+    workers = db.rpc("workers_overview", {
+        "p_today_start": f"{DAY}T00:00:00+00:00", "p_today_end": "2030-01-16T00:00:00+00:00",
+        "p_month_start": "2030-01-01", "p_now": "2030-01-01T00:00:00+00:00",
+    }).execute().data
+    mine = [w for w in workers if w["user_id"] == master["id"]]
+    assert [(w["today_jobs"], w["open_jobs"], w["completed_month"], w["revenue_month"],
+             w["next_job_id"], w["next_job_at"]) for w in mine] == [
+        (2, 2, 1, 1500, jobs["Утро"]["id"], f"{DAY}T10:00:00+00:00"),
+    ]
+
+
+def test_patch_job_lists(db, master, jobs):
+    job_id = jobs["Следом"]["id"]
+    rows = db.rpc("patch_job_lists", {"p_job_id": job_id, "p_user_id": master["id"], "p_ops": [
+        {"op": "test", "path": "/checklist/0/done", "value": False},
+        {"op": "replace", "path": "/checklist/0/done", "value": True},
+        {"op": "add", "path": "/services/-", "value": {"name": "Заправка", "price": 900}},
+    ]}).execute().data
+    assert ids(rows) == [job_id]
+    assert (rows[0]["user_id"], rows[0]["checklist"], rows[0]["services"]) == \
+        (master["id"], [{"text": "Фильтр", "done": True}], [{"name": "Заправка", "price": 900}])
+    stored = db.table("jobs").select("checklist, services").eq("id", job_id).execute().data[0]
+    assert stored == {"checklist": rows[0]["checklist"], "services": rows[0]["services"]}
+
+
+@pytest.mark.parametrize("user_offset, ops, code", [
+    (1, [{"op": "remove", "path": "/checklist/0"}], "PT404"),
+    (0, [{"op": "test", "path": "/checklist/0/done", "value": True}], "PT409"),
+    (0, [{"op": "replace", "path": "/checklist/5/done", "value": True}], "PT409"),
+    (0, [{"op": "add", "path": "/notes", "value": "x"}], "PT422"),
+    (0, [{"op": "add", "path": "/checklist/9", "value": {}}], "PT422"),
+    (0, [{"op": "add", "path": "/checklist/x", "value": {}}], "22P02"),
+])
+def test_patch_job_lists_errors(db, master, jobs, user_offset, ops, code):
+    job_id = jobs["Следом"]["id"]
+    with pytest.raises(APIError) as error:
+        db.rpc("patch_job_lists", {"p_job_id": job_id, "p_user_id": master["id"] + user_offset,
+                                   "p_ops": ops}).execute()
+    assert error.value.code == code
+    assert db.table("jobs").select("checklist").eq("id", job_id).execute().data == \
+        [{"checklist": [{"text": "Фильтр", "done": False}]}]
+
+
+# ==================== Сравнение ответов ====================
+
+CHAINS = {
+    "select *": lambda c, m: c.table("jobs").select("*").eq("user_id", m).order("id").execute().data,
+    "search_jobs": lambda c, m: c.rpc("search_jobs", {"p_query": "ленина", "p_user_id": m}).execute().data,
+    "conflicts": lambda c, m: c.rpc("find_schedule_conflicts", {
+        "p_user_id": m, "p_start": f"{DAY}T00:00:00+00:00", "p_end": f"{DAY}T23:59:59+00:00",
+    }).execute().data,
+}
+
+
+@pytest.mark.parametrize("chain", CHAINS)
+def test_backends_return_identical_rows(pg, supabase_client, master, jobs, chain):
+    run = CHAINS[chain]
+    assert run(supabase_client, master["id"]) == run(pg, master["id"])
@@ -0,0 +1,10 @@
+import main
+
+
+def test_conflict_lookup_failure_does_not_fail_saved_job(monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("function find_schedule_conflicts does not exist")
+
+    monkeypatch.setattr(main, "find_schedule_conflicts", broken)
+    job = {"id": 7, "user_id": 2, "status": "scheduled", "scheduled_at": "2026-10-19T10:00:00+00:00"}
+    assert main.with_conflicts(job) == {**job, "conflicts": []}
@@ -0,0 +1,47 @@
+import main
+
+MAX_ROWS = 2
+
+
+class CappedDb:
+    """Отдаёт не больше MAX_ROWS строк на запрос, как PostgREST с db-max-rows."""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    def table(self, name):
+        rows = self.jobs if name == "jobs" else []
+
+        class Query:
+            def __init__(self):
+                self.after = 0
+                self.count = None
+
+            def select(self, *args):
+                return self
+
+            def gt(self, column, value):
+                self.after = value
+                return self
+
+            def order(self, *args):
+                return self
+
+            def limit(self, count):
+                self.count = count
+                return self
+
+            def execute(self):
+                page = [r for r in rows if r["id"] > self.after][:min(self.count or len(rows), MAX_ROWS)]
+                return type("Result", (), {"data": page})()
+        return Query()
+
+
+def test_export_does_not_stop_on_page_cut_by_server_limit(monkeypatch):
+    jobs = [{"id": i, "user_id": 1, "price": 100, "services": []} for i in range(1, 6)]
+    monkeypatch.setattr(main, "supabase", CappedDb(jobs))
+    monkeypatch.setattr(main, "EXPORT_PAGE_SIZE", 1000)
+
+    rows = list(main.iter_export_rows(None, None, None, None, None))
+
+    assert [r["id"] for r in rows] == [1, 2, 3, 4, 5]
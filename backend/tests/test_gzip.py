@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_export_is_not_gzipped_and_json_is(monkeypatch):
+    monkeypatch.setattr(main, "iter_export_rows", lambda *a: iter([{c: "x" * 50 for c in main.EXPORT_COLUMNS}] * 20))
+    main.app.dependency_overrides[main.check_admin] = lambda: {"id": 1, "role": "admin"}
+    main.app.dependency_overrides[main.auth.get_current_user] = lambda: {"id": 1, "role": "admin"}
+    monkeypatch.setattr(main.catalog.services_catalog, "snapshot", lambda: ("v1", [{"id": i, "name": "s" * 40, "price": 1.0, "created_at": "2026-01-01T00:00:00+00:00"} for i in range(50)]))
+    try:
+        client = TestClient(main.app)
+        export = client.get("/admin/export/jobs.csv", headers={"Accept-Encoding": "gzip"})
+        assert export.status_code == 200
+        assert "content-encoding" not in export.headers
+        services = client.get("/services", headers={"Accept-Encoding": "gzip"})
+        assert services.headers.get("content-encoding") == "gzip"
+    finally:
+        main.app.dependency_overrides.clear()
@@ -0,0 +1,53 @@
+import main
+
+ROWS = [
+    (2, {"user_id": 1, "title": "С полями", "status": "completed", "priority": "high",
+         "job_type": "maintenance", "checklist": [{"text": "a", "done": True}], "services": []}),
+    (3, {"user_id": 1, "title": "Пустые ячейки"}),
+]
+
+
+class RecordingClient:
+    """Строит настоящий запрос postgrest-py, но не отправляет его."""
+
+    def __init__(self, client):
+        self.client = client
+        self.requests = []
+
+    def table(self, name):
+        recorder = self
+
+        class Table:
+            def insert(self, rows, **kwargs):
+                builder = recorder.client.table(name).insert(rows, **kwargs)
+
+                class Call:
+                    def execute(self):
+                        recorder.requests.append(builder.request)
+                        return type("Result", (), {"data": []})()
+                return Call()
+        return Table()
+
+
+def test_mixed_batch_keeps_column_defaults_over_postgrest(monkeypatch):
+    import database
+    client = RecordingClient(database.supabase)
+    monkeypatch.setattr(main, "supabase", client)
+    report = {"imported": 0, "failed": 0, "errors": []}
+    main.insert_import_batch(ROWS, report, actor_id=1)
+    assert report["imported"] == 2
+    assert "missing=default" in client.requests[0].headers["prefer"]
+
+
+def test_mixed_batch_keeps_column_defaults_in_postgres(monkeypatch, pg, master):
+    monkeypatch.setattr(main, "supabase", pg)
+    monkeypatch.setattr(main.job_events, "record", lambda *a, **k: None)
+    rows = [(n, {**row, "user_id": master["id"]}) for n, row in ROWS]
+    report = {"imported": 0, "failed": 0, "errors": []}
+    main.insert_import_batch(rows, report, actor_id=master["id"])
+    assert report == {"imported": 2, "failed": 0, "errors": []}
+    jobs = {j["title"]: j for j in pg.table("jobs").select("*").eq("user_id", master["id"]).execute().data}
+    assert jobs["С полями"]["status"] == "completed"
+    blank = jobs["Пустые ячейки"]
+    assert (blank["status"], blank["priority"], blank["job_type"]) == ("scheduled", "medium", "repair")
+    assert blank["checklist"] == [] and blank["services"] == []
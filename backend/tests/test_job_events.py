@@ -0,0 +1,70 @@
+import time
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+import job_events
+
+
+class FakeTable:
+    def __init__(self, db):
+        self.db = db
+
+    def insert(self, rows):
+        self.rows = rows
+        return self
+
+    def execute(self):
+        self.db.calls += 1
+        error = self.db.fail(self.rows)
+        if error:
+            raise error
+        self.db.written.extend(self.rows)
+
+
+class FakeDb:
+    def __init__(self, fail):
+        self.fail = fail
+        self.calls = 0
+        self.written = []
+
+    def table(self, name):
+        return FakeTable(self)
+
+
+def make_queue():
+    return job_events.WriteBehindQueue("job_events", batch_size=10, interval=0.01, max_size=100)
+
+
+def test_bad_row_is_dropped_and_rest_of_batch_written(monkeypatch):
+    def fail(rows):
+        if any(r["job_id"] == 2 for r in rows):
+            return APIError({"code": "23503", "message": "violates foreign key constraint"})
+    db = FakeDb(fail)
+    monkeypatch.setattr(job_events, "supabase", db)
+    queue = make_queue()
+    assert queue._write([{"job_id": i} for i in range(1, 4)]) is True
+    assert [r["job_id"] for r in db.written] == [1, 3]
+    assert queue.dead_lettered == 1
+
+
+def test_transient_error_is_retried_then_given_up(monkeypatch):
+    db = FakeDb(lambda rows: httpx.ConnectError("connection refused"))
+    monkeypatch.setattr(job_events, "supabase", db)
+    monkeypatch.setattr(job_events, "JOB_EVENTS_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(job_events, "_RETRY_DELAY_MAX", 0.01)
+    queue = make_queue()
+    queue.put({"job_id": 1})
+    deadline = time.monotonic() + 5
+    while not queue.dead_lettered and time.monotonic() < deadline:
+        time.sleep(0.01)
+    queue.stop(timeout=5)
+    assert db.calls == 3
+    assert queue.dead_lettered == 1 and not queue._items
+
+
+@pytest.mark.parametrize("code,permanent", [("23505", True), ("42703", True), ("PGRST204", True),
+                                            ("57014", False), ("PGRST000", False), (None, False)])
+def test_is_permanent(code, permanent):
+    assert job_events.is_permanent(APIError({"code": code, "message": "x"})) is permanent
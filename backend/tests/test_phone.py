@@ -0,0 +1,34 @@
+import pytest
+
+import auth
+
+PHONES = [
+    "89991234567",
+    "8 (999) 123-45-67",
+    "+7 999 123-45-67",
+    "79991234567",
+    "9991234567",
+    "+380501234567",
+    "380501234567",
+    "812345",
+]
+
+
+@pytest.mark.parametrize("phone", PHONES)
+def test_prefix_finds_stored_phone_while_typing(phone):
+    stored = auth.normalize_phone(phone)
+    typed = ""
+    for c in phone:
+        typed += c
+        prefixes = auth.normalize_phone_prefixes(typed)
+        if any(ch.isdigit() for ch in typed):
+            assert any(stored.startswith(p) for p in prefixes), (typed, stored, prefixes)
+
+
+def test_local_number_also_matches_russian_form():
+    assert "+7999123" in auth.normalize_phone_prefixes("999123")
+    assert auth.normalize_phone("89991234567").startswith(auth.normalize_phone_prefixes("999123")[-1])
+
+
+def test_empty_input():
+    assert auth.normalize_phone_prefixes("+ ()") == []
@@ -0,0 +1,44 @@
+import auth
+import cache
+import profiling
+
+
+class CountingDb:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def table(self, name):
+        db = self
+
+        class Query:
+            def select(self, *args):
+                return self
+
+            def eq(self, *args):
+                return self
+
+            def execute(self):
+                db.queries += 1
+                return type("Result", (), {"data": db.rows})()
+        return Query()
+
+
+def test_profile_permission_uses_user_cache(monkeypatch):
+    db = CountingDb([{"id": 9101, "role": "admin"}])
+    monkeypatch.setattr(auth, "supabase", db)
+    cache.user_cache.invalidate(cache.user_key(9101))
+    token = auth.create_access_token({"sub": "9101"})
+
+    assert all(profiling._is_admin(token) for _ in range(5))
+    assert db.queries == 1
+
+
+def test_profile_permission_rejects_unknown_and_invalid_tokens(monkeypatch):
+    db = CountingDb([])
+    monkeypatch.setattr(auth, "supabase", db)
+    cache.user_cache.invalidate(cache.user_key(9102))
+
+    assert not profiling._is_admin(auth.create_access_token({"sub": "9102"}))
+    assert not profiling._is_admin("not-a-jwt")
+    assert db.queries == 1
@@ -0,0 +1,29 @@
+import pytest
+
+import ratelimit
+
+
+def scope(peer, **headers):
+    return {
+        "client": (peer, 50000),
+        "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()],
+    }
+
+
+@pytest.mark.parametrize("request_scope, key", [
+    (scope("203.0.113.7", x_real_ip="198.51.100.1"), "ip:203.0.113.7"),
+    (scope("203.0.113.7", x_forwarded_for="198.51.100.1"), "ip:203.0.113.7"),
+    (scope("127.0.0.1", x_real_ip="198.51.100.1"), "ip:198.51.100.1"),
+    (scope("127.0.0.1", x_forwarded_for="10.0.0.5, 198.51.100.1"), "ip:198.51.100.1"),
+    (scope("127.0.0.1"), "ip:127.0.0.1"),
+])
+def test_client_ip_headers_only_from_trusted_proxy(request_scope, key):
+    assert ratelimit._client_key(request_scope, "/auth/send-code") == key
+
+
+def test_rotating_header_does_not_refresh_auth_budget():
+    rule = ratelimit.Rule("/auth/send-code", rate=0.001, burst=2)
+    buckets = ratelimit.TokenBuckets(max_keys=100)
+    waits = [buckets.take(rule, ratelimit._client_key(scope("203.0.113.7", x_real_ip=f"10.0.0.{i}"), "/auth/send-code"))
+             for i in range(3)]
+    assert waits[:2] == [0, 0] and waits[2] > 0
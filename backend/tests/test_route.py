@@ -0,0 +1,75 @@
+import geocoding
+import main
+
+
+class CountingProvider(geocoding.Geocoder):
+    name = "static"
+
+    def __init__(self):
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        return 55.75 + len(self.calls) / 100, 37.61
+
+
+class EmptyCache:
+    """geocode_cache без строк: каждый адрес новый, запись результатов никуда не идёт."""
+
+    def table(self, name):
+        return self
+
+    def select(self, *args):
+        return self
+
+    def in_(self, *args):
+        return self
+
+    def upsert(self, rows):
+        return self
+
+    def execute(self):
+        return type("Result", (), {"data": []})()
+
+
+def setup_route(monkeypatch, jobs, budget):
+    provider = CountingProvider()
+    backfills = []
+    monkeypatch.setattr(main, "get_jobs_between", lambda *args: jobs)
+    monkeypatch.setattr(geocoding, "supabase", EmptyCache())
+    monkeypatch.setattr(geocoding, "GEOCODE_MIN_INTERVAL", 0)
+    monkeypatch.setattr(geocoding, "GEOCODE_REQUEST_MAX_CALLS", budget)
+    monkeypatch.setattr(geocoding, "service", geocoding.GeocodingService(provider))
+    monkeypatch.setattr(geocoding, "request_backfill", lambda: backfills.append(True))
+    return provider, backfills
+
+
+def make_jobs(count):
+    return [
+        {"id": i, "address": f"ул. Ленина, {i}", "latitude": None, "longitude": None}
+        for i in range(1, count + 1)
+    ]
+
+
+def test_route_optimize_geocodes_within_request_budget(monkeypatch):
+    provider, backfills = setup_route(monkeypatch, make_jobs(10), budget=3)
+
+    result = main.get_route_optimize("2026-10-19", current_user={"id": 1})
+
+    assert len(provider.calls) == 3
+    assert backfills
+    # Маршрут — по адресам в бюджете; остальные получат координаты в фоновом дозаполнении
+    assert sorted(result["order"]) == [1, 2, 3]
+    assert all(j["latitude"] is not None for j in result["jobs"])
+
+
+def test_route_optimize_cache_only_budget(monkeypatch):
+    jobs = make_jobs(4)
+    jobs[0].update(latitude=55.7, longitude=37.6)
+    provider, backfills = setup_route(monkeypatch, jobs, budget=0)
+
+    result = main.get_route_optimize("2026-10-19", current_user={"id": 1})
+
+    assert provider.calls == []
+    assert backfills
+    assert result == {"order": [1], "jobs": [jobs[0]], "total_distance_km": 0}
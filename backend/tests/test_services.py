@@ -0,0 +1,34 @@
+import pytest
+from fastapi import HTTPException
+
+import main
+import schemas
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    known = {1: {"id": 1, "name": "Чистка", "price": 1500.0}}
+    monkeypatch.setattr(main.catalog.services_catalog, "get", known.get)
+
+
+def test_deleted_catalog_service_becomes_ad_hoc(catalog):
+    services = [
+        {"service_id": 1, "description": "Чистка", "price": 1500, "quantity": 1},
+        {"service_id": 99, "description": "Снятая с продажи", "price": 700, "quantity": 2},
+    ]
+    main.validate_services(services)
+    assert services[0]["service_id"] == 1
+    assert "service_id" not in services[1]
+    assert services[1]["price"] == 700
+
+
+def test_bad_price_is_rejected(catalog):
+    with pytest.raises(HTTPException):
+        main.validate_services([{"description": "x", "price": "abc"}])
+
+
+def test_patch_setting_unknown_service_id_is_rejected(catalog):
+    op = schemas.JobPatchOperation(op="replace", path="/services/0/service_id", value=99)
+    with pytest.raises(HTTPException):
+        main.validate_patch_op(0, op)
+    main.validate_patch_op(0, schemas.JobPatchOperation(op="add", path="/services/-", value={"service_id": 99, "price": 1}))
@@ -0,0 +1,371 @@
+"""
+Модель ближайших заявок в памяти процесса: от вчера (UTC) на UPCOMING_DAYS дней вперёд.
+
+Частые чтения — /jobs/today, /jobs?day=, /admin/jobs?day=, /bootstrap, маршрут
+на день и проверка напоминаний push — обходятся без запроса к базе. Заявка хранится компактной записью (__slots__), записи индексированы по
+дню UTC и по мастеру.
+
+Модель загружается при старте и поддерживается актуальной:
+  - обработчики записи заявок публикуют изменения через cluster.bus (job_saved,
+    jobs_deleted), поэтому свои изменения видны сразу во всех воркерах;
+  - фоновый поток раз в UPCOMING_RECONCILE_INTERVAL секунд (и после каждой
+    инвалидации кэша заявок) дочитывает строки с updated_at новее последнего
+    увиденного — так подхватываются импорт, дозаполнение координат и правки в обход API;
+  - раз в UPCOMING_RELOAD_INTERVAL секунд модель перечитывается целиком: окно
+    сдвигается, удаления в обход API исчезают.
+
+Память ограничена UPCOMING_MAX_JOBS записями: при превышении модель выключается
+до следующей полной загрузки, и чтения идут в базу. Если шина не согласована
+между воркерами (несколько воркеров без Redis), модель не используется.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+import cluster
+from database import supabase
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+UPCOMING_ENABLED = os.getenv("UPCOMING_ENABLED", "1").lower() in ("1", "true", "yes")
+UPCOMING_DAYS = int(os.getenv("UPCOMING_DAYS", "14"))
+UPCOMING_MAX_JOBS = int(os.getenv("UPCOMING_MAX_JOBS", "100000"))
+UPCOMING_RECONCILE_INTERVAL = float(os.getenv("UPCOMING_RECONCILE_INTERVAL", "30"))
+UPCOMING_RELOAD_INTERVAL = float(os.getenv("UPCOMING_RELOAD_INTERVAL", "900"))
+# Транзакция может зафиксироваться позже своего updated_at: дочитываем с запасом
+UPCOMING_RECONCILE_OVERLAP = 60
+_PAGE_SIZE = 1000
+_DAY = 86400
+
+# Колонки таблицы jobs (supabase_schema.sql) — всё, что отдаёт JobResponse
+FIELDS = (
+    "id", "user_id", "customer_name", "title", "description", "notes", "address",
+    "customer_phone", "customer_phone_norm", "latitude", "longitude", "scheduled_at",
+    "completed_at", "duration_minutes", "price", "status", "priority", "job_type",
+    "checklist", "services", "created_at", "updated_at",
+)
+_COLUMNS = ",".join(FIELDS)
+# Короткие повторяющиеся значения храним одним объектом на процесс
+_INTERNED = ("status", "priority", "job_type")
+
+
+def _timestamp(value) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class JobRecord:
+    """Строка jobs без словаря атрибутов; ts — scheduled_at в секундах эпохи."""
+    __slots__ = FIELDS + ("ts",)
+
+    def __init__(self, row: dict, ts: float):
+        for field in FIELDS:
+            value = row.get(field)
+            if field in _INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, field, value)
+        self.ts = ts
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in FIELDS}
+
+
+def _order(record: JobRecord):
+    return record.ts, record.id
+
+
+class UpcomingJobs:
+    def __init__(self):
+        self.enabled = UPCOMING_ENABLED and cluster.bus.coherent
+        self.ready = False
+        self._lock = threading.RLock()
+        self._records: Dict[int, JobRecord] = {}
+        # день UTC (номер дня эпохи) -> записи по (ts, id); мастер -> день -> записи
+        self._by_day: Dict[int, List[JobRecord]] = {}
+        self._by_user: Dict[int, Dict[int, List[JobRecord]]] = {}
+        self._window = (0.0, 0.0)
+        self._watermark: Optional[str] = None
+        # Удалённые недавно id: запоздавшая сверка не должна их вернуть
+        self._deleted: Dict[int, float] = {}
+        self._loaded_at = 0.0
+        self._reconciled_at: Optional[str] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Индексы ---
+
+    def _index(self, record: JobRecord) -> None:
+        day = int(record.ts // _DAY)
+        for bucket in (self._by_day.setdefault(day, []),
+                       self._by_user.setdefault(record.user_id, {}).setdefault(day, [])):
+            bucket.append(record)
+            if len(bucket) > 1 and _order(bucket[-2]) > _order(record):
+                bucket.sort(key=_order)
+
+    @staticmethod
+    def _build(rows: List[dict], window: tuple, deleted: set):
+        """Индексы полной загрузки: корзины заполняются подряд и сортируются по разу."""
+        records: Dict[int, JobRecord] = {}
+        by_day: Dict[int, List[JobRecord]] = {}
+        by_user: Dict[int, Dict[int, List[JobRecord]]] = {}
+        for row in rows:
+            job_id = row.get("id")
+            ts = _timestamp(row.get("scheduled_at"))
+            if job_id is None or job_id in deleted or ts is None or not (window[0] <= ts < window[1]):
+                continue
+            record = JobRecord(row, ts)
+            records[job_id] = record
+            day = int(ts // _DAY)
+            by_day.setdefault(day, []).append(record)
+            by_user.setdefault(record.user_id, {}).setdefault(day, []).append(record)
+        for bucket in by_day.values():
+            bucket.sort(key=_order)
+        for days in by_user.values():
+            for bucket in days.values():
+                bucket.sort(key=_order)
+        return records, by_day, by_user
+
+    def _unindex(self, record: JobRecord) -> None:
+        day = int(record.ts // _DAY)
+        user_days = self._by_user.get(record.user_id, {})
+        for index in (self._by_day, user_days):
+            bucket = index.get(day)
+            if bucket is None:
+                continue
+            bucket.remove(record)
+            if not bucket:
+                del index[day]
+        if not user_days:
+            self._by_user.pop(record.user_id, None)
+
+    def _apply(self, row: dict) -> None:
+        """Вставка или замена записи; строка вне окна убирает запись из модели."""
+        job_id = row.get("id")
+        if job_id is None or job_id in self._deleted:
+            return
+        old = self._records.get(job_id)
+        if old is not None:
+            # Сверка могла прочитать строку раньше, чем обработчик записи применил новую
+            if (_timestamp(old.updated_at) or 0) > (_timestamp(row.get("updated_at")) or 0):
+                return
+            del self._records[job_id]
+            self._unindex(old)
+        ts = _timestamp(row.get("scheduled_at"))
+        if ts is None or not (self._window[0] <= ts < self._window[1]):
+            return
+        if len(self._records) >= UPCOMING_MAX_JOBS:
+            logger.warning(f"Upcoming jobs model exceeded {UPCOMING_MAX_JOBS} jobs, reading from database")
+            self.ready = False
+            return
+        record = JobRecord(row, ts)
+        self._records[job_id] = record
+        self._index(record)
+
+    def _forget(self, job_id: int) -> None:
+        self._deleted[job_id] = time.monotonic()
+        record = self._records.pop(job_id, None)
+        if record is not None:
+            self._unindex(record)
+
+    def _expire_deleted(self) -> None:
+        horizon = time.monotonic() - max(UPCOMING_RECONCILE_INTERVAL, UPCOMING_RECONCILE_OVERLAP) * 2
+        for job_id in [i for i, at in self._deleted.items() if at < horizon]:
+            del self._deleted[job_id]
+
+    # --- Загрузка и сверка ---
+
+    def load(self) -> None:
+        """Полная загрузка окна; вызывается при старте и раз в UPCOMING_RELOAD_INTERVAL."""
+        if not self.enabled:
+            return
+        today = datetime.now(timezone.utc).date()
+        start = datetime(today.year, today.month, today.day, tzinfo=timezone.utc) - timedelta(days=1)
+        end = start + timedelta(days=UPCOMING_DAYS + 2)
+
+        # Метка до чтения: всё, что изменится во время загрузки, подхватит сверка
+        latest = supabase.table("jobs").select("updated_at") \
+            .order("updated_at", desc=True, nullsfirst=False).limit(1).execute().data or []
+        watermark = latest[0]["updated_at"] if latest else None
+
+        rows = []
+        last_id = 0
+        while True:
+            page = supabase.table("jobs").select(_COLUMNS) \
+                .gte("scheduled_at", start.isoformat()) \
+                .lt("scheduled_at", end.isoformat()) \
+                .gt("id", last_id) \
+                .order("id") \
+                .limit(_PAGE_SIZE) \
+                .execute().data or []
+            rows.extend(page)
+            if len(rows) > UPCOMING_MAX_JOBS:
+                with self._lock:
+                    self.ready = False
+                    self._records, self._by_day, self._by_user = {}, {}, {}
+                    self._loaded_at = time.monotonic()
+                logger.warning(f"More than {UPCOMING_MAX_JOBS} upcoming jobs, reading from database")
+                return
+            if len(page) < _PAGE_SIZE:
+                break
+            last_id = page[-1]["id"]
+
+        window = (start.timestamp(), end.timestamp())
+        with self._lock:
+            self._expire_deleted()
+            deleted = set(self._deleted)
+        # Индексы строятся без блокировки: чтения в это время обслуживает прежняя модель
+        records, by_day, by_user = self._build(rows, window, deleted)
+        with self._lock:
+            self._records, self._by_day, self._by_user = records, by_day, by_user
+            self._window = window
+            # Удалённые через шину во время сборки; изменённые подхватит сверка по метке
+            for job_id in set(self._deleted) - deleted:
+                record = self._records.pop(job_id, None)
+                if record is not None:
+                    self._unindex(record)
+            if watermark and (self._watermark is None or _timestamp(watermark) > _timestamp(self._watermark)):
+                self._watermark = watermark
+            self._loaded_at = time.monotonic()
+            self.ready = True
+        logger.info(f"Upcoming jobs model loaded: {len(self._records)} jobs, {start.date()} .. {end.date()}")
+
+    def reconcile(self) -> None:
+        """Дочитывает строки, изменённые после последней загрузки или сверки."""
+        if self._watermark is None:
+            self.load()
+            return
+        since = datetime.fromtimestamp(_timestamp(self._watermark) - UPCOMING_RECONCILE_OVERLAP, timezone.utc)
+        rows = supabase.table("jobs").select(_COLUMNS) \
+            .gte("updated_at", since.isoformat()) \
+            .order("updated_at") \
+            .limit(_PAGE_SIZE) \
+            .execute().data or []
+        if len(rows) >= _PAGE_SIZE:
+            # Массовое изменение (импорт) — проще перечитать окно
+            self.load()
+            return
+        with self._lock:
+            self._expire_deleted()
+            for row in rows:
+                self._apply(row)
+            if rows and _timestamp(rows[-1]["updated_at"]) > _timestamp(self._watermark):
+                self._watermark = rows[-1]["updated_at"]
+            self._reconciled_at = datetime.now(timezone.utc).isoformat()
+
+    # --- Чтение ---
+
+    def query(self, start: datetime, end: datetime, user_id: Optional[int] = None) -> Optional[List[dict]]:
+        """
+        Заявки со scheduled_at в [start, end) по возрастанию (все мастера, если user_id не задан).
+        None — интервал вне окна или модель не готова: читать из базы.
+        """
+        if not self.ready:
+            return None
+        lo, hi = start.timestamp(), end.timestamp()
+        with self._lock:
+            if not self.ready or lo < self._window[0] or hi > self._window[1]:
+                return None
+            index = self._by_user.get(user_id, {}) if user_id else self._by_day
+            result = []
+            for day in range(int(lo // _DAY), int(hi // _DAY) + 1):
+                for record in index.get(day, ()):
+                    if lo <= record.ts < hi:
+                        result.append(record.to_dict())
+            return result
+
+    def status(self) -> dict:
+        with self._lock:
+            window = [datetime.fromtimestamp(t, timezone.utc).isoformat() for t in self._window] if self.ready else None
+            return {
+                "enabled": self.enabled,
+                "ready": self.ready,
+                "jobs": len(self._records),
+                "window": window,
+                "reconciled_at": self._reconciled_at,
+            }
+
+    # --- Фоновая сверка ---
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="upcoming-jobs", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(UPCOMING_RECONCILE_INTERVAL)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                if self._load_due():
+                    self.load()
+                elif self.ready:
+                    self.reconcile()
+            except Exception:
+                logger.exception("Upcoming jobs reconciliation failed")
+
+    def _load_due(self) -> bool:
+        # Не загружалась (ошибка при старте) — пробуем на каждом шаге; после
+        # переполнения окно перечитывается не чаще полной перезагрузки
+        return not self._loaded_at or time.monotonic() - self._loaded_at >= UPCOMING_RELOAD_INTERVAL
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._thread = None
+
+    # --- Изменения из шины ---
+
+    def on_message(self, payload: dict) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            for row in payload.get("upsert", ()):
+                self._apply(row)
+            for job_id in payload.get("delete", ()):
+                self._forget(job_id)
+
+
+model = UpcomingJobs()
+
+cluster.bus.subscribe("upcoming", model.on_message)
+
+
+def _on_invalidate(payload: dict) -> None:
+    # Любая запись в jobs сбрасывает "admin:" (cache.invalidate_jobs) — сверяемся сразу
+    if "admin:".startswith(payload.get("prefix", "")):
+        model.wake()
+
+
+cluster.bus.subscribe("cache", _on_invalidate)
+
+
+def job_saved(job: dict) -> None:
+    """Вызывается после вставки или изменения заявки со строкой из ответа базы."""
+    if model.enabled:
+        cluster.bus.publish("upcoming", {"upsert": [job]})
+
+
+def jobs_deleted(job_ids: Iterable[int]) -> None:
+    if model.enabled:
+        cluster.bus.publish("upcoming", {"delete": list(job_ids)})
+
@@ -225,10 +225,27 @@ nohup "$PYTHON" "$APP_ENTRY" > "$LOG_FILE" 2>&1 &
 APP_PID=$!
 echo $APP_PID > "$PID_FILE"
 
-# Ждём запуска и проверяем
-sleep 3
-if kill -0 "$APP_PID" 2>/dev/null; then
-    echo "✅ Приложение запущено (PID: $APP_PID)"
+# Ждём готовности: порт открывается после прогрева, /health/ready отвечает 200,
+# когда прогрев завершён и база доступна
+READY_TIMEOUT=60
+READY=0
+for i in $(seq 1 $READY_TIMEOUT); do
+    if ! kill -0 "$APP_PID" 2>/dev/null; then
+        break
+    fi
+    if curl -fsS -o /dev/null "http://127.0.0.1:8000/health/ready" 2>/dev/null; then
+        READY=1
+        break
+    fi
+    sleep 1
+done
+
+if [ "$READY" -eq 1 ]; then
+    echo "✅ Приложение запущено и готово (PID: $APP_PID)"
+elif kill -0 "$APP_PID" 2>/dev/null; then
+    echo "⚠️  Приложение запущено (PID: $APP_PID), но не готово за ${READY_TIMEOUT}с:"
+    curl -s "http://127.0.0.1:8000/health/ready" || true
+    echo ""
 else
     echo "❌ Процесс не запустился! Проверьте логи:"
     tail -n 50 "$LOG_FILE"
@@ -243,7 +260,7 @@ echo "📊 Логи приложения: tail -f $LOG_FILE"
 echo "📊 Логи деплоя:     tail -f $DEPLOY_LOG"
 echo "🔍 Процесс:         ps aux | grep $APP_ENTRY"
 echo "🌐 URL:             http://82.97.243.212"
-echo "🩺 Health:          curl http://82.97.243.212/health"
+echo "🩺 Health:          curl http://82.97.243.212/health/ready"
 echo "========================================="
 
 # === Авто-коммит изменений на сервере (опционально) ===
@@ -14,6 +14,13 @@ export const api = {
     async getAdminStats() {
         return this.request('/admin/stats')
     },
+    async getWorkersOverview(tz = Intl.DateTimeFormat().resolvedOptions().timeZone) {
+        return this.request(`/admin/workers/overview?${new URLSearchParams({ tz })}`)
+    },
+    async searchJobs(q, { limit = 20, offset = 0 } = {}) {
+        const params = new URLSearchParams({ q, limit, offset })
+        return this.request(`/admin/jobs/search?${params}`)
+    },
 
     // Shared Job Actions
     async updateJob(id, job) {
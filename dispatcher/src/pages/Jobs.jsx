@@ -5,6 +5,8 @@ import { Plus, Edit, Trash2, X, Save, Search as SearchIcon, CheckSquare, Square,
 import { PRIORITY_LIST, JOB_TYPE_LIST, STATUS_LIST } from '../constants'
 import { Portal } from '../components/Portal'
 
+const SEARCH_PAGE_SIZE = 50
+
 function JobModal({ job, workers, onClose, onSave }) {
     const [formData, setFormData] = useState(job || {
         customer_name: '',
@@ -18,6 +20,7 @@ function JobModal({ job, workers, onClose, onSave }) {
         priority: 'medium',
         job_type: 'repair',
         scheduled_at: new Date().toISOString().slice(0, 16),
+        duration_minutes: 60,
         services: [],
         user_id: workers && workers.length > 0 ? workers[0].id : ''
     })
@@ -33,7 +36,7 @@ function JobModal({ job, workers, onClose, onSave }) {
         if (service) {
             setFormData({
                 ...formData,
-                services: [...(formData.services || []), { description: service.name, price: service.price, quantity: 1 }]
+                services: [...(formData.services || []), { service_id: service.id, description: service.name, price: service.price, quantity: 1 }]
             })
         }
     }
@@ -179,6 +182,11 @@ function JobModal({ job, workers, onClose, onSave }) {
                         </div>
                     </div>
 
+                    <div className="input-group">
+                        <label>Длительность (мин)</label>
+                        <input type="number" min="15" max="1440" step="15" value={formData.duration_minutes || ''} onChange={e => setFormData({ ...formData, duration_minutes: parseInt(e.target.value) || null })} />
+                    </div>
+
                     <div className="input-group">
                         <label>Назначить исполнителя</label>
                         <select required className="admin-select" value={formData.user_id} onChange={e => setFormData({ ...formData, user_id: parseInt(e.target.value) })}>
@@ -206,22 +214,61 @@ export function Jobs() {
     const [searchTerm, setSearchTerm] = useState('')
     const [isModalOpen, setIsModalOpen] = useState(false)
     const [editingJob, setEditingJob] = useState(null)
+    const [debouncedTerm, setDebouncedTerm] = useState('')
+    const [searchResults, setSearchResults] = useState(null)
+    const [hasMore, setHasMore] = useState(false)
+    const [loadingMore, setLoadingMore] = useState(false)
 
-    const filteredJobs = jobs.filter(job => {
-        const matchesStatus = statusFilter === 'all' || job.status === statusFilter
-        const matchesSearch = !searchTerm ||
-            job.customer_name?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            job.address?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            job.title?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            job.id.toString().includes(searchTerm)
+    React.useEffect(() => {
+        const timer = setTimeout(() => setDebouncedTerm(searchTerm.trim()), 300)
+        return () => clearTimeout(timer)
+    }, [searchTerm])
 
-        return matchesStatus && matchesSearch
-    })
+    // Поиск выполняется на сервере (индексы tsvector + trigram, номер заявки — точно);
+    // правки из этой страницы применяются к результатам на месте, без повторного поиска
+    React.useEffect(() => {
+        if (debouncedTerm.length < 2 && !/^\d+$/.test(debouncedTerm)) {
+            setSearchResults(null)
+            setHasMore(false)
+            return
+        }
+        let cancelled = false
+        api.searchJobs(debouncedTerm, { limit: SEARCH_PAGE_SIZE })
+            .then(res => {
+                if (cancelled) return
+                setSearchResults(res.items)
+                setHasMore(res.has_more)
+            })
+            .catch(e => console.error('Search failed:', e))
+        return () => { cancelled = true }
+    }, [debouncedTerm])
+
+    const loadMoreResults = async () => {
+        setLoadingMore(true)
+        try {
+            const res = await api.searchJobs(debouncedTerm, { limit: SEARCH_PAGE_SIZE, offset: searchResults.length })
+            setSearchResults(prev => [...prev, ...res.items.filter(j => !prev.some(p => p.id === j.id))])
+            setHasMore(res.has_more)
+        } catch (e) {
+            console.error('Search failed:', e)
+        } finally {
+            setLoadingMore(false)
+        }
+    }
+
+    const updateLocalJobs = (update) => {
+        setJobs(update)
+        setSearchResults(prev => prev && update(prev))
+    }
+
+    const filteredJobs = (searchResults || jobs).filter(job =>
+        statusFilter === 'all' || job.status === statusFilter
+    )
 
     const handleUpdateStatus = async (jobId, newStatus) => {
         try {
             await api.adminUpdateJob(jobId, { status: newStatus })
-            setJobs(prev => prev.map(j => j.id === jobId ? { ...j, status: newStatus } : j))
+            updateLocalJobs(prev => prev.map(j => j.id === jobId ? { ...j, status: newStatus } : j))
             loadData()
         } catch (e) {
             alert('Ошибка: ' + e.message)
@@ -230,12 +277,19 @@ export function Jobs() {
 
     const handleSaveJob = async (formData) => {
         try {
+            let saved
             if (editingJob) {
-                const updated = await api.adminUpdateJob(editingJob.id, formData)
-                setJobs(prev => prev.map(j => j.id === editingJob.id ? updated : j))
+                saved = await api.adminUpdateJob(editingJob.id, formData)
+                updateLocalJobs(prev => prev.map(j => j.id === editingJob.id ? saved : j))
             } else {
-                const created = await api.adminCreateJob(formData)
-                setJobs(prev => [created, ...prev])
+                saved = await api.adminCreateJob(formData)
+                setJobs(prev => [saved, ...prev])
+            }
+            if (saved.conflicts?.length) {
+                const list = saved.conflicts
+                    .map(c => `#${c.id} ${new Date(c.scheduled_at).toLocaleString()} — ${c.title || c.customer_name || ''}`)
+                    .join('\n')
+                alert('Внимание: у мастера пересекаются заявки:\n' + list)
             }
             setIsModalOpen(false)
             setEditingJob(null)
@@ -249,7 +303,7 @@ export function Jobs() {
         if (!window.confirm('Удалить эту заявку?')) return
         try {
             await api.adminDeleteJob(jobId)
-            setJobs(prev => prev.filter(j => j.id !== jobId))
+            updateLocalJobs(prev => prev.filter(j => j.id !== jobId))
             loadData()
         } catch (e) {
             alert('Ошибка: ' + e.message)
@@ -277,7 +331,7 @@ export function Jobs() {
                     <SearchIcon size={20} style={{ position: 'absolute', left: '16px', top: '50%', transform: 'translateY(-50%)', color: 'var(--text-muted)' }} />
                     <input
                         type="search"
-                        placeholder="Поиск по клиенту, адресу или ID..."
+                        placeholder="Поиск по номеру, клиенту, телефону или адресу..."
                         style={{ paddingLeft: '50px' }}
                         value={searchTerm}
                         onChange={e => setSearchTerm(e.target.value)}
@@ -366,7 +420,14 @@ export function Jobs() {
                         })}
                     </tbody>
                 </table>
-                {filteredJobs.length === 0 && (
+                {searchResults && hasMore && (
+                    <div style={{ padding: '20px', textAlign: 'center' }}>
+                        <button className="btn-secondary" onClick={loadMoreResults} disabled={loadingMore}>
+                            {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+                        </button>
+                    </div>
+                )}
+                {filteredJobs.length === 0 && !hasMore && (
                     <div style={{ padding: '80px', textAlign: 'center', color: 'var(--text-muted)' }}>
                         <div style={{ fontSize: '1.2rem', fontWeight: '700', marginBottom: '8px' }}>Ничего не найдено</div>
                         <p style={{ margin: 0 }}>Попробуйте изменить параметры поиска или фильтры</p>
@@ -1,4 +1,4 @@
-import React, { useState } from 'react'
+import React, { useState, useEffect } from 'react'
 import { useAdmin } from '../context/AdminContext'
 import { api } from '../api'
 import { Search, UserCheck, UserX, Shield, ShieldOff, MoreHorizontal } from 'lucide-react'
@@ -7,6 +7,18 @@ export function Workers() {
     const { workers, setWorkers } = useAdmin()
     const [searchTerm, setSearchTerm] = useState('')
     const [loadingId, setLoadingId] = useState(null)
+    const [overview, setOverview] = useState({})
+
+    const loadOverview = async () => {
+        try {
+            const rows = await api.getWorkersOverview()
+            setOverview(Object.fromEntries(rows.map(r => [r.user_id, r])))
+        } catch (e) {
+            console.error('Workers overview error:', e)
+        }
+    }
+
+    useEffect(() => { loadOverview() }, [])
 
     const filteredWorkers = (workers || []).filter(w =>
         (w.name?.toLowerCase() || '').includes(searchTerm.toLowerCase()) ||
@@ -19,6 +31,7 @@ export function Workers() {
             const newStatus = !worker.is_active
             await api.updateWorker(worker.id, { is_active: newStatus })
             setWorkers(prev => prev.map(w => w.id === worker.id ? { ...w, is_active: newStatus } : w))
+            loadOverview()
         } catch (e) {
             alert('Ошибка: ' + e.message)
         } finally {
@@ -34,6 +47,7 @@ export function Workers() {
             setLoadingId(worker.id)
             await api.updateWorker(worker.id, { role: newRole })
             setWorkers(prev => prev.map(w => w.id === worker.id ? { ...w, role: newRole } : w))
+            loadOverview()
         } catch (e) {
             alert('Ошибка: ' + e.message)
         } finally {
@@ -75,6 +89,7 @@ export function Workers() {
                             <th>Сотрудник</th>
                             <th>Контакты</th>
                             <th>Роль</th>
+                            <th>Загрузка</th>
                             <th>Статус</th>
                             <th style={{ textAlign: 'right' }}>Действия</th>
                         </tr>
@@ -118,6 +133,21 @@ export function Workers() {
                                         {w.role === 'admin' ? 'Админ' : 'Мастер'}
                                     </span>
                                 </td>
+                                <td>
+                                    {overview[w.id] ? (
+                                        <div style={{ fontSize: '0.8rem', lineHeight: 1.5 }}>
+                                            <div>Сегодня: <strong>{overview[w.id].today_jobs}</strong> • Открыто: <strong>{overview[w.id].open_jobs}</strong></div>
+                                            <div>За месяц: <strong>{overview[w.id].completed_month}</strong> • {overview[w.id].revenue_month.toLocaleString()} ₽</div>
+                                            <div style={{ color: 'var(--text-muted)' }}>
+                                                {overview[w.id].next_job_at
+                                                    ? `Далее: ${new Date(overview[w.id].next_job_at).toLocaleString([], { day: 'numeric', month: 'short', hour: '2-digit', minute: '2-digit' })}${overview[w.id].next_job_address ? ' • ' + overview[w.id].next_job_address : ''}`
+                                                    : 'Нет запланированных'}
+                                            </div>
+                                        </div>
+                                    ) : (
+                                        <span style={{ color: 'var(--text-muted)' }}>—</span>
+                                    )}
+                                </td>
                                 <td>
                                     <div style={{
                                         color: w.is_active ? '#10b981' : '#ef4444',
@@ -19,6 +19,7 @@ function AppLayout() {
     loading,
     isAuthenticated,
     jobs,
+    jobsRevision,
     stats,
     todayJobs,
     syncing,
@@ -138,6 +139,7 @@ function AppLayout() {
             {location.pathname === '/calendar' && (
               <CalendarTab
                 jobs={jobs}
+                jobsRevision={jobsRevision}
                 onSelectJob={(job) => navigate(`/jobs/${job.id}`)}
                 onAddressClick={handleAddressNavigate}
                 onRefresh={handleRefresh}
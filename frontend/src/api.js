@@ -22,7 +22,11 @@ export const api = {
     }
     if (!response.ok) {
       const error = await response.json().catch(() => ({ detail: 'Request failed' }))
-      throw new Error(error.detail || 'Request failed')
+      const err = new Error(error.detail || 'Request failed')
+      err.status = response.status
+      // 429/503 от ограничителя нагрузки: сколько секунд подождать перед повтором
+      err.retryAfter = Number(response.headers.get('Retry-After')) || 0
+      throw err
     }
     return response.json()
   },
@@ -35,6 +39,27 @@ export const api = {
       body: JSON.stringify({ phone, code }),
     })
   },
+  async bootstrap(tz = Intl.DateTimeFormat().resolvedOptions().timeZone) {
+    return this.request(`/bootstrap?tz=${encodeURIComponent(tz)}`)
+  },
+  // Каталог услуг: хранится в IndexedDB по версии, сервер отвечает 304, если версия не изменилась
+  async getServicesCatalog() {
+    const { getCachedServicesCatalog, cacheServicesCatalog } = await import('./offlineStorage')
+    const cached = await getCachedServicesCatalog()
+    if (!navigator.onLine) return cached
+    const token = localStorage.getItem('access_token')
+    const response = await fetch(`${API_URL}/services`, {
+      headers: {
+        ...(token && { Authorization: `Bearer ${token}` }),
+        ...(cached?.version && { 'If-None-Match': `"${cached.version}"` }),
+      },
+    })
+    if (response.status === 304 && cached) return cached
+    if (!response.ok) return cached
+    const catalog = await response.json()
+    await cacheServicesCatalog(catalog)
+    return catalog
+  },
   async getCurrentUser() {
     return this.request('/auth/me')
   },
@@ -50,6 +75,12 @@ export const api = {
   async getJobs(status) {
     return this.request(`/jobs${status ? '?status=' + status : ''}`)
   },
+  async getCalendarMonth(month, tz = Intl.DateTimeFormat().resolvedOptions().timeZone) {
+    return this.request(`/jobs/calendar?month=${month}&tz=${encodeURIComponent(tz)}`)
+  },
+  async getJobsForDay(day, tz = Intl.DateTimeFormat().resolvedOptions().timeZone) {
+    return this.request(`/jobs?day=${day}&tz=${encodeURIComponent(tz)}`)
+  },
   async getJob(id) {
     return this.request(`/jobs/${id}`)
   },
@@ -69,6 +100,15 @@ export const api = {
     }
     return this.request(`/jobs/${id}`, { method: 'PUT', body: JSON.stringify(job) })
   },
+  // Частичное изменение checklist/services: операции JSON Patch, ответ — { id, updated_at }
+  async patchJob(id, ops) {
+    if (!navigator.onLine) {
+      const { addToSyncQueue } = await import('./offlineStorage')
+      await addToSyncQueue({ type: 'PATCH_JOB', jobId: id, ops })
+      return { id, status: 'queued' }
+    }
+    return this.request(`/jobs/${id}`, { method: 'PATCH', body: JSON.stringify(ops) })
+  },
   async deleteJob(id) {
     if (!navigator.onLine) {
       const { addToSyncQueue } = await import('./offlineStorage')
@@ -77,6 +117,15 @@ export const api = {
     }
     return this.request(`/jobs/${id}`, { method: 'DELETE' })
   },
+  async suggestCustomers(phone) {
+    return this.request(`/customers/suggest?phone=${encodeURIComponent(phone)}`)
+  },
+  async getCustomerHistory(phone) {
+    return this.request(`/customers/history?phone=${encodeURIComponent(phone)}`)
+  },
+  async geocode(address) {
+    return this.request(`/geocode?address=${encodeURIComponent(address)}`)
+  },
   async getRouteOptimize(date) {
     return this.request(`/jobs/route/optimize?date=${date}`)
   },
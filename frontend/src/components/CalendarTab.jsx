@@ -1,4 +1,5 @@
 import React, { useEffect, useMemo, useState } from 'react'
+import { api } from '../api'
 import { PullToRefreshWrapper } from './PullToRefreshWrapper'
 import { JobCard } from './JobCard'
 import { Icons } from './Icons'
@@ -73,19 +74,57 @@ function getJobsForDate(jobs, date) {
   return jobs.filter((j) => j.scheduled_at && toDateKeyFromIso(j.scheduled_at) === ds)
 }
 
-export function CalendarTab({ jobs, onSelectJob, onAddressClick, onRefresh }) {
+export function CalendarTab({ jobs, jobsRevision, onSelectJob, onAddressClick, onRefresh }) {
   const [currentMonth, setCurrentMonth] = useState(() => new Date())
   const [selectedDate, setSelectedDate] = useState(() => new Date())
   const [dayTracker, setDayTracker] = useState(loadDayTracker)
   const [viewMode, setViewMode] = useState('month')
+  // Сводка месяца с сервера (счётчики по дням) и заявки выбранного дня, загруженные по тапу;
+  // перезапрашиваются при смене месяца или дня и после записи заявок (jobsRevision)
+  const [monthSummary, setMonthSummary] = useState({})
+  const [remoteDayJobs, setRemoteDayJobs] = useState(null)
 
   useEffect(() => {
     localStorage.setItem(DAY_TRACKER_STORAGE_KEY, JSON.stringify(dayTracker))
   }, [dayTracker])
 
+  const monthKey = toDateKey(currentMonth).slice(0, 7)
+
+  useEffect(() => {
+    if (!navigator.onLine) return
+    let cancelled = false
+    api
+      .getCalendarMonth(monthKey)
+      .then((res) => {
+        if (!cancelled) setMonthSummary(Object.fromEntries(res.days.map((d) => [d.date, d])))
+      })
+      .catch((err) => console.error('Calendar summary failed:', err))
+    return () => {
+      cancelled = true
+    }
+  }, [monthKey, jobsRevision])
+
+  const selectedKey = toDateKey(selectedDate)
+
+  useEffect(() => {
+    setRemoteDayJobs(null)
+    if (!navigator.onLine) return
+    let cancelled = false
+    api
+      .getJobsForDay(selectedKey)
+      .then((res) => {
+        if (!cancelled) setRemoteDayJobs(res)
+      })
+      .catch((err) => console.error('Day jobs failed:', err))
+    return () => {
+      cancelled = true
+    }
+  }, [selectedKey, jobsRevision])
+
+  // Оффлайн — из локального кэша заявок
   const dayJobs = useMemo(
-    () => getJobsForDate(jobs, selectedDate),
-    [jobs, selectedDate]
+    () => remoteDayJobs || getJobsForDate(jobs, selectedDate),
+    [remoteDayJobs, jobs, selectedDate]
   )
 
   const monthGrid = useMemo(() => getMonthGrid(currentMonth), [currentMonth])
@@ -151,6 +190,7 @@ export function CalendarTab({ jobs, onSelectJob, onAddressClick, onRefresh }) {
                 const isToday = toDateKey(date) === toDateKey(new Date())
                 const isSelected = toDateKey(date) === toDateKey(selectedDate)
                 const dayType = getDayType(date, dayTracker)
+                const summary = inCurrentMonth ? monthSummary[toDateKey(date)] : null
                 return (
                   <button
                     key={`${date.toISOString()}-cell`}
@@ -159,6 +199,7 @@ export function CalendarTab({ jobs, onSelectJob, onAddressClick, onRefresh }) {
                     onClick={() => setSelectedDate(date)}
                   >
                     <span>{date.getDate()}</span>
+                    {summary && summary.jobs_count > 0 && <small>{summary.jobs_count}</small>}
                   </button>
                 )
               })}
@@ -207,6 +248,24 @@ export function CalendarTab({ jobs, onSelectJob, onAddressClick, onRefresh }) {
             </div>
           </>
         )}
+        {viewMode === 'month' && (
+          <div className="calendar-week-day-jobs">
+            {dayJobs.length === 0 ? (
+              <p className="empty" style={{ padding: '10px' }}>Нет заявок</p>
+            ) : (
+              [...dayJobs]
+                .sort((a, b) => new Date(a.scheduled_at) - new Date(b.scheduled_at))
+                .map((job) => (
+                  <JobCard
+                    key={job.id}
+                    job={job}
+                    onClick={() => onSelectJob(job)}
+                    onAddressClick={onAddressClick}
+                  />
+                ))
+            )}
+          </div>
+        )}
         {viewMode === 'month' && (
           <div className="calendar-day-type-toggle">
             <span className={`calendar-day-badge ${selectedDayType}`}>
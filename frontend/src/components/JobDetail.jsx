@@ -128,6 +128,32 @@ export function JobDetail({ job, onClose, onUpdate, onDelete, onAddressClick, is
     }
   }
 
+  const handleChecklistToggle = async (index) => {
+    const checklist = job.checklist || []
+    const item = checklist[index]
+    if (!item) return
+    const done = !item.done
+    // Отправляем только изменённый пункт; test по тексту не даст отметить
+    // чужой пункт, если список успели изменить на другом устройстве
+    const ops = [{ op: 'add', path: `/checklist/${index}/done`, value: done }]
+    if (item.text !== undefined) {
+      ops.unshift({ op: 'test', path: `/checklist/${index}/text`, value: item.text })
+    }
+    const updated = {
+      ...job,
+      checklist: checklist.map((c, i) => (i === index ? { ...c, done } : c)),
+    }
+    onUpdate(updated)
+    cacheJob(updated)
+    try {
+      await api.patchJob(job.id, ops)
+    } catch (err) {
+      onUpdate(job)
+      cacheJob(job)
+      alert(err.message)
+    }
+  }
+
   const handleAddService = () => {
     setFormData({
       ...formData,
@@ -448,6 +474,25 @@ export function JobDetail({ job, onClose, onUpdate, onDelete, onAddressClick, is
               <p className="job-detail-description">{job.description}</p>
             </div>
           )}
+          {job.checklist && job.checklist.length > 0 && (
+            <div className="job-detail-section">
+              <h3 className="job-detail-section-title">Чек-лист</h3>
+              <div className="job-detail-checklist" style={{ display: 'flex', flexDirection: 'column', gap: '8px' }}>
+                {job.checklist.map((item, idx) => (
+                  <label key={idx} style={{ display: 'flex', alignItems: 'center', gap: '8px' }}>
+                    <input
+                      type="checkbox"
+                      checked={!!item.done}
+                      onChange={() => handleChecklistToggle(idx)}
+                    />
+                    <span style={item.done ? { textDecoration: 'line-through', color: 'var(--gray-color)' } : undefined}>
+                      {item.text}
+                    </span>
+                  </label>
+                ))}
+              </div>
+            </div>
+          )}
           {job.services && job.services.length > 0 && (
             <div className="job-detail-section">
               <h3 className="job-detail-section-title">Услуги</h3>
@@ -1,4 +1,4 @@
-import React, { useState } from 'react'
+import React, { useState, useEffect } from 'react'
 import { api } from '../api'
 import { cacheJob, addToSyncQueue } from '../offlineStorage'
 import { validatePhone } from '../lib/utils'
@@ -14,6 +14,7 @@ export function JobForm({ onClose, onCreated, isOnline }) {
     address: '',
     customer_phone: '',
     scheduled_at: '',
+    duration_minutes: 60,
     price: '',
     status: 'scheduled',
     priority: 'medium',
@@ -25,6 +26,62 @@ export function JobForm({ onClose, onCreated, isOnline }) {
   const [errors, setErrors] = useState({})
   const [loading, setLoading] = useState(false)
   const [showMap, setShowMap] = useState(false)
+  const [customerSuggestions, setCustomerSuggestions] = useState([])
+  const [customerHistory, setCustomerHistory] = useState(null)
+  const [servicesCatalog, setServicesCatalog] = useState([])
+
+  // Каталог услуг (работает и оффлайн — из IndexedDB)
+  useEffect(() => {
+    api
+      .getServicesCatalog()
+      .then((catalog) => setServicesCatalog(catalog?.services || []))
+      .catch((err) => console.error('Services catalog failed:', err))
+  }, [])
+
+  // Автодополнение клиента по телефону и история его заявок
+  useEffect(() => {
+    const phone = formData.customer_phone
+    const digits = phone.replace(/\D/g, '')
+    if (!isOnline || digits.length < 4) {
+      setCustomerSuggestions([])
+      setCustomerHistory(null)
+      return
+    }
+    let cancelled = false
+    const timer = setTimeout(async () => {
+      try {
+        if (validatePhone(phone)) {
+          const history = await api.getCustomerHistory(phone)
+          if (!cancelled) {
+            setCustomerHistory(history.jobs_count ? history : null)
+            setCustomerSuggestions([])
+          }
+        } else {
+          const suggestions = await api.suggestCustomers(phone)
+          if (!cancelled) {
+            setCustomerSuggestions(suggestions)
+            setCustomerHistory(null)
+          }
+        }
+      } catch (err) {
+        console.error('Customer lookup failed:', err)
+      }
+    }, 250)
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [formData.customer_phone, isOnline])
+
+  const handleCustomerSelect = (customer) => {
+    setFormData({
+      ...formData,
+      customer_phone: customer.customer_phone,
+      customer_name: formData.customer_name || customer.customer_name || '',
+      address: formData.address || customer.address || '',
+    })
+    setCustomerSuggestions([])
+  }
 
   const validate = () => {
     const newErrors = {}
@@ -46,6 +103,16 @@ export function JobForm({ onClose, onCreated, isOnline }) {
   const handleServiceChange = (index, field, value) => {
     const newServices = [...(formData.services || [])]
     newServices[index][field] = value
+    if (field === 'description') {
+      // Выбор из каталога подставляет цену и привязывает услугу к каталогу
+      const known = servicesCatalog.find((s) => s.name === value)
+      if (known) {
+        newServices[index].price = known.price
+        newServices[index].service_id = known.id
+      } else {
+        delete newServices[index].service_id
+      }
+    }
     const total = newServices.reduce(
       (acc, curr) => acc + (parseFloat(curr.price) || 0) * (parseInt(curr.quantity) || 1),
       0
@@ -69,10 +136,17 @@ export function JobForm({ onClose, onCreated, isOnline }) {
     setLoading(true)
     try {
       const submitData = { ...formData }
+      if (!submitData.duration_minutes) delete submitData.duration_minutes
       if (submitData.scheduled_at)
         submitData.scheduled_at = new Date(submitData.scheduled_at).toISOString()
       if (isOnline) {
-        await api.createJob(submitData)
+        const created = await api.createJob(submitData)
+        if (created.conflicts?.length) {
+          const times = created.conflicts
+            .map((c) => new Date(c.scheduled_at).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }))
+            .join(', ')
+          alert(`Заявка создана, но пересекается с другими заявками: ${times}`)
+        }
       } else {
         const tempJob = {
           ...submitData,
@@ -156,6 +230,31 @@ export function JobForm({ onClose, onCreated, isOnline }) {
           {errors.customer_phone && (
             <span className="field-error">{errors.customer_phone}</span>
           )}
+          {customerSuggestions.length > 0 && (
+            <div className="customer-suggestions">
+              {customerSuggestions.map((c) => (
+                <button
+                  key={c.customer_phone}
+                  type="button"
+                  className="customer-suggestion"
+                  onClick={() => handleCustomerSelect(c)}
+                >
+                  <span>{c.customer_name || c.customer_phone}</span>
+                  <small>
+                    {c.customer_phone} · {c.address || 'без адреса'} · заявок: {c.jobs_count}
+                  </small>
+                </button>
+              ))}
+            </div>
+          )}
+          {customerHistory && (
+            <div className="customer-history">
+              Постоянный клиент: заявок {customerHistory.jobs_count}, оплачено{' '}
+              {customerHistory.total_spent.toLocaleString('ru-RU')} ₽
+              {customerHistory.last_visit &&
+                `, последний визит ${new Date(customerHistory.last_visit).toLocaleDateString('ru-RU')}`}
+            </div>
+          )}
         </div>
         <div className="form-group">
           <label>Приоритет</label>
@@ -201,6 +300,19 @@ export function JobForm({ onClose, onCreated, isOnline }) {
             max="2030-12-31T23:59"
           />
         </div>
+        <div className="form-group">
+          <label>Длительность (мин)</label>
+          <input
+            type="number"
+            min="15"
+            max="1440"
+            step="15"
+            value={formData.duration_minutes}
+            onChange={(e) =>
+              setFormData({ ...formData, duration_minutes: parseInt(e.target.value) || '' })
+            }
+          />
+        </div>
         <div className="form-group">
           <label>Описание работ</label>
           <textarea
@@ -218,6 +330,7 @@ export function JobForm({ onClose, onCreated, isOnline }) {
                 <input
                   type="text"
                   placeholder="Название"
+                  list="services-catalog"
                   value={srv.description}
                   onChange={(e) => handleServiceChange(idx, 'description', e.target.value)}
                   style={{ flex: 2, minWidth: '100px', fontSize: '14px', padding: '10px' }}
@@ -250,6 +363,11 @@ export function JobForm({ onClose, onCreated, isOnline }) {
                 </button>
               </div>
             ))}
+            <datalist id="services-catalog">
+              {servicesCatalog.map((s) => (
+                <option key={s.id} value={s.name} />
+              ))}
+            </datalist>
             <button
               type="button"
               className="btn-secondary btn-small"
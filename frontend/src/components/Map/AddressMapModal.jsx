@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react'
 import { loadYandexMaps } from './loadYandexMaps'
+import { api } from '../../api'
 import { DEFAULT_CENTER } from '../../constants'
 
 export function AddressMapModal({ address, latitude, longitude, onSelect, onClose }) {
@@ -42,6 +43,17 @@ export function AddressMapModal({ address, latitude, longitude, onSelect, onClos
         placemarkRef.current.geometry.setCoordinates(coords)
         updateAddress(coords)
       })
+      // Адрес без координат ищем через сервер: там кэш, повторный адрес не стоит запроса к геокодеру
+      if (address && !(latitude && longitude)) {
+        api.geocode(address).then((res) => {
+          if (!res.found || !mapInstance.current) return
+          const coords = [res.latitude, res.longitude]
+          setSelectedLat(coords[0])
+          setSelectedLng(coords[1])
+          placemarkRef.current.geometry.setCoordinates(coords)
+          mapInstance.current.setCenter(coords, 16)
+        }).catch(() => {})
+      }
     })
   }, [])
 
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { api } from '../api'
 import { validateEmail } from '../lib/utils'
+import { useApp } from '../context/AppContext'
 
 export function ProfileTab({ user, onUpdateUser, onLogout, onResetStats, isOnline }) {
   const [isEditing, setIsEditing] = useState(false)
@@ -12,6 +13,7 @@ export function ProfileTab({ user, onUpdateUser, onLogout, onResetStats, isOnlin
   const [error, setError] = useState('')
   const [emailError, setEmailError] = useState('')
   const [pushStatus, setPushStatus] = useState('') // '', 'loading', 'enabled', 'error', 'no_https', 'no_browser', 'no_server', 'denied'
+  const { pushConfig } = useApp()
 
   useEffect(() => {
     setFormData({ name: user?.name || '', email: user?.email || '' })
@@ -39,7 +41,8 @@ export function ProfileTab({ user, onUpdateUser, onLogout, onResetStats, isOnlin
         setPushStatus('denied')
         return
       }
-      const { vapid_public } = await api.getVapidPublic()
+      // Ключ уже пришёл в /bootstrap; запрос — только если старт был из оффлайн-кэша
+      const { vapid_public } = pushConfig?.vapid_public ? pushConfig : await api.getVapidPublic()
       const reg = await navigator.serviceWorker.ready
       if (!reg.pushManager) {
         setPushStatus('no_browser')
@@ -9,6 +9,7 @@ import {
   getCachedStats,
   cacheUser,
   getCachedUser,
+  cacheServicesCatalog,
   clearUserCache,
   addToSyncQueue,
   processSyncQueue,
@@ -23,7 +24,13 @@ export function AppProvider({ children }) {
   const [jobs, setJobs] = useState([])
   const [stats, setStats] = useState(null)
   const [todayJobs, setTodayJobs] = useState([])
+  const [services, setServices] = useState([])
+  const [pushConfig, setPushConfig] = useState(null)
   const [syncing, setSyncing] = useState(false)
+  // Растёт после каждой записи заявок из этого приложения: экраны с серверными
+  // выборками (календарь) перезапрашивают их только тогда
+  const [jobsRevision, setJobsRevision] = useState(0)
+  const bumpJobsRevision = useCallback(() => setJobsRevision((r) => r + 1), [])
   const isOnline = useOnlineStatus()
 
   const loadStats = useCallback(async () => {
@@ -56,6 +63,19 @@ export function AppProvider({ children }) {
     }
   }, [])
 
+  // Холодный старт: профиль, заявки на сегодня, статистика, услуги и push одним запросом
+  const loadBootstrap = useCallback(async () => {
+    const d = await api.bootstrap()
+    setUser(d.user)
+    cacheUser(d.user)
+    setStats(d.stats)
+    cacheStats(d.stats)
+    setTodayJobs(d.today_jobs)
+    setServices(d.services)
+    cacheServicesCatalog({ version: d.services_version, services: d.services })
+    setPushConfig(d.push)
+  }, [])
+
   const loadFromCache = useCallback(async () => {
     try {
       const cachedUser = await getCachedUser()
@@ -81,30 +101,24 @@ export function AppProvider({ children }) {
         loadJobs()
         loadStats()
         loadTodayJobs()
+        bumpJobsRevision()
       }
     } catch (err) {
       console.error('Sync error:', err)
     } finally {
       setSyncing(false)
     }
-  }, [loadJobs, loadStats, loadTodayJobs])
+  }, [loadJobs, loadStats, loadTodayJobs, bumpJobsRevision])
 
   const handleRefresh = useCallback(async () => {
+    bumpJobsRevision()
     await Promise.all([loadStats(), loadTodayJobs(), loadJobs()])
-  }, [loadStats, loadTodayJobs, loadJobs])
+  }, [loadStats, loadTodayJobs, loadJobs, bumpJobsRevision])
 
   const handleLogin = useCallback(() => {
-    api
-      .getCurrentUser()
-      .then((u) => {
-        setUser(u)
-        cacheUser(u)
-      })
-      .catch(console.error)
-    loadStats()
-    loadTodayJobs()
+    loadBootstrap().catch(console.error)
     loadJobs()
-  }, [loadStats, loadTodayJobs, loadJobs])
+  }, [loadBootstrap, loadJobs])
 
   const handleLogout = useCallback(() => {
     localStorage.removeItem('access_token')
@@ -126,26 +140,30 @@ export function AppProvider({ children }) {
       setJobs((prev) => prev.map((j) => (j.id === updated.id ? updated : j)))
       loadStats()
       loadTodayJobs()
+      bumpJobsRevision()
     },
-    [loadStats, loadTodayJobs]
+    [loadStats, loadTodayJobs, bumpJobsRevision]
   )
 
   const handleJobDelete = useCallback(() => {
     loadJobs()
     loadStats()
     loadTodayJobs()
-  }, [loadJobs, loadStats, loadTodayJobs])
+    bumpJobsRevision()
+  }, [loadJobs, loadStats, loadTodayJobs, bumpJobsRevision])
 
   const handleJobCreated = useCallback(() => {
     loadJobs()
     loadStats()
     loadTodayJobs()
-  }, [loadJobs, loadStats, loadTodayJobs])
+    bumpJobsRevision()
+  }, [loadJobs, loadStats, loadTodayJobs, bumpJobsRevision])
 
   const handleResetStats = useCallback(async () => {
     await api.resetDashboardStats()
     await Promise.all([loadJobs(), loadStats(), loadTodayJobs()])
-  }, [loadJobs, loadStats, loadTodayJobs])
+    bumpJobsRevision()
+  }, [loadJobs, loadStats, loadTodayJobs, bumpJobsRevision])
 
   useEffect(() => {
     if ('serviceWorker' in navigator) {
@@ -203,15 +221,8 @@ export function AppProvider({ children }) {
     const token = localStorage.getItem('access_token')
     if (token) {
       if (navigator.onLine) {
-        api
-          .getCurrentUser()
-          .then((u) => {
-            setUser(u)
-            cacheUser(u)
-            loadStats()
-            loadTodayJobs()
-            loadJobs()
-          })
+        loadBootstrap()
+          .then(() => loadJobs())
           .catch(() => loadFromCache())
           .finally(() => setLoading(false))
       } else {
@@ -220,7 +231,7 @@ export function AppProvider({ children }) {
     } else {
       setLoading(false)
     }
-  }, [loadFromCache, loadStats, loadTodayJobs, loadJobs])
+  }, [loadFromCache, loadBootstrap, loadJobs])
 
   const isAuthenticated = !!user
 
@@ -229,8 +240,11 @@ export function AppProvider({ children }) {
     loading,
     isAuthenticated,
     jobs,
+    jobsRevision,
     stats,
     todayJobs,
+    services,
+    pushConfig,
     syncing,
     isOnline,
     loadJobs,
@@ -142,6 +142,29 @@ export async function getCachedStats() {
   })
 }
 
+// ==================== Services catalog ====================
+
+export async function cacheServicesCatalog(catalog) {
+  await put(STORES.stats, { key: 'services_catalog', ...catalog })
+}
+
+export async function getCachedServicesCatalog() {
+  const db = await openDB()
+  return new Promise((resolve, reject) => {
+    const tx = db.transaction(STORES.stats, 'readonly')
+    const store = tx.objectStore(STORES.stats)
+    const request = store.get('services_catalog')
+    request.onsuccess = () => {
+      const result = request.result
+      if (result) {
+        delete result.key
+      }
+      resolve(result || null)
+    }
+    request.onerror = () => reject(request.error)
+  })
+}
+
 // ==================== User ====================
 
 export async function cacheUser(user) {
@@ -223,6 +246,12 @@ export async function processSyncQueue(apiRequest) {
             body: JSON.stringify(item.data),
           })
           break
+        case 'PATCH_JOB':
+          await apiRequest(`/jobs/${item.jobId}`, {
+            method: 'PATCH',
+            body: JSON.stringify(item.ops),
+          })
+          break
         case 'DELETE_JOB':
           await apiRequest(`/jobs/${item.jobId}`, {
             method: 'DELETE',
@@ -236,6 +265,10 @@ export async function processSyncQueue(apiRequest) {
     } catch (err) {
       console.error('Sync failed for item:', item, err)
       failed++
+      // Сервер просит подождать — оставляем остаток очереди до следующей синхронизации
+      if (err.status === 429 || err.status === 503) {
+        return { synced, failed, retryAfter: err.retryAfter || 1 }
+      }
     }
   }
 